@@ -0,0 +1,300 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from multiway_alignment.consensus import _combine_codes, _encode_opinions
+
+# number of set bits of every byte, used when np.bitwise_count is not available
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+# costs used by BitmapIndex.consensus_groups to choose between intersecting the bitmaps
+# and combining the opinion codes, in units of one 64-bit word intersected:
+# fixed cost of intersecting one live group with the bitmaps of a topic
+_GROUP_OVERHEAD_WORDS = 256
+# cost of labeling one individual (set or not) of one group
+_WORDS_PER_LABEL = 6
+# cost of combining the opinion code of one individual on one topic
+_WORDS_PER_CODE = 32
+# number of individuals whose opinions are kept as the fingerprint of the indexed opinions
+_FINGERPRINT_ROWS = 1024
+
+
+def _popcount(bitmap: np.ndarray) -> int:
+    """
+    :param bitmap: 1d np.array of uint64 words
+    :return: int, the number of set bits
+    """
+    if hasattr(np, "bitwise_count"):
+        return int(np.bitwise_count(bitmap).sum())
+    return int(_POPCOUNT_TABLE[bitmap.view(np.uint8)].sum())
+
+
+class BitmapIndex:
+    """
+    Index of the opinions with one packed bitmap per (topic, opinion) over the individuals.
+    The members of a consensus group, i.e. the individuals holding a given opinion on each
+    of a set of topics, are the bitwise AND of the bitmaps of those opinions,
+    and the size of the group is the popcount of the result.
+    ------------
+    Example
+    ------------
+    >>> df = pd.DataFrame({"A": [0, 0, 1], "B": [1, 1, 0], "C": [0, 0, 1]})
+    >>> index = BitmapIndex(df)
+    >>> index.count({"A": 0, "B": 1})
+    2
+    >>> index.members({"A": 0, "B": 1})
+    Index([0, 1], dtype='int64')
+    """
+
+    def __init__(self, opinions: Union[pd.DataFrame, pd.Series]):
+        """
+        :param opinions: pd.DataFrame having one column per topic and one row per individual,
+            where each element a_ij represents the opinion for individual i on topic j
+            and columns names are the topic names
+        """
+        if isinstance(opinions, pd.Series):
+            opinions = opinions.to_frame()
+        codes, self.uniques = _encode_opinions(opinions)
+        self.topics = list(opinions.columns)
+        self.index = opinions.index
+        self.n_individuals = len(opinions)
+        self._n_words = (self.n_individuals + 63) // 64
+        self._topic_id = {topic: j for j, topic in enumerate(self.topics)}
+        self._opinion_code = [
+            {value: code for code, value in enumerate(_uniques)}
+            for _uniques in self.uniques
+        ]
+        # bitmaps[j][c] is the packed set of individuals with opinion code c on topic j
+        self.bitmaps: List[np.ndarray] = [
+            np.stack([self._pack(codes[:, j] == c) for c in range(len(_uniques))])
+            if len(_uniques) > 0
+            else np.empty((0, self._n_words), dtype=np.uint64)
+            for j, _uniques in enumerate(self.uniques)
+        ]
+        # fingerprint: the opinion codes of evenly spaced individuals
+        self._fingerprint_rows = np.unique(
+            np.linspace(
+                0, self.n_individuals - 1, min(self.n_individuals, _FINGERPRINT_ROWS)
+            ).astype(np.int64)
+        )
+        self._fingerprint = codes[self._fingerprint_rows]
+
+    def __repr__(self) -> str:
+        return f"BitmapIndex(n_individuals={self.n_individuals}, topics={self.topics})"
+
+    @property
+    def nbytes(self) -> int:
+        """
+        :return: int, the memory used by the bitmaps
+        """
+        return sum(b.nbytes for b in self.bitmaps)
+
+    def _pack(self, mask: np.ndarray) -> np.ndarray:
+        """
+        :param mask: 1d boolean np.array with one element per individual
+        :return: 1d np.array of uint64 words, bit i of the bitmap is set if mask[i]
+        """
+        _bytes = np.zeros(self._n_words * 8, dtype=np.uint8)
+        _packed = np.packbits(mask, bitorder="little")
+        _bytes[: len(_packed)] = _packed
+        return _bytes.view(np.uint64)
+
+    def _bits(self, bitmap: np.ndarray) -> np.ndarray:
+        """
+        :param bitmap: 1d np.array of uint64 words
+        :return: 1d boolean np.array with one element per individual, True if its bit is set
+        """
+        return np.unpackbits(
+            bitmap.view(np.uint8), count=self.n_individuals, bitorder="little"
+        ).view(bool)
+
+    def _unpack(self, bitmap: np.ndarray) -> np.ndarray:
+        """
+        :param bitmap: 1d np.array of uint64 words
+        :return: np.ndarray, the positions of the individuals whose bit is set, in ascending order
+        """
+        # only the non-zero words are unpacked, so sparse bitmaps cost O(n_words + members)
+        _words = np.flatnonzero(bitmap)
+        _bits = np.unpackbits(bitmap[_words].view(np.uint8), bitorder="little").reshape(
+            len(_words), 64
+        )
+        _word, _bit = np.nonzero(_bits)
+        return _words[_word] * 64 + _bit
+
+    def bitmap(self, opinions: Dict[Any, Any]) -> np.ndarray:
+        """
+        :param opinions: dict, topic name -> opinion
+        :return: 1d np.array of uint64 words, the packed set of individuals holding
+            all the given opinions
+        """
+        _result = np.full(self._n_words, np.iinfo(np.uint64).max, dtype=np.uint64)
+        if self.n_individuals % 64:
+            _result[-1] = (1 << (self.n_individuals % 64)) - 1
+        for topic, opinion in opinions.items():
+            j = self._topic_id[topic]
+            _code = self._opinion_code[j].get(opinion)
+            if _code is None:
+                return np.zeros(self._n_words, dtype=np.uint64)
+            np.bitwise_and(_result, self.bitmaps[j][_code], out=_result)
+        return _result
+
+    def count(self, opinions: Dict[Any, Any]) -> int:
+        """
+        :param opinions: dict, topic name -> opinion
+        :return: int, the number of individuals holding all the given opinions
+        """
+        return _popcount(self.bitmap(opinions))
+
+    def members(self, opinions: Dict[Any, Any]) -> pd.Index:
+        """
+        :param opinions: dict, topic name -> opinion
+        :return: pd.Index, the labels of the individuals holding all the given opinions
+        """
+        return self.index[self._unpack(self.bitmap(opinions))]
+
+    def codes(self, topics: Optional[Sequence[Any]] = None) -> np.ndarray:
+        """
+        :param topics: list, the topic names
+            Default: None (all the indexed topics)
+        :return: np.ndarray, the (n_individuals x n_topics) int64 matrix of opinion codes
+            decoded from the bitmaps, -1 for missing values
+        """
+        _topic_ids = [
+            self._topic_id[t] for t in (self.topics if topics is None else topics)
+        ]
+        codes = np.full((len(_topic_ids), self.n_individuals), -1, dtype=np.int64)
+        for i, j in enumerate(_topic_ids):
+            # (n_opinions x n_individuals) bits, at most one set per individual
+            _bits = np.unpackbits(
+                self.bitmaps[j].view(np.uint8),
+                axis=1,
+                count=self.n_individuals,
+                bitorder="little",
+            ).view(bool)
+            for c in range(len(_bits)):
+                np.copyto(codes[i], c, where=_bits[c])
+        return codes.T
+
+    def matches(
+        self, opinions: Union[pd.DataFrame, pd.Series], validate: bool = False
+    ) -> bool:
+        """
+        :param opinions: pd.DataFrame having one column per topic and one row per individual
+        :param validate: bool, if True, every opinion is compared with the index, which costs
+            about as much as building the consensus groups without the index; otherwise only
+            the individuals, the topics and the opinions of up to 1024 evenly spaced individuals
+            (the fingerprint recorded when the index was built)
+            Default: False
+        :return: bool, True if the index holds the same opinions, row by row, for each of the topics
+        """
+        if isinstance(opinions, pd.Series):
+            opinions = opinions.to_frame()
+        if (
+            self.n_individuals != len(opinions)
+            or not set(opinions.columns) <= set(self.topics)
+            or not opinions.index.equals(self.index)
+        ):
+            return False
+        _topics = list(opinions.columns)
+        _rows = slice(None) if validate else self._fingerprint_rows
+        _codes = (
+            self.codes(_topics)
+            if validate
+            else self._fingerprint[:, [self._topic_id[t] for t in _topics]]
+        )
+        for i, _topic in enumerate(_topics):
+            _values = opinions[_topic].to_numpy()[_rows]
+            _missing = pd.isna(_values)
+            if not np.array_equal(_missing, _codes[:, i] < 0):
+                return False
+            _uniques = self.uniques[self._topic_id[_topic]]
+            if not (_uniques[_codes[~_missing, i]] == _values[~_missing]).all():
+                return False
+        return True
+
+    def _layer_bitmaps(self, j: int, missing: str) -> np.ndarray:
+        """
+        :param j: int, the position of the topic
+        :param missing: str, one of "drop" or "category" (see consensus_groups)
+        :return: np.ndarray, the (n_opinions x n_words) bitmaps of the topic and, if missing
+            is "category" and some opinions are missing, the bitmap of the missing opinions last
+        """
+        _bitmaps = self.bitmaps[j]
+        if missing == "category":
+            _missing = self.bitmap({}) & ~np.bitwise_or.reduce(
+                _bitmaps, axis=0, initial=np.uint64(0)
+            )
+            if _missing.any():
+                _bitmaps = np.vstack([_bitmaps, _missing[np.newaxis]])
+        return _bitmaps
+
+    def consensus_groups(
+        self, topics: Optional[Sequence[Any]] = None, missing: str = "drop"
+    ) -> Tuple[np.ndarray, int, np.ndarray]:
+        """
+        Enumerates the non-empty consensus groups of the given topics
+        by intersecting the bitmaps topic by topic, pruning empty intersections.
+        Each topic costs O(live groups x opinions x n_individuals / 64), and labeling the individuals
+        O(groups x n_individuals), which grows toward O(n_individuals^2) when the groups get close
+        to singletons. So as soon as the live groups would cost more than combining the opinion codes
+        of all the topics, O(n_individuals x n_topics), the codes are decoded from the bitmaps
+        and combined instead: the bitmaps only pay off for a few large groups
+        :param topics: list, the topic names
+            Default: None (all the indexed topics)
+        :param missing: str, one of "drop" or "category".
+            If "category", a missing opinion is one more opinion of the topic,
+            coded as the number of its unique labels (see consensus._encode_opinions)
+            Default: "drop"
+        :return: Tuple[np.ndarray, int, np.ndarray], the dense consensus group id of each individual
+            (-1 if excluded), in lexicographic order of the opinions, the number of groups,
+            and the (n_groups x n_topics) matrix of opinion codes of each group
+        """
+        assert missing in ("drop", "category")
+        _topics = self.topics if topics is None else list(topics)
+        _topic_ids = [self._topic_id[t] for t in _topics]
+        if len(_topic_ids) == 0:
+            raise ValueError(
+                "At least one topic is needed to build the consensus groups"
+            )
+        # live groups, in lexicographic order of their opinion codes
+        _group_codes = np.empty((1, 0), dtype=np.int64)
+        _group_bitmaps = self.bitmap({})[np.newaxis]
+        # every live group costs at least its labeling, as the number of groups never decreases
+        _combined_cost = _WORDS_PER_CODE * self.n_individuals * len(_topic_ids)
+        _label_cost = _WORDS_PER_LABEL * self.n_individuals
+        for j in _topic_ids:
+            _bitmaps = self._layer_bitmaps(j, missing)
+            _cost = len(_group_bitmaps) * (
+                len(_bitmaps) * self._n_words + _GROUP_OVERHEAD_WORDS + _label_cost
+            )
+            if _cost > _combined_cost:
+                return self._combined_groups(_topics, missing)
+            _children = _group_bitmaps[:, np.newaxis, :] & _bitmaps[np.newaxis, :, :]
+            _parent, _code = np.nonzero(_children.any(axis=2))
+            _group_codes = np.column_stack([_group_codes[_parent], _code])
+            _group_bitmaps = _children[_parent, _code]
+        if len(_group_bitmaps) * _label_cost > _combined_cost:
+            return self._combined_groups(_topics, missing)
+        labels = np.full(self.n_individuals, -1, dtype=np.int64)
+        for g, _bitmap in enumerate(_group_bitmaps):
+            np.copyto(labels, g, where=self._bits(_bitmap))
+        return labels, len(_group_codes), _group_codes
+
+    def _combined_groups(
+        self, topics: Sequence[Any], missing: str
+    ) -> Tuple[np.ndarray, int, np.ndarray]:
+        """
+        :param topics: list, the topic names
+        :param missing: str, one of "drop" or "category"
+        :return: Tuple[np.ndarray, int, np.ndarray], the same as consensus_groups(topics, missing),
+            built by combining the opinion codes decoded from the bitmaps
+        """
+        codes = self.codes(topics)
+        if missing == "category":
+            for i, topic in enumerate(topics):
+                codes[codes[:, i] < 0, i] = len(self.uniques[self._topic_id[topic]])
+        labels, n_groups = _combine_codes(codes)
+        # first member of each group (assigning in reverse order, the first write wins)
+        _first = np.empty(n_groups, dtype=np.int64)
+        _members = np.flatnonzero(labels >= 0)[::-1]
+        _first[labels[_members]] = _members
+        return labels, n_groups, codes[_first]
@@ -0,0 +1,462 @@
+import os
+import shutil
+import tempfile
+import weakref
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Dict, MutableMapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from multiway_alignment.consensus import _MAX_RADIX, _densify
+
+
+class PartitionCache:
+    """
+    Memory-bounded cache of consensus partitions over the lattice of layer subsets.
+    A subset of layers is identified by a bitmask (bit j set if layer j is in the subset).
+    The consensus partition of a subset S is built by refining the cached partition
+    of S minus one layer by that layer, so that walking the subsets of increasing size
+    needs one refinement per subset instead of a full group-by.
+    Partitions are evicted in least-recently-used order once 'max_bytes' is exceeded,
+    and optionally spilled to disk instead of being dropped. Each cache spills to its own
+    temporary directory, deleted by close() (or when the cache is garbage collected),
+    and a spilled partition is deleted from disk when it is reloaded.
+    The cache also keeps one packed validity bitmask per layer: the individuals
+    having an opinion on every layer of a subset are the AND of the bitmasks,
+    and the resulting rows are cached per pattern of layers with missing values,
+    in the same least-recently-used order and budget as the partitions (they are never spilled).
+    ------------
+    Example
+    ------------
+    >>> codes, _ = _encode_opinions(opinions)
+    >>> cache = PartitionCache(codes, max_bytes=2**30)
+    >>> cache.get(0b101)  # consensus labels of layers 0 and 2
+    >>> with PartitionCache(codes, max_bytes=2**20, spill_to="/tmp") as cache:
+    ...     cache.get(0b101)
+    """
+
+    def __init__(
+        self,
+        codes: np.ndarray,
+        max_bytes: int = 2**28,
+        spill_to: Optional[str] = None,
+    ):
+        """
+        :param codes: (n_individuals x n_layers) int64 matrix of layer codes, -1 for missing values
+        :param max_bytes: int, the maximum number of bytes of partitions and rows kept in memory
+            Default: 256 MiB
+        :param spill_to: Optional[str], directory where evicted partitions are saved,
+            in a temporary subdirectory private to the cache
+            Default: None (evicted partitions are dropped and rebuilt if needed)
+        """
+        self.codes = codes
+        self.max_bytes = max_bytes
+        self.spill_to = spill_to
+        self._spill_dir: Optional[str] = None
+        if spill_to is not None:
+            os.makedirs(spill_to, exist_ok=True)
+            self._spill_dir = tempfile.mkdtemp(prefix="partitions-", dir=spill_to)
+            self._cleanup = weakref.finalize(
+                self, shutil.rmtree, self._spill_dir, ignore_errors=True
+            )
+        self._dtype = np.int32 if len(codes) < np.iinfo(np.int32).max else np.int64
+        self._cardinalities = [
+            int(codes[:, j].max(initial=-1)) + 1 for j in range(codes.shape[1])
+        ]
+        # partitions ("partition", mask) and rows ("rows", pattern), in least-recently-used order
+        self._entries: OrderedDict[Tuple[str, int], np.ndarray] = OrderedDict()
+        self._spilled: Dict[int, str] = {}
+        # packed bitmask of the individuals having an opinion, for the layers with missing values
+        self._valid = {
+            j: np.packbits(codes[:, j] >= 0)
+            for j in range(codes.shape[1])
+            if (codes[:, j] < 0).any()
+        }
+        self._missing_layers = sum(1 << j for j in self._valid)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return sum(_kind == "partition" for _kind, _ in self._entries)
+
+    def __contains__(self, mask: int) -> bool:
+        return ("partition", mask) in self._entries or mask in self._spilled
+
+    def __enter__(self) -> "PartitionCache":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Deletes the spilled partitions and the spill directory
+        :return: None
+        """
+        self._spilled.clear()
+        if self._spill_dir is not None:
+            self._cleanup()
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        :return: float, the fraction of requests served without refining a partition
+        """
+        _total = self.hits + self.misses
+        return self.hits / _total if _total > 0 else 0.0
+
+    def rows(self, mask: int) -> Optional[np.ndarray]:
+        """
+        :param mask: int, the bitmask of the layers in the subset
+        :return: Optional[np.ndarray], the sorted positions of the individuals having an opinion
+            on every layer of the subset, or None if no individual misses any of them.
+            The returned array is shared with the cache and must not be modified
+        """
+        # only the layers with missing values matter, so subsets share the same rows
+        _pattern = mask & self._missing_layers
+        if _pattern == 0:
+            return None
+        if ("rows", _pattern) in self._entries:
+            self._entries.move_to_end(("rows", _pattern))
+            return self._entries["rows", _pattern]
+        _layers = [j for j in self._valid if _pattern >> j & 1]
+        _packed = self._valid[_layers[0]].copy()
+        for j in _layers[1:]:
+            np.bitwise_and(_packed, self._valid[j], out=_packed)
+        _rows = np.flatnonzero(np.unpackbits(_packed, count=len(self.codes)))
+        self._store(("rows", _pattern), _rows)
+        return _rows
+
+    def get(self, mask: int) -> np.ndarray:
+        """
+        :param mask: int, the bitmask of the layers in the subset (non-zero)
+        :return: np.ndarray, the dense consensus group id of each individual for the
+            layers in the subset (-1 if the individual misses any of them).
+            Group ids are in order of first appearance, so they do not depend on the refinement path.
+            The returned array is shared with the cache and must not be modified
+        """
+        if mask <= 0:
+            raise ValueError("The subset of layers must not be empty")
+        _labels = self._lookup(mask)
+        if _labels is not None:
+            self.hits += 1
+            return _labels
+        self.misses += 1
+        if mask & (mask - 1) == 0:
+            # single layer: the codes are already a dense partition
+            _j = mask.bit_length() - 1
+            _labels = self.codes[:, _j].astype(self._dtype)
+        else:
+            # refine a parent (S minus one layer), preferring one that is already cached
+            _layer = mask.bit_length() - 1
+            _bit = mask & -mask
+            while _bit <= mask:
+                if _bit & mask and (mask ^ _bit) in self:
+                    _layer = _bit.bit_length() - 1
+                    break
+                _bit <<= 1
+            _parent = self.get(mask ^ (1 << _layer)).astype(np.int64)
+            _codes = self.codes[:, _layer]
+            _key = _parent * self._cardinalities[_layer] + _codes
+            _key[(_parent < 0) | (_codes < 0)] = -1
+            _labels = _densify(_key, sort=False)[0].astype(self._dtype)
+        self._store(("partition", mask), _labels)
+        return _labels
+
+    def _lookup(self, mask: int) -> Optional[np.ndarray]:
+        """
+        :param mask: int, the bitmask of the layers in the subset
+        :return: the cached partition, or None if it is not cached
+        """
+        if ("partition", mask) in self._entries:
+            self._entries.move_to_end(("partition", mask))
+            return self._entries["partition", mask]
+        if mask in self._spilled:
+            _path = self._spilled.pop(mask)
+            _labels = np.load(_path)
+            os.remove(_path)
+            self._store(("partition", mask), _labels)
+            return _labels
+        return None
+
+    def _store(self, key: Tuple[str, int], value: np.ndarray):
+        """
+        :param key: Tuple[str, int], ("partition", bitmask of the layers in the subset)
+            or ("rows", bitmask of the layers with missing values in the subset)
+        :param value: np.ndarray, the partition or the rows to cache
+        :return: None
+        """
+        self._entries[key] = value
+        self.nbytes += value.nbytes
+        # always keep the newest entry, even if it alone exceeds the budget
+        while self.nbytes > self.max_bytes and len(self._entries) > 1:
+            (_kind, _mask), _value = self._entries.popitem(last=False)
+            self.nbytes -= _value.nbytes
+            if _kind == "partition" and self._spill_dir is not None:
+                _path = os.path.join(self._spill_dir, f"{_mask:x}.npy")
+                np.save(_path, _value)
+                self._spilled[_mask] = _path
+
+
+class IncrementalConsensus:
+    """
+    Consensus partition of a subset of layers that moves from one subset to the next
+    by adding and removing layers, instead of being rebuilt for each subset.
+    The consensus group of an individual is identified by a mixed-radix key over all the layers,
+    whose digit j is the code of the individual on layer j if j is in the subset, 0 otherwise,
+    so that adding (removing) layer j adds (subtracts) code_j * weight_j to the keys:
+    a step costs O(n_individuals), whatever the size of the subset.
+    The code of a group on a layer of the subset is a digit of its key.
+    With an enumeration where consecutive subsets differ by one swap (see parallel.revolving_door),
+    each subset costs two such updates.
+    ------------
+    Example
+    ------------
+    >>> consensus = IncrementalConsensus(codes)
+    >>> consensus.move_to((0, 1, 2))
+    >>> consensus.move_to((0, 2, 3))  # one layer out, one layer in
+    >>> rows, labels, sizes = consensus.groups()
+    """
+
+    def __init__(self, codes: np.ndarray):
+        """
+        :param codes: (n_individuals x n_layers) int64 matrix of layer codes, -1 for missing values
+        :raise OverflowError: if the keys over all the layers do not fit in an int64 (see fits())
+        """
+        if not self.fits(codes):
+            raise OverflowError("The keys of the consensus groups do not fit in int64")
+        self.codes = codes
+        self.cardinalities = [
+            max(int(codes[:, j].max(initial=-1)) + 1, 1) for j in range(codes.shape[1])
+        ]
+        self.weights = np.cumprod([1] + self.cardinalities[:-1]).astype(np.int64)
+        self.layers: Tuple[int, ...] = ()
+        self.key = np.zeros(len(codes), dtype=np.int64)
+        # number of layers of the subset each individual has no opinion on
+        self.n_missing = np.zeros(len(codes), dtype=np.int64)
+        self._groups: Optional[
+            Tuple[Optional[np.ndarray], np.ndarray, np.ndarray, np.ndarray]
+        ] = None
+
+    @staticmethod
+    def fits(codes: np.ndarray) -> bool:
+        """
+        :param codes: (n_individuals x n_layers) int64 matrix of layer codes
+        :return: bool, True if the mixed-radix keys over all the layers fit in an int64
+        """
+        _radix = 1
+        for j in range(codes.shape[1]):
+            _radix *= max(int(codes[:, j].max(initial=-1)) + 1, 1)
+            if _radix >= _MAX_RADIX:
+                return False
+        return True
+
+    def _update(self, j: int, sign: int):
+        """
+        :param j: int, the layer to add (sign=1) or remove (sign=-1)
+        :param sign: int, 1 or -1
+        :return: None
+        """
+        _codes = self.codes[:, j]
+        _missing = _codes < 0
+        self.key += sign * np.where(_missing, 0, _codes) * self.weights[j]
+        self.n_missing += sign * _missing
+
+    def move_to(self, layer_ids: Sequence[int]) -> int:
+        """
+        :param layer_ids: list of int, the positions of the layers of the new subset
+        :return: int, the number of layers added or removed
+        """
+        _new = set(layer_ids)
+        _old = set(self.layers)
+        _changes = sorted(_old - _new) + sorted(_new - _old)
+        if len(_changes) > len(_new):
+            # cheaper to start over
+            self.key[:] = 0
+            self.n_missing[:] = 0
+            _old = set()
+            _changes = sorted(_new)
+        for j in _changes:
+            self._update(j, -1 if j in _old else 1)
+        self.layers = tuple(sorted(_new))
+        if _changes:
+            self._groups = None
+        return len(_changes)
+
+    def groups(
+        self,
+    ) -> Tuple[Optional[np.ndarray], np.ndarray, np.ndarray, np.ndarray]:
+        """
+        :return: Tuple[Optional[np.ndarray], np.ndarray, np.ndarray, np.ndarray],
+            the positions of the individuals having an opinion on every layer of the subset
+            (None if no individual misses any), the consensus group of each of them,
+            in order of first appearance as in PartitionCache.get(), the key of each group
+            and the size of each group
+        """
+        if self._groups is None:
+            _rows = None
+            _key = self.key
+            if self.n_missing.any():
+                _rows = np.flatnonzero(self.n_missing == 0)
+                _key = _key[_rows]
+            labels, _keys = pd.factorize(_key, sort=False)
+            labels = labels.astype(np.int64, copy=False)
+            self._groups = (
+                _rows,
+                labels,
+                np.asarray(_keys, dtype=np.int64),
+                np.bincount(labels, minlength=len(_keys)).astype(np.int64),
+            )
+        return self._groups
+
+    def group_codes(self, j: int) -> np.ndarray:
+        """
+        :param j: int, a layer of the subset
+        :return: np.ndarray, the code on layer j of each consensus group
+        """
+        _, _, _keys, _ = self.groups()
+        return (_keys // self.weights[j]) % self.cardinalities[j]
+
+
+class EMICache:
+    """
+    Memory-bounded cache of the expected mutual information (EMI) of pairs of clusterings.
+    The EMI only depends on the two marginals (the cluster sizes), not on the assignment,
+    and it is symmetric, so values are keyed by a digest of the sorted pair of sorted marginals.
+    Permutations preserve the marginals, so the layers of a null model, and the consensus
+    partitions with the same sizes, pay for the EMI once.
+    Entries are evicted in least-recently-used order once 'max_bytes' is exceeded.
+    An optional shared mapping, e.g. a multiprocessing.Manager().dict(), is read on local misses
+    and written with the new values, so that worker processes share what they compute.
+    New values are written in batches of 'batch_size' (one update of the mapping per batch),
+    and the remaining ones by flush(): with a Manager, every read and every batch is a round trip.
+    ------------
+    Example
+    ------------
+    >>> cache = EMICache(shared=multiprocessing.Manager().dict())
+    >>> set_emi_cache(cache)  # in each worker, e.g. as Pool initializer
+    >>> cache.flush()  # at the end of each task
+    """
+
+    # approximate memory of one entry: key, value and dictionary overhead
+    _ENTRY_BYTES = 200
+
+    def __init__(
+        self,
+        max_bytes: int = 2**24,
+        shared: Optional[MutableMapping[bytes, float]] = None,
+        batch_size: int = 64,
+    ):
+        """
+        :param max_bytes: int, the maximum memory of the local entries
+            Default: 16 MiB
+        :param shared: Optional[MutableMapping], a mapping shared across processes
+            Default: None
+        :param batch_size: int, the number of new values written to the shared mapping at once
+            Default: 64
+        """
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.batch_size = batch_size
+        self._values: OrderedDict[bytes, float] = OrderedDict()
+        # new values not yet written to the shared mapping
+        self._pending: Dict[bytes, float] = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        :return: int, the approximate memory of the local entries
+        """
+        return len(self._values) * self._ENTRY_BYTES
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        :return: float, the fraction of lookups served from the cache
+        """
+        _total = self.hits + self.misses
+        return self.hits / _total if _total > 0 else 0.0
+
+    @staticmethod
+    def marginals(pi: np.ndarray, pj: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param pi: 1d np.array, the cluster sizes of a clustering
+        :param pj: 1d np.array, the cluster sizes of the other clustering
+        :return: Tuple[np.ndarray, np.ndarray], the sorted pair of sorted non-zero cluster sizes
+        """
+        _a = np.sort(pi[pi > 0]).astype(np.int64)
+        _b = np.sort(pj[pj > 0]).astype(np.int64)
+        if (len(_a), _a.tobytes()) > (len(_b), _b.tobytes()):
+            _a, _b = _b, _a
+        return _a, _b
+
+    @staticmethod
+    def key(pi: np.ndarray, pj: np.ndarray) -> bytes:
+        """
+        :param pi: 1d np.array, the cluster sizes of a clustering
+        :param pj: 1d np.array, the cluster sizes of the other clustering
+        :return: bytes, the digest of the sorted pair of sorted cluster sizes
+        """
+        _a, _b = EMICache.marginals(pi, pj)
+        _digest = blake2b(digest_size=16)
+        _digest.update(len(_a).to_bytes(8, "little"))
+        _digest.update(_a.tobytes())
+        _digest.update(_b.tobytes())
+        return _digest.digest()
+
+    def get(self, key: bytes) -> Optional[float]:
+        """
+        :param key: bytes, see EMICache.key()
+        :return: Optional[float], the cached EMI, or None if it is not cached
+        """
+        if key in self._values:
+            self._values.move_to_end(key)
+            self.hits += 1
+            return self._values[key]
+        if self.shared is not None:
+            _value = self.shared.get(key)
+            if _value is not None:
+                self.hits += 1
+                self._store(key, _value)
+                return _value
+        self.misses += 1
+        return None
+
+    def put(self, key: bytes, value: float):
+        """
+        :param key: bytes, see EMICache.key()
+        :param value: float, the EMI
+        :return: None
+        """
+        self._store(key, value)
+        if self.shared is not None:
+            self._pending[key] = value
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """
+        Writes the new values to the shared mapping, if any
+        :return: None
+        """
+        if self.shared is not None and self._pending:
+            self.shared.update(self._pending)
+            self._pending = dict()
+
+    def _store(self, key: bytes, value: float):
+        """
+        :param key: bytes, see EMICache.key()
+        :param value: float, the EMI
+        :return: None
+        """
+        self._values[key] = value
+        while self.nbytes > self.max_bytes and len(self._values) > 1:
+            self._values.popitem(last=False)
@@ -1,17 +1,259 @@
+import numpy as np
 import pandas as pd
-from typing import Any, Dict, List, Set, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple, Union
 
+from multiway_alignment.partition import ConsensusPartition
 
-def get_consensus_labels(opinions: Union[pd.DataFrame, pd.Series]) -> List[str]:
+if TYPE_CHECKING:
+    from multiway_alignment.bitmap_index import BitmapIndex
+
+# largest radix product for which the mixed-radix group code is guaranteed
+# to fit in an int64 (one bit of headroom for the missing-value sentinel)
+_MAX_RADIX = 2**62
+
+
+def _factorize_layer(values: Any) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param values: 1d array-like with the opinion labels of one layer
+    :return: Tuple[np.ndarray, np.ndarray], the int64 codes (-1 for missing values)
+        and the sorted unique labels, so that uniques[codes[i]] == values[i]
+    """
+    codes, uniques = pd.factorize(np.asarray(values), sort=True)
+    return codes.astype(np.int64, copy=False), np.asarray(uniques)
+
+
+def _encode_opinions(
+    opinions: Union[pd.DataFrame, pd.Series], missing: str = "drop"
+) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """
+    Factorizes every layer once to small integer codes
+    :param opinions: pd.DataFrame having one column per topic and one row per individual,
+        where each element a_ij represents the opinion for individual i on topic j
+    :param missing: str, one of "drop" or "category".
+        If "category", a missing opinion is coded as one more opinion of the topic
+        (and nan is appended to its unique labels), so that no individual is excluded
+        Default: "drop"
+    :return: Tuple[np.ndarray, list], a (n_individuals x n_topics) int64 matrix of codes,
+        where missing opinions are coded as -1, and the list of unique labels per topic
+    """
+    assert missing in ("drop", "category")
+    if isinstance(opinions, pd.Series):
+        opinions = opinions.to_frame()
+    codes = np.empty((len(opinions), len(opinions.columns)), dtype=np.int64)
+    uniques = []
+    for j, col in enumerate(opinions.columns):
+        codes[:, j], _uniques = _factorize_layer(opinions[col].values)
+        if missing == "category" and (codes[:, j] < 0).any():
+            codes[codes[:, j] < 0, j] = len(_uniques)
+            _uniques = np.append(_uniques, np.nan)
+        uniques.append(_uniques)
+    return codes, uniques
+
+
+def _combine_codes(codes: np.ndarray) -> Tuple[np.ndarray, int]:
+    """
+    Combines the per-topic codes of each individual into one dense consensus group id.
+    The codes are combined as mixed-radix numbers; whenever the product of the
+    cardinalities would overflow int64, the running code is densified through a
+    hash-table factorization, so the result is always exact.
+    :param codes: (n_individuals x n_topics) int64 matrix of codes, -1 for missing values
+    :return: Tuple[np.ndarray, int], the int64 consensus group id of each individual
+        (-1 for individuals with at least one missing opinion), in lexicographic order
+        of the codes, and the number of consensus groups
+    """
+    if codes.ndim != 2 or codes.shape[1] == 0:
+        raise ValueError("At least one topic is needed to build the consensus groups")
+    if codes.shape[0] == 0:
+        return np.empty(0, dtype=np.int64), 0
+    _missing = (codes < 0).any(axis=1)
+    _key = np.where(_missing, 0, codes[:, 0])
+    _radix = int(_key.max()) + 1
+    for j in range(1, codes.shape[1]):
+        _col = np.where(_missing, 0, codes[:, j])
+        _card = int(_col.max()) + 1
+        if _radix * _card >= _MAX_RADIX:
+            # densify the running code (sort=True keeps the lexicographic order)
+            _key, _uniques = pd.factorize(_key, sort=True)
+            _radix = len(_uniques)
+        _key = _key.astype(np.int64, copy=False) * _card + _col
+        _radix *= _card
+    _key[_missing] = -1
+    return _densify(_key)
+
+
+def _join_keys(
+    high: np.ndarray, high_radix: int, low: np.ndarray, low_radix: int
+) -> Tuple[np.ndarray, int]:
     """
+    :param high: 1d np.array of int64 non-negative keys, the most significant part
+    :param high_radix: int, an upper bound of 'high'
+    :param low: 1d np.array of int64 non-negative keys, the least significant part
+    :param low_radix: int, an upper bound of 'low'
+    :return: Tuple[np.ndarray, int], the mixed-radix key (in lexicographic order of
+        the (high, low) pairs) and its upper bound. The parts are densified first
+        if the product of the bounds would overflow int64
+    """
+    if high_radix * low_radix >= _MAX_RADIX:
+        high, _uniques = pd.factorize(high, sort=True)
+        high_radix = len(_uniques)
+    if high_radix * low_radix >= _MAX_RADIX:
+        low, _uniques = pd.factorize(low, sort=True)
+        low_radix = len(_uniques)
+    return high.astype(np.int64, copy=False) * low_radix + low, high_radix * low_radix
+
+
+def _leave_one_out_codes(codes: np.ndarray) -> List[np.ndarray]:
+    """
+    Builds the k leave-one-out consensus partitions of k topics from shared prefix and suffix
+    partitions: the consensus without topic j combines the consensus of the topics before j
+    with the consensus of the topics after j, so that the work is linear in the number of topics.
+    Prefixes and suffixes are kept as mixed-radix keys, so each topic costs one densification
+    :param codes: (n_individuals x n_topics) int64 matrix of dense codes, -1 for missing values
+    :return: List[np.ndarray], for each topic j, the consensus group id of each individual over
+        all the topics but j, the same as _combine_codes(np.delete(codes, j, axis=1))[0]
+    :raise ValueError: if there are less than two topics
+    """
+    _k = codes.shape[1]
+    if _k < 2:
+        raise ValueError("Multiway alignment needs at least two topics")
+    _missing = codes < 0
+    _cols = np.where(_missing, 0, codes)
+    _cards = [int(_cols[:, j].max(initial=0)) + 1 for j in range(_k)]
+    # _suffix[j] is the (key, radix, missing) of the topics j+1, ..., k-1
+    _suffix = [(_cols[:, _k - 1], _cards[_k - 1], _missing[:, _k - 1])] * (_k - 1)
+    for j in range(_k - 3, -1, -1):
+        _key, _radix, _miss = _suffix[j + 1]
+        _suffix[j] = (
+            *_join_keys(_cols[:, j + 1], _cards[j + 1], _key, _radix),
+            _miss | _missing[:, j + 1],
+        )
+    loo = []
+    _prefix, _prefix_radix, _prefix_missing = _cols[:, 0], _cards[0], _missing[:, 0]
+    for j in range(_k):
+        if j == 0:
+            _key, _, _miss = _suffix[0]
+        elif j == _k - 1:
+            _key, _miss = _prefix, _prefix_missing
+        else:
+            _s_key, _s_radix, _s_miss = _suffix[j]
+            _key = _join_keys(_prefix, _prefix_radix, _s_key, _s_radix)[0]
+            _miss = _prefix_missing | _s_miss
+            _prefix, _prefix_radix = _join_keys(
+                _prefix, _prefix_radix, _cols[:, j], _cards[j]
+            )
+            _prefix_missing = _prefix_missing | _missing[:, j]
+        loo.append(_densify(np.where(_miss, -1, _key))[0])
+    return loo
+
+
+def _densify(key: np.ndarray, sort: bool = True) -> Tuple[np.ndarray, int]:
+    """
+    :param key: 1d np.array of int64 group keys, -1 for excluded individuals
+    :param sort: bool, if True, the group ids follow the order of the keys,
+        otherwise the order of first appearance, which only depends on the partition
+        Default: True
+    :return: Tuple[np.ndarray, int], the dense group id of each individual
+        (-1 if excluded), and the number of groups
+    """
+    labels, _uniques = pd.factorize(key, sort=sort)
+    labels = labels.astype(np.int64, copy=False)
+    if sort:
+        if len(_uniques) > 0 and _uniques[0] < 0:
+            # -1 was factorized as the smallest key: shift it back to the sentinel
+            labels -= 1
+            return labels, len(_uniques) - 1
+        return labels, len(_uniques)
+    _excluded = np.flatnonzero(_uniques < 0)
+    if len(_excluded) > 0:
+        # move the id of the -1 key back to the sentinel, and close the gap
+        labels[labels == _excluded[0]] = -1
+        labels[labels > _excluded[0]] -= 1
+        return labels, len(_uniques) - 1
+    return labels, len(_uniques)
+
+
+def get_consensus_codes(
+    opinions: Union[pd.DataFrame, pd.Series],
+    index: Optional["BitmapIndex"] = None,
+    validate: bool = False,
+) -> np.ndarray:
+    """
+    Returns the consensus group of each individual as a dense integer id
     :param opinions: pd.DataFrame having one column per topic and one row per individual,
         where each element a_ij represents the opinion for individual i on topic j
         and columns names are the topic names
-    :return: List[str], a list of consensus group labels (str)
+    :param index: Optional[BitmapIndex], an index built on the same opinions,
+        used to build the consensus groups by intersecting bitmaps.
+        The opinions are checked against the fingerprint of the index (ValueError if they differ)
+        Default: None
+    :param validate: bool, if True, every opinion is checked against the index
+        (see BitmapIndex.matches)
+        Default: False
+    :return: np.ndarray, the int64 consensus group id of each individual, in row order.
+        Ids go from 0 to (number of consensus groups - 1), in lexicographic order of the opinions.
+        Individuals with at least one missing opinion get id -1
+    ------------
+    Example
+    ------------
+    >>> df = pd.DataFrame({"A": [0, 0, 1], "B": [1, 1, 0], "C": [0, 0, 1]})
+    >>> get_consensus_codes(opinions=df)
+    array([0, 0, 1])
+    """
+    if opinions.empty:
+        return np.empty(0, dtype=np.int64)
+    if index is not None:
+        _check_index(opinions, index, validate)
+        return index.consensus_groups(_topics_of(opinions))[0]
+    codes, _ = _encode_opinions(opinions)
+    labels, _ = _combine_codes(codes)
+    return labels
+
+
+def _topics_of(opinions: Union[pd.DataFrame, pd.Series]) -> List[Any]:
+    """
+    :param opinions: pd.DataFrame or pd.Series
+    :return: list, the topic names
+    """
+    if isinstance(opinions, pd.Series):
+        return [opinions.name]
+    return list(opinions.columns)
+
+
+def _check_index(
+    opinions: Union[pd.DataFrame, pd.Series], index: "BitmapIndex", validate: bool
+):
+    """
+    :param opinions: pd.DataFrame having one column per topic and one row per individual
+    :param index: BitmapIndex
+    :param validate: bool, see BitmapIndex.matches
+    :return: None
+    :raise ValueError: if the index does not hold the same opinions for the same individuals
+    """
+    if not index.matches(opinions, validate=validate):
+        raise ValueError("The index was not built on the same opinions")
+
+
+def get_consensus_labels(
+    opinions: Union[pd.DataFrame, pd.Series], missing: str = "category"
+) -> List[Optional[str]]:
+    """
+    :param opinions: pd.DataFrame having one column per topic and one row per individual,
+        where each element a_ij represents the opinion for individual i on topic j
+        and columns names are the topic names
+    :param missing: str, one of "category" or "drop" (see get_consensus_partition)
+        Default: "category"
+    :return: List[str], a list of consensus group labels (str), in row order.
+        A missing opinion is labeled "nan", e.g. "A0.0_Bnan".
+        If missing is "drop", individuals with at least one missing opinion get None instead
     """
-    consensus_dict = get_consensus_partition(opinions=opinions)
-    consensus_df = _get_consensus_labels_df(consensus_partition=consensus_dict)
-    return consensus_df.set_index("id").iloc[opinions.index]["label"].to_list()
+    if opinions.empty:
+        return []
+    if isinstance(opinions, pd.Series):
+        opinions = opinions.to_frame()
+    codes, uniques = _encode_opinions(opinions, missing=missing)
+    labels, n_groups = _combine_codes(codes)
+    _names = _build_partition(opinions, codes, uniques, labels, n_groups).names
+    return [_names[g] if g >= 0 else None for g in labels]
 
 
 def _get_consensus_labels_df(consensus_partition: Dict[str, Set[Any]]) -> pd.DataFrame:
@@ -29,15 +271,35 @@ def _get_consensus_labels_df(consensus_partition: Dict[str, Set[Any]]) -> pd.Dat
 
 
 def get_consensus_partition(
-    opinions: Union[pd.DataFrame, pd.Series]
-) -> Dict[str, Set[Any]]:
+    opinions: Union[pd.DataFrame, pd.Series],
+    compact: bool = False,
+    index: Optional["BitmapIndex"] = None,
+    validate: bool = False,
+    missing: str = "category",
+) -> Union[Dict[str, Set[Any]], ConsensusPartition]:
     """
     Returns the consensus groups (faster)
     :param opinions: pd.DataFrame having one column per topic and one row per individual,
         where each element a_ij represents the opinion for individual i on topic j
         and columns names are the topic names
+    :param compact: bool, if True, return a ConsensusPartition instead of a dictionary
+        Default: False
+    :param index: Optional[BitmapIndex], an index built on the same opinions,
+        used to build the consensus groups by intersecting bitmaps.
+        The opinions are checked against the fingerprint of the index (ValueError if they differ)
+        Default: None
+    :param validate: bool, if True, every opinion is checked against the index
+        (see BitmapIndex.matches)
+        Default: False
+    :param missing: str, one of "category" or "drop".
+        If "category", a missing opinion is one more opinion of the topic, labeled "nan",
+        so that e.g. {"A0.0_Bnan": {1}} is a group, as with DataFrame.groupby up to version 0.0.2.
+        If "drop", individuals with at least one missing opinion are in no group,
+        as in get_consensus_partition_recursive
+        Default: "category"
     :return: dict[str, set], a dictionary of consensus group label (str) -> consensus group members (set)
         Note: Only non-empty sets are returned!
+        If compact is True, a ConsensusPartition with the same groups
     ------------
     Example
     ------------
@@ -53,29 +315,108 @@ def get_consensus_partition(
     >>> df = pd.DataFrame({"A": [0, 0, 1], "B": [1, 1, 0], "C": [0, 0, 1]})
     >>> get_consensus_partition(opinions=df)
     """
-    consensus_groups = {}
-    _topics = list(opinions.columns)
-    _cg = opinions.groupby(by=_topics).groups
-    for key, value in _cg.items():
-        if len(_topics) == 1:
-            _formatted_key = f"{_topics[0]}{key}"
-        else:
-            _joined_key = [
-                "".join((str(col_name), str(label)))
-                for col_name, label in zip(_topics, key)  # type: ignore
-            ]  # type: ignore
-            _formatted_key = "_".join(_joined_key)
-        consensus_groups[_formatted_key] = set(value)
-    return consensus_groups
+    if isinstance(opinions, pd.Series):
+        opinions = opinions.to_frame()
+    if len(opinions.columns) == 0:
+        return ConsensusPartition(np.empty(0), 0) if compact else {}
+    if index is not None:
+        _check_index(opinions, index, validate)
+        _topics = _topics_of(opinions)
+        labels, n_groups, group_codes = index.consensus_groups(_topics, missing)
+        uniques = [index.uniques[index.topics.index(t)] for t in _topics]
+        # the missing opinions of a topic, if any, are coded after its unique labels
+        uniques = [
+            np.append(_uniques, np.nan)
+            if (group_codes[:, j] == len(_uniques)).any()
+            else _uniques
+            for j, _uniques in enumerate(uniques)
+        ]
+        partition = ConsensusPartition(
+            labels,
+            n_groups,
+            index=opinions.index,
+            topics=_topics,
+            uniques=uniques,
+            group_codes=group_codes,
+        )
+        return partition if compact else partition.to_dict()
+    codes, uniques = _encode_opinions(opinions, missing=missing)
+    labels, n_groups = _combine_codes(codes)
+    partition = _build_partition(opinions, codes, uniques, labels, n_groups)
+    return partition if compact else partition.to_dict()
+
+
+def _build_partition(
+    opinions: pd.DataFrame,
+    codes: np.ndarray,
+    uniques: List[np.ndarray],
+    labels: np.ndarray,
+    n_groups: int,
+    group_prefixes: Optional[List[str]] = None,
+) -> ConsensusPartition:
+    """
+    :param opinions: pd.DataFrame having one column per topic and one row per individual
+    :param codes: (n_individuals x n_topics) int64 matrix of codes
+    :param uniques: list of np.ndarray, the unique labels of each topic
+    :param labels: np.ndarray, the dense consensus group id of each individual, -1 if excluded
+    :param n_groups: int, the number of consensus groups
+    :param group_prefixes: list of str, an optional prefix for each group name
+    :return: ConsensusPartition
+    """
+    partition = ConsensusPartition(
+        labels,
+        n_groups,
+        index=opinions.index,
+        topics=list(opinions.columns),
+        uniques=uniques,
+    )
+    # codes of the first member of each group, to name the groups on request
+    partition.group_codes = codes[partition.members[partition.offsets[:-1]]]
+    partition.group_prefixes = group_prefixes
+    return partition
+
+
+def _refine_groups(
+    groups: np.ndarray, layer_codes: np.ndarray
+) -> Tuple[np.ndarray, int]:
+    """
+    Splits every consensus group by the opinions on one more topic, in a single pass:
+    the individuals are stably sorted by (current group id, topic code) and a new group
+    starts wherever the pair changes
+    :param groups: np.ndarray, the int64 consensus group id of each individual, -1 if excluded
+    :param layer_codes: np.ndarray, the int64 code of each individual on the next topic,
+        -1 for missing values
+    :return: Tuple[np.ndarray, int], the refined group id of each individual
+        (-1 if excluded or missing), in lexicographic order of (group id, code),
+        and the number of refined groups
+    """
+    _refined = np.full(len(groups), -1, dtype=np.int64)
+    _idx = np.flatnonzero((groups >= 0) & (layer_codes >= 0))
+    if len(_idx) == 0:
+        return _refined, 0
+    # both factors are smaller than the number of individuals, so the key fits in int64
+    _key = groups[_idx] * (int(layer_codes[_idx].max()) + 1) + layer_codes[_idx]
+    _order = np.argsort(_key, kind="stable")
+    _sorted_key = _key[_order]
+    _new_group = np.empty(len(_idx), dtype=bool)
+    _new_group[0] = True
+    np.not_equal(_sorted_key[1:], _sorted_key[:-1], out=_new_group[1:])
+    _refined[_idx[_order]] = np.cumsum(_new_group) - 1
+    return _refined, int(_new_group.sum())
 
 
 def get_consensus_partition_recursive(
     opinions: Union[pd.DataFrame, pd.Series],
     consensus_groups: Dict[str, Set[Any]] = {},
     next_topic_idx: int = 0,
-) -> Dict[str, Set[Any]]:
+    sort_layers: bool = False,
+    compact: bool = False,
+) -> Union[Dict[str, Set[Any]], ConsensusPartition]:
     """
-    Recursive function that traverses all the topics and builds the consensus groups
+    Traverses all the topics and builds the consensus groups by partition refinement:
+    at each topic, every current group is split by the opinions on that topic
+    in a single sort-based pass, until all the topics are processed or
+    every group is a singleton
     :param opinions: pd.DataFrame having one column per topic and one row per individual,
         where each element a_ij represents the opinion of individual i on topic j
     :param consensus_groups: dict[str, set], a dictionary of consensus group label (str) -> consensus group members (set)
@@ -83,8 +424,15 @@ def get_consensus_partition_recursive(
         Default: empty dictionary
     :param next_topic_idx: int, the index of next topic to consider
         Default: 0 (first column in opinions)
+    :param sort_layers: bool, if True, the topics are processed from the one with most opinions
+        to the one with fewest, so that the groups shrink fastest.
+        The returned partition and labels do not depend on this
+        Default: False
+    :param compact: bool, if True, return a ConsensusPartition instead of a dictionary
+        Default: False
     :return: current_sets, dict[str, set], a dictionary of consensus group label (str) -> consensus group members (set)
         Note: Only non-empty sets are returned!
+        If compact is True, a ConsensusPartition with the same groups
     ------------
     Example
     ------------
@@ -102,37 +450,42 @@ def get_consensus_partition_recursive(
     >>> df = pd.DataFrame({"A": [0, 0, 1], "B": [1, 1, 0], "C": [0, 0, 1]})
     >>> get_consensus_partition_recursive(opinions=df)
     """
-    _num_of_layers = len(opinions.columns)
-    # recursion base case: no layer left to be processed
-    if next_topic_idx == _num_of_layers:
-        return consensus_groups
-    else:
-        _next_layer = opinions.columns[next_topic_idx]
-        _updated_mutual_clusters = {}
-        if len(consensus_groups) == 0:
-            # in this case, we need to create the keys for the dictionary from scratch
-            for _cluster_label in opinions[_next_layer].unique():
-                _cluster_content = opinions[opinions[_next_layer] == _cluster_label][
-                    _next_layer
-                ].index
-                _key = str(_next_layer) + str(_cluster_label)
-                _updated_mutual_clusters[_key] = set(_cluster_content)
-            return get_consensus_partition_recursive(
-                opinions, _updated_mutual_clusters, next_topic_idx + 1
-            )
-        else:
-            # in this case, we start from the current mutual clusters and compare with the current layer
-            _updated_mutual_clusters = {}
-            for mc_id, curr_mc in consensus_groups.items():
-                for _cluster_label in opinions[_next_layer].unique():
-                    _cluster_content = opinions[
-                        opinions[_next_layer] == _cluster_label
-                    ][_next_layer].index
-                    _new_key_suffix = str(_next_layer) + str(_cluster_label)
-                    _key = str(mc_id) + "_" + _new_key_suffix
-                    _new_set = curr_mc.intersection(set(_cluster_content))
-                    if len(_new_set) > 0:
-                        _updated_mutual_clusters[_key] = _new_set
-            return get_consensus_partition_recursive(
-                opinions, _updated_mutual_clusters, next_topic_idx + 1
-            )
+    if isinstance(opinions, pd.Series):
+        opinions = opinions.to_frame()
+    _topics = list(opinions.columns)[next_topic_idx:]
+    # base case: no layer left to be processed
+    if len(_topics) == 0:
+        return ConsensusPartition(np.empty(0), 0) if compact else consensus_groups
+    codes, uniques = _encode_opinions(opinions[_topics])
+
+    # current groups: either everybody together, or the groups given as input
+    _prefixes: List[str] = [""]
+    groups = np.zeros(len(opinions), dtype=np.int64)
+    if len(consensus_groups) > 0:
+        _prefixes = [str(mc_id) + "_" for mc_id in consensus_groups.keys()]
+        groups[:] = -1
+        for mc_idx, curr_mc in enumerate(consensus_groups.values()):
+            groups[opinions.index.get_indexer(pd.Index(list(curr_mc)))] = mc_idx
+    n_groups = len(_prefixes)
+    _initial_groups = groups.copy()
+
+    _order = list(range(len(_topics)))
+    if sort_layers:
+        _order.sort(key=lambda j: len(uniques[j]), reverse=True)
+    for step, j in enumerate(_order):
+        groups, n_groups = _refine_groups(groups, codes[:, j])
+        if n_groups == np.count_nonzero(groups >= 0):
+            # every group is a singleton: the remaining topics cannot split them,
+            # they can only exclude the individuals with missing opinions
+            groups[(codes[:, _order[step + 1 :]] < 0).any(axis=1)] = -1
+            break
+
+    # drop the groups emptied by missing opinions after the early stop
+    groups, n_groups = _densify(groups)
+    partition = _build_partition(opinions[_topics], codes, uniques, groups, n_groups)
+    if len(consensus_groups) > 0:
+        partition.group_prefixes = [
+            _prefixes[g]
+            for g in _initial_groups[partition.members[partition.offsets[:-1]]]
+        ]
+    return partition if compact else partition.to_dict()
@@ -0,0 +1,235 @@
+import typing
+
+import numpy as np
+
+
+class LayerConstraints:
+    """
+    The combinations of layers allowed by constraints: layers that every combination
+    must include or must exclude, a range of sizes (number of layers), and groups of layers
+    that are only taken together. The allowed layers are split into units, a group or a single layer:
+    a combination is the union of the required units (those with an included layer)
+    and of a subset of the other, free, units. The combinations of a size are enumerated
+    as the subsets of free units of the remaining size, so that the work only depends
+    on the number of allowed combinations, which are counted without enumerating them
+    ------------
+    Example
+    ------------
+    >>> space = LayerConstraints(["A", "B", "C", "D"], include=["A"], groups=[["C", "D"]])
+    >>> space.sizes()
+    [2, 3, 4]
+    >>> space.combinations(3)
+    [(0, 2, 3)]
+    """
+
+    def __init__(
+        self,
+        layers: typing.Sequence[typing.Any],
+        include: typing.Optional[typing.Sequence[typing.Any]] = None,
+        exclude: typing.Optional[typing.Sequence[typing.Any]] = None,
+        groups: typing.Optional[typing.Sequence[typing.Sequence[typing.Any]]] = None,
+        min_size: int = 2,
+        max_size: typing.Optional[int] = None,
+    ):
+        """
+        :param layers: list, the layer names
+        :param include: Optional[list], the layers in every combination
+            Default: None
+        :param exclude: Optional[list], the layers in no combination.
+            A group with an excluded layer is excluded
+            Default: None
+        :param groups: Optional[list of lists], disjoint groups of layers,
+            each of them in a combination with all its layers or not at all
+            Default: None
+        :param min_size: int, the smallest number of layers of a combination
+            Default: 2
+        :param max_size: Optional[int], the largest number of layers of a combination
+            Default: None (all the layers)
+        :raise ValueError: if a layer is unknown, in several groups, or both included and excluded
+        """
+        _ids = {layer: j for j, layer in enumerate(layers)}
+
+        def _id(layer: typing.Any) -> int:
+            if layer not in _ids:
+                raise ValueError(f"Unknown layer {layer}")
+            return _ids[layer]
+
+        self.n_layers = len(layers)
+        self.min_size = max(min_size, 2)
+        self.max_size = self.n_layers if max_size is None else max_size
+        _grouped: typing.Dict[int, typing.Tuple[int, ...]] = dict()
+        for _group in groups or []:
+            _unit = tuple(sorted({_id(layer) for layer in _group}))
+            if any(j in _grouped for j in _unit):
+                raise ValueError("A layer is in several groups")
+            _grouped.update(dict.fromkeys(_unit, _unit))
+        _units = sorted(
+            set(_grouped.values())
+            | {(j,) for j in range(self.n_layers) if j not in _grouped}
+        )
+        _excluded = {_id(layer) for layer in exclude or []}
+        _included = {_id(layer) for layer in include or []}
+        _units = [_unit for _unit in _units if not _excluded.intersection(_unit)]
+        _allowed = {j for _unit in _units for j in _unit}
+        for j in _included - _allowed:
+            raise ValueError(f"Layer {layers[j]} is both included and excluded")
+        self.required: typing.Tuple[int, ...] = tuple(
+            sorted(
+                j for _unit in _units if _included.intersection(_unit) for j in _unit
+            )
+        )
+        # the free units, in order of their first layer
+        self.units: typing.List[typing.Tuple[int, ...]] = [
+            _unit for _unit in _units if not _included.intersection(_unit)
+        ]
+        self._n_free = sum(len(_unit) for _unit in self.units)
+        self._tables: typing.Dict[
+            typing.Optional[int], typing.List[typing.List[int]]
+        ] = dict()
+
+    @property
+    def unconstrained(self) -> bool:
+        """
+        :return: bool, True if every combination of 2 or more layers is allowed
+        """
+        return (
+            len(self.units) == self.n_layers
+            and self.min_size == 2
+            and self.max_size >= self.n_layers
+        )
+
+    def _table(
+        self, skip: typing.Optional[int] = None
+    ) -> typing.List[typing.List[int]]:
+        """
+        :param skip: Optional[int], the index of a free unit left out
+            Default: None
+        :return: list of lists of int, table[i][s] is the number of subsets of the free units
+            from the i-th on (except 'skip') whose number of layers is s
+        """
+        if skip not in self._tables:
+            _table = [[0] * (self._n_free + 1) for _ in range(len(self.units) + 1)]
+            _table[-1][0] = 1
+            for i in range(len(self.units) - 1, -1, -1):
+                _size = 0 if i == skip else len(self.units[i])
+                for s in range(self._n_free + 1):
+                    _table[i][s] = _table[i + 1][s]
+                    if i != skip and s >= _size:
+                        _table[i][s] += _table[i + 1][s - _size]
+            self._tables[skip] = _table
+        return self._tables[skip]
+
+    def completions(self, i: int, n_layers: int) -> int:
+        """
+        :param i: int, the index of a free unit
+        :param n_layers: int, a number of layers
+        :return: int, the number of subsets of the free units from the i-th on
+            with that number of layers
+        """
+        if n_layers < 0 or n_layers > self._n_free:
+            return 0
+        return self._table()[i][n_layers]
+
+    def count(self, length: int, unit: typing.Optional[int] = None) -> int:
+        """
+        :param length: int, the number of layers
+        :param unit: Optional[int], the index of a free unit in every combination
+            Default: None
+        :return: int, the number of allowed combinations of that size (including that unit)
+        """
+        _free = length - len(self.required)
+        if unit is not None:
+            _free -= len(self.units[unit])
+        if _free < 0 or _free > self._n_free:
+            return 0
+        return self._table(unit)[0][_free]
+
+    def sizes(self, bounded: bool = True) -> typing.List[int]:
+        """
+        :param bounded: bool, if False, ignore min_size and max_size
+            Default: True
+        :return: list of int, the sizes of 2 or more layers with allowed combinations
+        """
+        _min, _max = (self.min_size, self.max_size) if bounded else (2, self.n_layers)
+        return [
+            length
+            for length in range(_min, min(_max, self.n_layers) + 1)
+            if self.count(length) > 0
+        ]
+
+    def combinations(self, length: int) -> typing.List[typing.Tuple[int, ...]]:
+        """
+        :param length: int, the number of layers
+        :return: list of tuples of int, the allowed combinations of that size,
+            in lexicographic order, as itertools.combinations without constraints
+        """
+        _table = self._table()
+        result: typing.List[typing.Tuple[int, ...]] = []
+
+        def _extend(i: int, free: int, chosen: typing.List[int]):
+            if free == 0:
+                result.append(tuple(sorted(chosen)))
+                return
+            for k in range(i, len(self.units)):
+                _size = len(self.units[k])
+                # only the branches with a subset of the remaining units of that size
+                if _size <= free and _table[k + 1][free - _size] > 0:
+                    _extend(k + 1, free - _size, chosen + list(self.units[k]))
+
+        if self.count(length) > 0:
+            _extend(0, length - len(self.required), list(self.required))
+        return sorted(result)
+
+    def unrank(self, length: int, rank: int) -> typing.Tuple[int, ...]:
+        """
+        :param length: int, the number of layers
+        :param rank: int, the position of a combination in combinations(length)
+        :return: tuple of int, the combination, without enumerating the combinations
+        """
+        assert 0 <= rank < self.count(length)
+        _table = self._table()
+        _free = length - len(self.required)
+        chosen = list(self.required)
+        for i, _unit in enumerate(self.units):
+            if _free == 0:
+                break
+            if len(_unit) > _free:
+                continue
+            # the combinations with the unit come first in lexicographic order
+            _with = _table[i + 1][_free - len(_unit)]
+            if rank < _with:
+                chosen += _unit
+                _free -= len(_unit)
+            else:
+                rank -= _with
+        return tuple(sorted(chosen))
+
+    def sample(
+        self,
+        length: int,
+        rng: np.random.Generator,
+        unit: typing.Optional[int] = None,
+    ) -> typing.Tuple[int, ...]:
+        """
+        :param length: int, the number of layers
+        :param rng: np.random.Generator
+        :param unit: Optional[int], the index of a free unit in the combination
+            Default: None
+        :return: tuple of int, a combination drawn uniformly among the allowed combinations
+            of that size (including that unit)
+        """
+        assert self.count(length, unit) > 0
+        _table = self._table(unit)
+        _free = length - len(self.required)
+        chosen = list(self.required)
+        if unit is not None:
+            _free -= len(self.units[unit])
+            chosen += self.units[unit]
+        for i, _unit in enumerate(self.units):
+            if i == unit or len(_unit) > _free:
+                continue
+            # take the unit with the share of the subsets of the remaining units that include it
+            if rng.random() * _table[i][_free] < _table[i + 1][_free - len(_unit)]:
+                chosen += _unit
+                _free -= len(_unit)
+        return tuple(sorted(chosen))
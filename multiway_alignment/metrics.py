@@ -0,0 +1,866 @@
+from functools import partial
+from math import log
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp  # type: ignore
+from scipy.special import gammaln  # type: ignore
+
+try:
+    from sklearn.metrics.cluster import expected_mutual_information  # type: ignore
+except ImportError:  # scikit-learn versions that do not export it
+    from sklearn.metrics.cluster._expected_mutual_info_fast import (  # type: ignore
+        expected_mutual_information,
+    )
+
+from multiway_alignment.cache import EMICache
+
+# largest count whose logarithm is kept in the table (8 MiB)
+_MAX_LOG_TABLE = 2**20
+# largest (rows x cols) contingency table counted densely with bincount
+_MAX_DENSE_CELLS = 2**24
+# largest (rows x cols) contingency table whose EMI is computed cluster pair by cluster pair
+_MAX_DIRECT_EMI = 2**16
+
+_log_table = np.zeros(1, dtype=np.float64)
+
+
+def _log_counts(counts: np.ndarray) -> np.ndarray:
+    """
+    :param counts: 1d np.array of positive integers
+    :return: 1d np.array, log(n) of each count, read from a table grown on demand
+        (the values are the same as np.log, so the results match sklearn bit for bit)
+    """
+    global _log_table
+    _max = int(counts.max(initial=0))
+    if _max >= _MAX_LOG_TABLE:
+        return np.log(counts.astype(np.float64))
+    if _max >= len(_log_table):
+        _n = np.arange(1, min(max(2 * len(_log_table), _max + 1), _MAX_LOG_TABLE))
+        _log_table = np.concatenate(([0.0], np.log(_n.astype(np.float64))))
+    return _log_table[counts]
+
+
+def _entropy_from_counts(counts: np.ndarray) -> float:
+    """
+    :param counts: 1d np.array, the size of each cluster
+    :return: float, the entropy (in nats) of the clustering, as in sklearn.metrics.cluster.entropy
+    """
+    pi = counts[counts > 0]
+    # single cluster => zero entropy
+    if pi.size <= 1:
+        return 0.0
+    pi_sum = float(pi.sum())
+    return float(-np.sum((pi / pi_sum) * (_log_counts(pi) - log(pi_sum))))
+
+
+def _as_codes(labels: np.ndarray) -> np.ndarray:
+    """
+    :param labels: 1d np.array, the cluster label of each item
+    :return: 1d np.array, non-negative integer codes of the labels, in sorted order of the labels,
+        smaller than the number of labels
+    """
+    labels = np.asarray(labels)
+    # small non-negative integers are their own codes; larger labels would size the tables
+    # by their values rather than by the number of clusters
+    if labels.dtype.kind in "iu" and (
+        len(labels) == 0 or (labels.min() >= 0 and labels.max() < len(labels))
+    ):
+        return labels
+    return pd.factorize(labels, sort=True, use_na_sentinel=False)[0]
+
+
+def contingency_cells(
+    labels_true: np.ndarray, labels_pred: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Counts the non-zero cells of the contingency table of two clusterings.
+    The path is chosen by cardinality: a bincount on the combined codes when the dense table
+    is small, otherwise a hash table of the non-zero cells only (memory proportional to
+    the number of non-zero cells, e.g. when one clustering has close to n clusters)
+    :param labels_true: 1d np.array, the cluster label of each item
+    :param labels_pred: 1d np.array, the cluster label of each item
+    :return: Tuple[np.ndarray, np.ndarray, np.ndarray], the (dense) row cluster,
+        the (dense) column cluster and the count of each non-zero cell
+    """
+    _true, _pred = _as_codes(labels_true), _as_codes(labels_pred)
+    if len(_true) != len(_pred):
+        raise ValueError(
+            f"labels_true and labels_pred must have the same length, got {len(_true)} and {len(_pred)}"
+        )
+    _n_true = int(_true.max(initial=-1)) + 1
+    _n_pred = int(_pred.max(initial=-1)) + 1
+    _key = _true.astype(np.int64) * _n_pred + _pred
+    if _n_true * _n_pred <= max(_MAX_DENSE_CELLS, len(_key)):
+        _counts = np.bincount(_key, minlength=_n_true * _n_pred)
+        _cells = np.flatnonzero(_counts)
+        _counts = _counts[_cells]
+    else:
+        # sorted cells, so that the sums run in the same order as in the dense path
+        _cell_ids, _cells = pd.factorize(_key, sort=True)
+        _counts = np.bincount(_cell_ids, minlength=len(_cells))
+    rows, cols = np.divmod(_cells, _n_pred)
+    # drop the codes that do not occur, so that rows and cols are dense
+    _row_ids = np.zeros(_n_true, dtype=np.int64)
+    _row_ids[rows] = 1
+    _col_ids = np.zeros(_n_pred, dtype=np.int64)
+    _col_ids[cols] = 1
+    return (
+        np.cumsum(_row_ids)[rows] - 1,
+        np.cumsum(_col_ids)[cols] - 1,
+        _counts.astype(np.int64),
+    )
+
+
+def _mutual_info_from_cells(
+    rows: np.ndarray,
+    cols: np.ndarray,
+    counts: np.ndarray,
+    pi: np.ndarray,
+    pj: np.ndarray,
+) -> float:
+    """
+    :param rows: 1d np.array, the (dense) row cluster of each non-zero cell of the contingency table
+    :param cols: 1d np.array, the (dense) column cluster of each non-zero cell
+    :param counts: 1d np.array, the count of each non-zero cell
+    :param pi: 1d np.array, the row marginals
+    :param pj: 1d np.array, the column marginals
+    :return: float, the mutual information (in nats), as in sklearn.metrics.mutual_info_score
+    """
+    # Since MI <= min(H(X), H(Y)), any labelling with a single cluster implies MI = 0
+    if pi.size == 1 or pj.size == 1:
+        return 0.0
+    contingency_sum = counts.sum()
+    log_contingency_nm = _log_counts(counts)
+    contingency_nm = counts / contingency_sum
+    outer = pi.take(rows).astype(np.int64, copy=False) * pj.take(cols).astype(
+        np.int64, copy=False
+    )
+    log_outer = -np.log(outer) + log(pi.sum()) + log(pj.sum())
+    mi = (
+        contingency_nm * (log_contingency_nm - log(contingency_sum))
+        + contingency_nm * log_outer
+    )
+    mi = np.where(np.abs(mi) < np.finfo(mi.dtype).eps, 0.0, mi)
+    return float(np.clip(mi.sum(), 0.0, None))
+
+
+def _table_with_marginals(a: np.ndarray, b: np.ndarray) -> sp.csr_matrix:
+    """
+    :param a: 1d np.array, the row marginals
+    :param b: 1d np.array, the column marginals, with the same sum as 'a'
+    :return: sp.csr_matrix, a contingency table with those marginals (north-west corner rule)
+    """
+    _ends_a, _ends_b = np.cumsum(a), np.cumsum(b)
+    _ends = np.union1d(_ends_a, _ends_b)
+    _starts = np.concatenate(([0], _ends[:-1]))
+    rows = np.searchsorted(_ends_a, _starts, side="right")
+    cols = np.searchsorted(_ends_b, _starts, side="right")
+    return sp.csr_matrix((_ends - _starts, (rows, cols)), shape=(len(a), len(b)))
+
+
+# cache of expected mutual information shared by all the AMI scores of this process.
+# It is on by default and bounded by EMICache's default budget (16 MiB, least recently used
+# entries evicted first): use set_emi_cache(EMICache(max_bytes=...)) to change the budget,
+# or set_emi_cache(None) to disable it
+_emi_cache: Optional[EMICache] = EMICache()
+
+
+def set_emi_cache(cache: Optional[EMICache]):
+    """
+    Sets the cache of expected mutual information used by the AMI scores of this process
+    (by default, an EMICache of 16 MiB)
+    :param cache: Optional[EMICache], the cache, or None to disable caching
+    :return: None
+    """
+    global _emi_cache
+    _emi_cache = cache
+
+
+def get_emi_cache() -> Optional[EMICache]:
+    """
+    :return: Optional[EMICache], the cache of expected mutual information of this process
+    """
+    return _emi_cache
+
+
+def _expected_mutual_info(pi: np.ndarray, pj: np.ndarray) -> float:
+    """
+    Expected mutual information under random permutations, with the same terms as
+    sklearn.metrics.cluster._expected_mutual_info_fast, but summed over the distinct
+    cluster sizes instead of the pairs of clusters: the term of a pair of clusters only
+    depends on their sizes, so each pair of sizes is computed once and weighted by the number
+    of pairs of clusters having those sizes. This keeps AMI tractable when one clustering
+    has close to n (mostly singleton) clusters
+    :param pi: 1d np.array, the row marginals (cluster sizes)
+    :param pj: 1d np.array, the column marginals (cluster sizes)
+    :return: float, the expected mutual information (in nats)
+    """
+    a, a_mult = np.unique(pi[pi > 0], return_counts=True)
+    b, b_mult = np.unique(pj[pj > 0], return_counts=True)
+    # any labelling with zero entropy implies EMI = 0
+    if a_mult.sum() == 1 or b_mult.sum() == 1:
+        return 0.0
+    n_samples = int(pi.sum())
+    log_n = log(n_samples)
+    gln_n = float(gammaln(n_samples + 1))
+    emi = 0.0
+    for _a, _a_mult in zip(a.tolist(), a_mult.tolist()):
+        # all the (nij, b) pairs with max(1, a + b - N) <= nij <= min(a, b)
+        _start = np.maximum(1, _a - n_samples + b)
+        _end = np.minimum(_a, b) + 1
+        _lengths = np.maximum(_end - _start, 0)
+        _b = np.repeat(b, _lengths)
+        _weights = np.repeat(b_mult, _lengths).astype(np.float64)
+        _nij = (
+            np.arange(_lengths.sum())
+            - np.repeat(np.cumsum(_lengths) - _lengths, _lengths)
+            + np.repeat(_start, _lengths)
+        )
+        term1 = _nij / n_samples
+        term2 = log_n + np.log(_nij) - log(_a) - np.log(_b)
+        gln = (
+            gammaln(_a + 1)
+            + gammaln(_b + 1)
+            + gammaln(n_samples - _a + 1)
+            + gammaln(n_samples - _b + 1)
+            - gammaln(_nij + 1)
+            - gln_n
+            - gammaln(_a - _nij + 1)
+            - gammaln(_b - _nij + 1)
+            - gammaln(n_samples - _a - _b + _nij + 1)
+        )
+        emi += _a_mult * float(np.sum(_weights * term1 * term2 * np.exp(gln)))
+    return emi
+
+
+class Contingency:
+    """
+    Non-zero cells of the contingency table of two clusterings, with the quantities
+    shared by the scores (marginals, mutual information, entropies, expected mutual information)
+    computed on first use, so that several scores of the same pair of clusterings
+    are computed from one table
+    ------------
+    Example
+    ------------
+    >>> table = Contingency.from_labels(np.array([0, 0, 1]), np.array([1, 1, 0]))
+    >>> table.score("nmi"), table.score("vi")
+    (1.0, 0.0)
+    """
+
+    def __init__(
+        self,
+        rows: np.ndarray,
+        cols: np.ndarray,
+        counts: np.ndarray,
+        like: Optional["Contingency"] = None,
+    ):
+        """
+        :param rows: 1d np.array, the (dense) row cluster of each non-zero cell of the contingency table
+        :param cols: 1d np.array, the (dense) column cluster of each non-zero cell
+        :param counts: 1d np.array, the count of each non-zero cell
+        :param like: Optional[Contingency], a table with the same marginals
+            (e.g. the table before a permutation), whose entropies and EMI are reused
+            Default: None
+        """
+        self.rows, self.cols, self.counts = rows, cols, counts
+        self.n_rows = int(rows.max()) + 1 if len(rows) else 0
+        self.n_cols = int(cols.max()) + 1 if len(cols) else 0
+        self.pi = np.bincount(rows, weights=counts, minlength=self.n_rows).astype(
+            np.int64
+        )
+        self.pj = np.bincount(cols, weights=counts, minlength=self.n_cols).astype(
+            np.int64
+        )
+        self.n_samples = int(counts.sum())
+        self._mi: Optional[float] = None
+        self._entropies: Optional[Tuple[float, float]] = None
+        self._emi: Optional[float] = None
+        self._like = like
+
+    @classmethod
+    def from_labels(
+        cls, labels_true: np.ndarray, labels_pred: np.ndarray
+    ) -> "Contingency":
+        """
+        :param labels_true: 1d np.array, the cluster label of each item
+        :param labels_pred: 1d np.array, the cluster label of each item
+        :return: Contingency, the contingency table of the two clusterings
+        """
+        return cls(*contingency_cells(labels_true, labels_pred))
+
+    @classmethod
+    def from_refinement(
+        cls, group_codes: np.ndarray, sizes: np.ndarray, transpose: bool = False
+    ) -> "Contingency":
+        """
+        Builds the table of a clustering L against a clustering C that refines it
+        (each cluster of C lies in one cluster of L, e.g. a layer and a consensus partition
+        that includes it) from the clusters of C only: each cluster of C is one cell.
+        The cells are the same, in the same order, as from_labels(labels of L, labels of C)
+        :param group_codes: 1d np.array, the code on L of each cluster of C, indexed by cluster id
+        :param sizes: 1d np.array, the size of each cluster of C
+        :param transpose: bool, if True, the table of C against L
+            Default: False
+        :return: Contingency, the contingency table of L (rows) and C (columns)
+        """
+        _present = np.zeros(int(group_codes.max(initial=-1)) + 1, dtype=np.int64)
+        _present[group_codes] = 1
+        _rows = (np.cumsum(_present) - 1)[group_codes]
+        _groups = np.arange(len(group_codes), dtype=np.int64)
+        if transpose:
+            return cls(_groups, _rows, sizes.astype(np.int64))
+        _order = np.argsort(_rows, kind="stable")
+        return cls(_rows[_order], _order, sizes[_order].astype(np.int64))
+
+    def expected(self, which_score: str = "nmi") -> float:
+        """
+        :param which_score: str, the name of a registered score with an analytic expectation
+        :return: float, the expected score under random permutations, with the same marginals
+        :raise ValueError: if no analytic expectation is registered for the score
+        """
+        assert which_score in _SCORES, f"Unknown score {which_score}"
+        expectation = _SCORES[which_score][2]
+        if expectation is None:
+            raise ValueError(f"No analytic expectation is registered for {which_score}")
+        return expectation(self)
+
+    @property
+    def single_clusters(self) -> bool:
+        """
+        :return: bool, True if neither clustering splits the data (a perfect match)
+        """
+        return self.n_rows == self.n_cols == 1 or self.n_rows == self.n_cols == 0
+
+    @property
+    def mi(self) -> float:
+        """
+        :return: float, the mutual information (in nats)
+        """
+        if self._mi is None:
+            self._mi = _mutual_info_from_cells(
+                self.rows, self.cols, self.counts, self.pi, self.pj
+            )
+        return self._mi
+
+    @property
+    def entropies(self) -> Tuple[float, float]:
+        """
+        :return: Tuple[float, float], the entropies (in nats) of the row and of the column clusterings
+        """
+        if self._entropies is None and self._like is not None:
+            self._entropies = self._like.entropies
+        if self._entropies is None:
+            self._entropies = (
+                _entropy_from_counts(self.pi),
+                _entropy_from_counts(self.pj),
+            )
+        return self._entropies
+
+    @property
+    def emi(self) -> float:
+        """
+        :return: float, the expected mutual information under random permutations
+        """
+        if self._emi is None and self._like is not None:
+            self._emi = self._like.emi
+        if self._emi is None:
+            if _emi_cache is None:
+                self._emi = self._compute_emi()
+            else:
+                # the EMI only depends on the marginals: look them up before computing it
+                _key = EMICache.key(self.pi, self.pj)
+                _emi = _emi_cache.get(_key)
+                if _emi is None:
+                    _emi = self._compute_emi()
+                    _emi_cache.put(_key, _emi)
+                self._emi = _emi
+        return self._emi
+
+    def _compute_emi(self) -> float:
+        """
+        :return: float, the expected mutual information, computed from the sorted marginals,
+            so that the value only depends on the cache key (see EMICache.key),
+            whichever table with those marginals is seen first
+        """
+        a, b = EMICache.marginals(self.pi, self.pj)
+        if len(a) * len(b) <= _MAX_DIRECT_EMI:
+            return float(
+                expected_mutual_information(_table_with_marginals(a, b), self.n_samples)
+            )
+        return _expected_mutual_info(a, b)
+
+    def score(self, which_score: str = "nmi") -> float:
+        """
+        :param which_score: str, the name of a registered score (see available_scores())
+        :return: float, the score between the row and the column clusterings
+        """
+        assert which_score in _SCORES, f"Unknown score {which_score}"
+        return _SCORES[which_score][0](self)
+
+
+# name -> (score of a contingency table, whether a greater score means more alignment,
+#          expected score under random permutations, if known analytically,
+#          most favourable score given bounds on the entropies, if known)
+_SCORES: Dict[
+    str,
+    Tuple[
+        Callable[[Contingency], float],
+        bool,
+        Optional[Callable[[Contingency], float]],
+        Optional[Callable[[float, float, float, float], float]],
+    ],
+] = {}
+
+
+def register_score(
+    name: str,
+    greater_is_better: bool = True,
+    expectation: Optional[Callable[[Contingency], float]] = None,
+    bound: Optional[Callable[[float, float, float, float], float]] = None,
+) -> Callable[[Callable[[Contingency], float]], Callable[[Contingency], float]]:
+    """
+    Decorator registering a score computed from a Contingency
+    :param name: str, the name of the score, as passed to which_score
+    :param greater_is_better: bool, whether a greater score means more alignment
+        (the maximal alignment curve keeps the best score of each size accordingly)
+        Default: True
+    :param expectation: Optional[Callable], the expected score of a Contingency
+        under random permutations of the labels, used by expected_score(analytic=True)
+        Default: None (the expectation is only estimated by permutations)
+    :param bound: Optional[Callable], see score_bound, used to prune the exact search
+        of the maximal alignment curve
+        Default: None (the score cannot be used by the exact search)
+    :return: Callable, the decorator
+    """
+
+    def _register(
+        score_f: Callable[[Contingency], float]
+    ) -> Callable[[Contingency], float]:
+        _SCORES[name] = (score_f, greater_is_better, expectation, bound)
+        return score_f
+
+    return _register
+
+
+def available_scores() -> List[str]:
+    """
+    :return: List[str], the names of the registered scores
+    """
+    return list(_SCORES)
+
+
+def greater_is_better(which_score: str) -> bool:
+    """
+    :param which_score: str, the name of a registered score
+    :return: bool, whether a greater score means more alignment
+    """
+    assert which_score in _SCORES, f"Unknown score {which_score}"
+    return _SCORES[which_score][1]
+
+
+def has_bound(which_score: str) -> bool:
+    """
+    :param which_score: str, the name of a registered score
+    :return: bool, whether a bound of the score is registered (see score_bound)
+    """
+    assert which_score in _SCORES, f"Unknown score {which_score}"
+    return _SCORES[which_score][3] is not None
+
+
+def score_bound(
+    which_score: str,
+    h_true: float,
+    h_pred: float,
+    h_joint: float,
+    mi: Optional[float] = None,
+) -> float:
+    """
+    :param which_score: str, the name of a registered score with a bound
+    :param h_true: float, the entropy of the row clustering
+    :param h_pred: float, a lower bound of the entropy of the column clustering
+    :param h_joint: float, a lower bound of the entropy of the joint clustering
+        (the intersection of the row and the column clusters)
+    :param mi: Optional[float], an upper bound of the mutual information
+        Default: None (h_true)
+    :return: float, the most favourable score (the greatest, or the lowest
+        if not greater_is_better) of any pair of clusterings with those entropies
+    :raise ValueError: if no bound is registered for the score
+    """
+    assert which_score in _SCORES, f"Unknown score {which_score}"
+    bound = _SCORES[which_score][3]
+    if bound is None:
+        raise ValueError(f"No bound is registered for {which_score}")
+    return bound(h_true, h_pred, h_joint, h_true if mi is None else min(mi, h_true))
+
+
+def _generalized_average(h_true: float, h_pred: float, average_method: str) -> float:
+    """
+    :param h_true: float, the entropy of the row clustering
+    :param h_pred: float, the entropy of the column clustering
+    :param average_method: str, one of "min", "geometric", "arithmetic" or "max"
+    :return: float, the average of the entropies, as in sklearn
+    """
+    if average_method == "min":
+        return min(h_true, h_pred)
+    elif average_method == "geometric":
+        return float(np.sqrt(h_true * h_pred))
+    elif average_method == "arithmetic":
+        return float(np.mean([h_true, h_pred]))
+    elif average_method == "max":
+        return max(h_true, h_pred)
+    raise ValueError(
+        "'average_method' must be 'min', 'geometric', 'arithmetic', or 'max'"
+    )
+
+
+def _nmi(table: Contingency, average_method: str = "arithmetic") -> float:
+    """
+    :param table: Contingency
+    :param average_method: str, how the entropies are averaged
+    :return: float, the normalized mutual information, as in sklearn
+    """
+    # Special limit cases: no clustering since the data is not split.
+    # It corresponds to both labellings having zero entropy.
+    # This is a perfect match hence return 1.0.
+    if table.single_clusters:
+        return 1.0
+    if table.mi == 0:
+        return 0.0
+    return table.mi / _generalized_average(*table.entropies, average_method)
+
+
+def _nmi_bound(
+    h_true: float,
+    h_pred: float,
+    h_joint: float,
+    mi: float,
+    average_method: str = "arithmetic",
+) -> float:
+    """
+    :param h_true: float, the entropy of the row clustering
+    :param h_pred: float, a lower bound of the entropy of the column clustering
+    :param h_joint: float, a lower bound of the entropy of the joint clustering
+    :param mi: float, an upper bound of the mutual information, at most h_true
+    :param average_method: str, how the entropies are averaged
+    :return: float, the greatest normalized mutual information: the mutual information
+        is at most min(mi, H(columns)), and the normalizer does not decrease with the entropy
+        of the columns, so the greatest ratio is reached at H(columns) = max(h_pred, mi)
+    """
+    if h_true == 0:
+        # only a perfect match of single clusters scores more than 0
+        return 1.0 if h_pred == 0 else 0.0
+    normalizer = _generalized_average(h_true, max(h_pred, mi), average_method)
+    return min(mi / normalizer, 1.0) if normalizer > 0 else 1.0
+
+
+def _ami(table: Contingency, average_method: str = "arithmetic") -> float:
+    """
+    :param table: Contingency
+    :param average_method: str, how the entropies are averaged
+    :return: float, the adjusted mutual information, as in sklearn
+    """
+    if table.single_clusters:
+        return 1.0
+    normalizer = _generalized_average(*table.entropies, average_method)
+    denominator = normalizer - table.emi
+    _eps = float(np.finfo("float64").eps)
+    # Avoid 0.0 / 0.0 when expectation equals maximum, i.e. a perfect match
+    if denominator < 0:
+        denominator = min(denominator, -_eps)
+    else:
+        denominator = max(denominator, _eps)
+    return float((table.mi - table.emi) / denominator)
+
+
+def _expected_nmi(table: Contingency, average_method: str = "arithmetic") -> float:
+    """
+    :param table: Contingency
+    :param average_method: str, how the entropies are averaged
+    :return: float, the expected normalized mutual information under random permutations:
+        permutations keep the entropies, so it is the EMI over the same normalizer
+    """
+    if table.single_clusters:
+        return 1.0
+    # a single cluster on one side only: the mutual information is always 0
+    if table.n_rows == 1 or table.n_cols == 1:
+        return 0.0
+    return table.emi / _generalized_average(*table.entropies, average_method)
+
+
+def _expected_ami(table: Contingency) -> float:
+    """
+    :param table: Contingency
+    :return: float, the expected adjusted mutual information under random permutations,
+        0 by construction (1 for the perfect match of two single clusters)
+    """
+    return 1.0 if table.single_clusters else 0.0
+
+
+for _method in ("min", "geometric", "arithmetic", "max"):
+    _suffix = "" if _method == "arithmetic" else f"_{_method}"
+    register_score(
+        f"nmi{_suffix}",
+        expectation=partial(_expected_nmi, average_method=_method),
+        bound=partial(_nmi_bound, average_method=_method),
+    )(partial(_nmi, average_method=_method))
+    register_score(f"ami{_suffix}", expectation=_expected_ami)(
+        partial(_ami, average_method=_method)
+    )
+
+
+@register_score(
+    "mi",
+    expectation=lambda table: table.emi,
+    bound=lambda h_true, h_pred, h_joint, mi: mi,
+)
+def _mi(table: Contingency) -> float:
+    """
+    :param table: Contingency
+    :return: float, the mutual information (in nats), as in sklearn.metrics.mutual_info_score
+    """
+    return table.mi
+
+
+@register_score(
+    "vi",
+    greater_is_better=False,
+    expectation=lambda table: max(sum(table.entropies) - 2 * table.emi, 0.0),
+    # VI = 2 H(joint) - H(rows) - H(columns), and H(joint) >= H(columns);
+    # VI = H(rows) + H(columns) - 2 MI, and MI <= min(mi, H(columns))
+    bound=lambda h_true, h_pred, h_joint, mi: max(
+        h_joint - h_true, h_true - mi + max(h_pred - mi, 0.0), 0.0
+    ),
+)
+def _vi(table: Contingency) -> float:
+    """
+    :param table: Contingency
+    :return: float, the variation of information (in nats), H(X) + H(Y) - 2 MI(X, Y)
+    """
+    h_true, h_pred = table.entropies
+    return max(h_true + h_pred - 2 * table.mi, 0.0)
+
+
+def _expected_ari(table: Contingency) -> float:
+    """
+    :param table: Contingency
+    :return: float, the expected adjusted Rand index under random permutations,
+        0 by construction (1 if every permutation agrees: single clusters or only singletons)
+    """
+    if table.single_clusters or table.n_rows == table.n_cols == table.n_samples:
+        return 1.0
+    return 0.0
+
+
+@register_score("ari", expectation=_expected_ari)
+def _ari(table: Contingency) -> float:
+    """
+    :param table: Contingency
+    :return: float, the adjusted Rand index, as in sklearn.metrics.adjusted_rand_score
+    """
+    n_samples = np.int64(table.n_samples)
+    sum_squares = (table.counts.astype(np.int64) ** 2).sum()
+    # pairs in the same cluster in one clustering only
+    fp = int((table.counts * table.pj[table.cols]).sum() - sum_squares)
+    fn = int((table.counts * table.pi[table.rows]).sum() - sum_squares)
+    tp = int(sum_squares - n_samples)
+    tn = int(n_samples**2 - fp - fn - sum_squares)
+    # Special cases: empty data or full agreement
+    if fn == 0 and fp == 0:
+        return 1.0
+    return 2.0 * (tp * tn - fn * fp) / ((tp + fn) * (fn + tn) + (tp + fp) * (fp + tn))
+
+
+def score_from_contingency(
+    rows: np.ndarray,
+    cols: np.ndarray,
+    counts: np.ndarray,
+    which_score: str = "nmi",
+) -> float:
+    """
+    Computes the score from the non-zero cells of a contingency table,
+    with the same arithmetic as sklearn
+    :param rows: 1d np.array, the (dense) row cluster of each non-zero cell of the contingency table
+    :param cols: 1d np.array, the (dense) column cluster of each non-zero cell
+    :param counts: 1d np.array, the count of each non-zero cell
+    :param which_score: str, the name of a registered score (see available_scores())
+    :return: float, the score between the row and the column clusterings
+    """
+    return Contingency(rows, cols, counts).score(which_score)
+
+
+def label_score(
+    labels_true: np.ndarray, labels_pred: np.ndarray, which_score: str = "nmi"
+) -> float:
+    """
+    :param labels_true: 1d np.array, the cluster label of each item
+    :param labels_pred: 1d np.array, the cluster label of each item
+    :param which_score: str, the name of a registered score (see available_scores())
+    :return: float, the score between the two clusterings
+    """
+    return Contingency.from_labels(labels_true, labels_pred).score(which_score)
+
+
+def label_scores(
+    labels_true: np.ndarray,
+    labels_pred: np.ndarray,
+    which_scores: Sequence[str] = ("nmi",),
+) -> Dict[str, float]:
+    """
+    :param labels_true: 1d np.array, the cluster label of each item
+    :param labels_pred: 1d np.array, the cluster label of each item
+    :param which_scores: list of str, the names of registered scores (see available_scores())
+    :return: dict[str, float], each score between the two clusterings,
+        all computed from one contingency table
+    """
+    table = Contingency.from_labels(labels_true, labels_pred)
+    return {which_score: table.score(which_score) for which_score in which_scores}
+
+
+def _dense_codes(codes: np.ndarray) -> Tuple[np.ndarray, int]:
+    """
+    :param codes: 1d np.array of non-negative integer codes
+    :return: Tuple[np.ndarray, int], the codes renumbered without gaps (same order), and their number
+    """
+    _present = np.bincount(codes) > 0
+    return (np.cumsum(_present) - 1)[codes], int(_present.sum())
+
+
+def permutation_tables(
+    labels_true: np.ndarray,
+    labels_pred: np.ndarray,
+    n_permutations: int = 10,
+    seed: int = 42,
+) -> List[Contingency]:
+    """
+    Builds the contingency tables of 'labels_true' against independent random permutations
+    of 'labels_pred' in one batch: each permutation is drawn from its own seed spawned from 'seed',
+    the P tables are counted with one bincount over (permutation, row, column) triples,
+    and the mutual information of every table is computed in one vectorized pass.
+    The permutations keep the marginals, so all the tables share their entropies and EMI
+    :param labels_true: 1d np.array, the cluster label of each item
+    :param labels_pred: 1d np.array, the cluster label of each item, to be permuted
+    :param n_permutations: int, the number of permutations
+        Default: 10
+    :param seed: int, the seed of the random permutations
+        Default: 42
+    :return: List[Contingency], the table of each permutation
+    """
+    _true, _n_true = _dense_codes(_as_codes(labels_true))
+    _pred, _n_pred = _dense_codes(_as_codes(labels_pred))
+    table = Contingency.from_labels(_true, _pred)
+    _perms = np.stack(
+        [
+            np.random.default_rng(_seed).permutation(_pred)
+            for _seed in np.random.SeedSequence(seed).spawn(n_permutations)
+        ]
+    )
+    _n_cells = _n_true * _n_pred
+    if n_permutations * _n_cells > max(_MAX_DENSE_CELLS, _perms.size):
+        # too many cells to count densely: one sparse table per permutation
+        return [
+            Contingency(*contingency_cells(_true, _perm), like=table)
+            for _perm in _perms
+        ]
+
+    _key = (_true * _n_pred + _perms) + (
+        np.arange(n_permutations, dtype=np.int64)[:, None] * _n_cells
+    )
+    _counts = np.bincount(_key.ravel(), minlength=n_permutations * _n_cells)
+    _cells = np.flatnonzero(_counts)
+    _counts = _counts[_cells]
+    _perm_ids, _cells = np.divmod(_cells, _n_cells)
+    rows, cols = np.divmod(_cells, _n_pred)
+
+    # mutual information of every table, with the same terms as _mutual_info_from_cells
+    n_samples = len(_true)
+    _mi = np.zeros(n_permutations)
+    if table.n_rows > 1 and table.n_cols > 1:
+        contingency_nm = _counts / n_samples
+        outer = table.pi[rows] * table.pj[cols]
+        log_outer = -np.log(outer) + log(n_samples) + log(n_samples)
+        mi = (
+            contingency_nm * (_log_counts(_counts) - log(n_samples))
+            + contingency_nm * log_outer
+        )
+        mi = np.where(np.abs(mi) < np.finfo(mi.dtype).eps, 0.0, mi)
+        _mi = np.clip(
+            np.bincount(_perm_ids, weights=mi, minlength=n_permutations), 0.0, None
+        )
+
+    _bounds = np.searchsorted(_perm_ids, np.arange(n_permutations + 1))
+    tables = []
+    for p in range(n_permutations):
+        _slice = slice(_bounds[p], _bounds[p + 1])
+        _table = Contingency(rows[_slice], cols[_slice], _counts[_slice], like=table)
+        _table._mi = float(_mi[p])
+        tables.append(_table)
+    return tables
+
+
+def expected_score(
+    labels_true: np.ndarray,
+    labels_pred: np.ndarray,
+    which_score: str = "nmi",
+    analytic: bool = False,
+    n_permutations: int = 10,
+    seed: int = 42,
+) -> float:
+    """
+    :param labels_true: 1d np.array, the cluster label of each item
+    :param labels_pred: 1d np.array, the cluster label of each item
+    :param which_score: str, the name of a registered score (see available_scores())
+    :param analytic: bool, if True, return the exact expectation under random permutations
+        (available for the registered NMI, AMI, MI, VI and ARI scores), instead of the average
+        over 'n_permutations' random permutations, where negative scores are counted as 0
+        Default: False
+    :param n_permutations: int, the number of permutations
+        Default: 10
+    :param seed: int, the seed of the random permutations
+        Default: 42
+    :return: float, the expected score of 'labels_true' against a random permutation of 'labels_pred'
+    """
+    assert which_score in _SCORES, f"Unknown score {which_score}"
+    if analytic:
+        return Contingency.from_labels(labels_true, labels_pred).expected(which_score)
+    score_f = _SCORES[which_score][0]
+    _scores = [
+        score_f(table)
+        for table in permutation_tables(
+            labels_true, labels_pred, n_permutations=n_permutations, seed=seed
+        )
+    ]
+    # NOTE: in case of AMI, it is possible to get negative scores,
+    # but we cap them to 0 so we get only scores >= 0
+    return float(np.maximum(_scores, 0).mean())
+
+
+def normalized_mutual_info(
+    labels_true: np.ndarray,
+    labels_pred: np.ndarray,
+    average_method: str = "arithmetic",
+) -> float:
+    """
+    Drop-in for sklearn.metrics.normalized_mutual_info_score on integer codes
+    :param labels_true: 1d np.array, the cluster label of each item
+    :param labels_pred: 1d np.array, the cluster label of each item
+    :param average_method: str, one of "min", "geometric", "arithmetic" or "max"
+    :return: float, the normalized mutual information
+    """
+    return _nmi(Contingency.from_labels(labels_true, labels_pred), average_method)
+
+
+def adjusted_mutual_info(
+    labels_true: np.ndarray,
+    labels_pred: np.ndarray,
+    average_method: str = "arithmetic",
+) -> float:
+    """
+    Drop-in for sklearn.metrics.adjusted_mutual_info_score on integer codes
+    :param labels_true: 1d np.array, the cluster label of each item
+    :param labels_pred: 1d np.array, the cluster label of each item
+    :param average_method: str, one of "min", "geometric", "arithmetic" or "max"
+    :return: float, the adjusted mutual information
+    """
+    return _ami(Contingency.from_labels(labels_true, labels_pred), average_method)
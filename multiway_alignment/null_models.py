@@ -3,15 +3,13 @@ import numpy as np
 import os
 from scipy.stats import entropy  # type: ignore
 from itertools import combinations
-from joblib import dump  # type: ignore
-from functools import partial
-from typing import Dict, List, Union
+from typing import List, Optional, Union
 
-import multiprocessing as mp
-from multiprocessing.pool import Pool
 from tqdm import tqdm
 
 import multiway_alignment.score as ma_score  # type: ignore
+from multiway_alignment.consensus import _encode_opinions
+from multiway_alignment.parallel import Executor, executor_scope
 
 from multiway_alignment.utils.logging import logger
 
@@ -31,44 +29,49 @@ def get_null_model(opinions: Union[pd.DataFrame, pd.Series]) -> pd.DataFrame:
     return null
 
 
-def _one_iter_fullpartition(
-    opinions: Union[pd.DataFrame, pd.Series],
-    which_score: str = "ami",
-    adjusted: bool = False,
-) -> Dict:
-    """
-    :param opinions: pd.DataFrame having one column per layer and one row per node,
-        where each element a_ij is an integer representing the cluster labels for node i at layer j
-    :param which_score: str
-    :param adjusted: bool
-    :return: dict
-    """
-    null = get_null_model(opinions=opinions)
-
-    _full_res, _ = ma_score.maximal_alignment_curve_fullpartition(
-        null, which_score=which_score, adjusted=adjusted
-    )
-    return _full_res
-
-
-def _one_iter(
-    opinions: Union[pd.DataFrame, pd.Series],
+def _random_full_alignment_curves(
+    df: pd.DataFrame,
+    save_to: str,
     which_score: str = "ami",
     adjusted: bool = False,
-) -> Dict:
+    n_tries: int = 10,
+    fullpartition: bool = False,
+    executor: Optional[Executor] = None,
+    compact: bool = True,
+):
     """
-    :param opinions: pd.DataFrame having one column per layer and one row per node,
-        where each element a_ij is an integer representing the cluster labels for node i at layer j
-    :param which_score: str
+    :param df: pd.DataFrame, the original data
+    :param save_to: str, name of the folder
+    :param which_score: str, the score to use
     :param adjusted: bool
-    :return: dict
+    :param n_tries: int, name of random configurations to generate
+    :param fullpartition: bool, if True, compare each layer with the consensus of all
+        the layers in the combination
+    :param executor: Optional[Executor], the worker processes
+    :param compact: bool, if True, save results.CurveStore directories,
+        otherwise joblib dumps of the dictionaries of scores
+    :return: None
     """
-    null = get_null_model(opinions=opinions)
-
-    _full_res, _ = ma_score.maximal_alignment_curve(
-        null, which_score=which_score, adjusted=adjusted
-    )
-    return _full_res
+    if not os.path.exists(save_to):
+        os.makedirs(save_to)
+        logger.info(f"Created new directory {save_to}")
+    _null_codes = [
+        _encode_opinions(get_null_model(opinions=df))[0] for _ in range(n_tries)
+    ]
+    # the combinations of all the replicas are scored by the same workers,
+    # which share the EMI of the marginals of the permuted layers
+    with executor_scope(executor) as _executor:
+        _scores = ma_score._combination_scores(
+            _null_codes,
+            [which_score],
+            fullpartition=fullpartition,
+            adjusted=adjusted,
+            executor=_executor,
+        )
+    _curves = ma_score._stores_from_scores if compact else ma_score._curves_from_scores
+    for i, _scores_by_length in enumerate(_scores):
+        _curve = _curves(list(df.columns), _scores_by_length, [which_score])
+        ma_score._dump_scores(_curve[which_score].all_scores, f"{save_to}/null_{i}")
 
 
 def random_full_alignment_curves_fullpartition(
@@ -77,11 +80,13 @@ def random_full_alignment_curves_fullpartition(
     which_score: str = "ami",
     adjusted: bool = False,
     n_tries: int = 10,
+    executor: Optional[Executor] = None,
+    compact: bool = True,
 ):
     """
     Generate 'n_tries' random configurations of the real data in 'df'.
-    Each configuration is evaluated and the full alignment curve is dumped
-    to the folder 'save_to'
+    Each configuration is evaluated and the scores of all the combinations are saved
+    to the folder 'save_to', as null_0, null_1, ... (read them with results.load_scores)
     :param df: pd.DataFrame, the original data
     :param save_to: str, name of the folder
     :param which_score: str, the score to use
@@ -90,23 +95,24 @@ def random_full_alignment_curves_fullpartition(
         Default: False
     :param n_tries: int, name of random configurations to generate
         Default: 10
+    :param executor: Optional[Executor], the worker processes, shared across calls
+        Default: None (a new pool of parallel.default_n_jobs() processes for this call)
+    :param compact: bool, if True, each configuration is saved as a results.CurveStore directory;
+        if False, as a joblib dump of the dictionary of scores keyed by "size+layer+layer",
+        the format of version 0.0.2
+        Default: True
     :return: None
     """
-    if not os.path.exists(save_to):
-        os.makedirs(save_to)
-        logger.info(f"Created new directory {save_to}")
-    with Pool(processes=mp.cpu_count() - 1) as pool:
-        result = pool.map_async(
-            partial(
-                _one_iter_fullpartition,
-                **{"which_score": which_score, "adjusted": adjusted},  # type: ignore
-            ),
-            [df.copy()] * n_tries,
-        )
-        i = 0
-        for value in result.get():
-            dump(value, f"{save_to}/null_{i}")
-            i += 1
+    _random_full_alignment_curves(
+        df,
+        save_to,
+        which_score=which_score,
+        adjusted=adjusted,
+        n_tries=n_tries,
+        fullpartition=True,
+        executor=executor,
+        compact=compact,
+    )
 
 
 def random_full_alignment_curves(
@@ -115,11 +121,13 @@ def random_full_alignment_curves(
     which_score: str = "ami",
     adjusted: bool = False,
     n_tries: int = 10,
+    executor: Optional[Executor] = None,
+    compact: bool = True,
 ):
     """
     Generate 'n_tries' random configurations of the real data in 'df'.
-    Each configuration is evaluated and the full alignment curve is dumped
-    to the folder 'save_to'
+    Each configuration is evaluated and the scores of all the combinations are saved
+    to the folder 'save_to', as null_0, null_1, ... (read them with results.load_scores)
     :param df: pd.DataFrame, the original data
     :param save_to: str, name of the folder
     :param which_score: str, the score to use
@@ -128,23 +136,24 @@ def random_full_alignment_curves(
         Default: False
     :param n_tries: int, name of random configurations to generate
         Default: 10
+    :param executor: Optional[Executor], the worker processes, shared across calls
+        Default: None (a new pool of parallel.default_n_jobs() processes for this call)
+    :param compact: bool, if True, each configuration is saved as a results.CurveStore directory;
+        if False, as a joblib dump of the dictionary of scores keyed by "size+layer+layer",
+        the format of version 0.0.2
+        Default: True
     :return: None
     """
-    if not os.path.exists(save_to):
-        os.makedirs(save_to)
-        logger.info(f"Created new directory {save_to}")
-    with Pool(processes=mp.cpu_count() - 1) as pool:
-        result = pool.map_async(
-            partial(
-                _one_iter,
-                **{"which_score": which_score, "adjusted": adjusted},  # type: ignore
-            ),
-            [df.copy()] * n_tries,
-        )
-        i = 0
-        for value in result.get():
-            dump(value, f"{save_to}/null_{i}")
-            i += 1
+    _random_full_alignment_curves(
+        df,
+        save_to,
+        which_score=which_score,
+        adjusted=adjusted,
+        n_tries=n_tries,
+        fullpartition=False,
+        executor=executor,
+        compact=compact,
+    )
 
 
 def expected_curve_fullpartition(
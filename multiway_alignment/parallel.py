@@ -0,0 +1,633 @@
+import os
+import time
+import typing
+from contextlib import contextmanager
+from functools import partial
+from itertools import combinations
+from math import ceil, comb
+
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from multiprocessing.pool import Pool
+
+import numpy as np
+from threadpoolctl import threadpool_limits
+
+from multiway_alignment.cache import EMICache
+from multiway_alignment.metrics import get_emi_cache, set_emi_cache
+
+# chunks per worker in a batch of tasks, for load balancing
+_CHUNKS_PER_JOB = 4
+
+# environment variables overriding the default number of worker processes,
+# and the number of native (BLAS/OpenMP) threads of each worker
+N_JOBS_ENV = "MULTIWAY_ALIGNMENT_N_JOBS"
+THREADS_ENV = "MULTIWAY_ALIGNMENT_THREADS_PER_WORKER"
+
+# environment variables read by the native thread pools started after the worker starts
+_THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "BLIS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+class SharedArray:
+    """
+    Numpy array in a multiprocessing.shared_memory block, so that worker processes read
+    the same buffer instead of receiving a pickled copy of the array.
+    The owner creates the block and unlinks it when done; workers attach to it
+    from the picklable 'spec'.
+    ------------
+    Example
+    ------------
+    >>> with SharedArray.create(codes) as shared:
+    ...     pool = Pool(initializer=worker_init, initargs=(shared.spec,))
+    >>> # in the worker
+    >>> shared = SharedArray.attach(spec)
+    >>> shared.array
+    """
+
+    def __init__(
+        self,
+        shm: shared_memory.SharedMemory,
+        shape: typing.Tuple[int, ...],
+        dtype: str,
+        owner: bool = False,
+    ):
+        """
+        :param shm: shared_memory.SharedMemory, the block holding the array
+        :param shape: tuple of int, the shape of the array
+        :param dtype: str, the dtype of the array (np.dtype.str)
+        :param owner: bool, if True, the block is unlinked on close
+            Default: False
+        """
+        self.shm = shm
+        self.owner = owner
+        self.array: np.ndarray = np.ndarray(
+            shape, dtype=np.dtype(dtype), buffer=shm.buf
+        )
+
+    @classmethod
+    def create(cls, array: np.ndarray) -> "SharedArray":
+        """
+        :param array: np.ndarray, the array to copy into shared memory
+        :return: SharedArray, owning the new block
+        """
+        # a zero-size block is not allowed
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        shared = cls(shm, array.shape, array.dtype.str, owner=True)
+        shared.array[...] = array
+        return shared
+
+    @classmethod
+    def attach(
+        cls, spec: typing.Tuple[str, typing.Tuple[int, ...], str]
+    ) -> "SharedArray":
+        """
+        :param spec: tuple (name, shape, dtype), see SharedArray.spec
+        :return: SharedArray, attached to an existing block
+        """
+        _name, _shape, _dtype = spec
+        return cls(shared_memory.SharedMemory(name=_name), _shape, _dtype)
+
+    @property
+    def spec(self) -> typing.Tuple[str, typing.Tuple[int, ...], str]:
+        """
+        :return: tuple (name, shape, dtype), what a worker needs to attach to the array
+        """
+        return self.shm.name, self.array.shape, self.array.dtype.str
+
+    def close(self):
+        """
+        Releases the array, and frees the block if this process owns it
+        :return: None
+        """
+        del self.array
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self) -> "SharedArray":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def unrank_combination(n: int, k: int, rank: int) -> typing.Tuple[int, ...]:
+    """
+    :param n: int, the number of elements
+    :param k: int, the size of the combinations
+    :param rank: int, the position of the combination in the order of itertools.combinations(range(n), k)
+    :return: tuple of int, the combination with that rank
+    """
+    if not 0 <= rank < comb(n, k):
+        raise ValueError(f"rank {rank} out of range for combinations({n}, {k})")
+    _combination = []
+    _c = 0
+    for i in range(k):
+        # skip the blocks of combinations starting with a smaller element
+        while True:
+            _block = comb(n - _c - 1, k - i - 1)
+            if rank < _block:
+                break
+            rank -= _block
+            _c += 1
+        _combination.append(_c)
+        _c += 1
+    return tuple(_combination)
+
+
+def iter_combinations(
+    n: int, k: int, start: int = 0, stop: typing.Optional[int] = None
+) -> typing.Iterator[typing.Tuple[int, ...]]:
+    """
+    :param n: int, the number of elements
+    :param k: int, the size of the combinations
+    :param start: int, the rank of the first combination
+        Default: 0
+    :param stop: Optional[int], the rank after the last combination
+        Default: None (all the remaining combinations)
+    :return: iterator over the combinations with rank in [start, stop),
+        in the order of itertools.combinations(range(n), k)
+    """
+    stop = comb(n, k) if stop is None else min(stop, comb(n, k))
+    if start >= stop:
+        return
+    _combination = list(unrank_combination(n, k, start))
+    for _ in range(stop - start):
+        yield tuple(_combination)
+        # next combination: increment the rightmost element that can still grow
+        i = k - 1
+        while i >= 0 and _combination[i] == n - k + i:
+            i -= 1
+        if i < 0:
+            return
+        _combination[i] += 1
+        for j in range(i + 1, k):
+            _combination[j] = _combination[j - 1] + 1
+
+
+def rank_combination(n: int, combination: typing.Sequence[int]) -> int:
+    """
+    :param n: int, the number of elements
+    :param combination: sorted sequence of int, a combination of range(n)
+    :return: int, the position of the combination in the order of
+        itertools.combinations(range(n), len(combination)), see unrank_combination
+    """
+    _k = len(combination)
+    rank = 0
+    _c = 0
+    for i, _element in enumerate(combination):
+        # count the blocks of combinations starting with a smaller element
+        for _smaller in range(_c, _element):
+            rank += comb(n - _smaller - 1, _k - i - 1)
+        _c = _element + 1
+    return rank
+
+
+def prefix_groups(
+    n: int, max_size: int
+) -> typing.List[typing.Tuple[typing.Tuple[int, ...], int]]:
+    """
+    Splits the subsets of range(n) into groups sharing a prefix in the subset lattice.
+    Group (prefix, start) holds the subsets made of the elements of 'prefix' followed by
+    any elements from 'start' on: all the subsets of a group except the prefix itself
+    have a parent (the subset without its last element) in the same group,
+    so a worker scoring a whole group reuses its own cached partitions.
+    Groups are split, by including or excluding their next element, until they hold
+    at most 'max_size' subsets
+    :param n: int, the number of elements
+    :param max_size: int, the maximal number of subsets of a group
+    :return: list of (prefix, start), the groups, largest first
+    """
+    groups = []
+    _stack: typing.List[typing.Tuple[typing.Tuple[int, ...], int]] = [((), 0)]
+    while _stack:
+        _prefix, _start = _stack.pop()
+        if _start >= n or 2 ** (n - _start) <= max_size:
+            groups.append((_prefix, _start))
+        else:
+            _stack.append((_prefix, _start + 1))
+            _stack.append((_prefix + (_start,), _start + 1))
+    # largest first, for the load balance of the last groups
+    return sorted(groups, key=lambda g: (g[1], g[0]))
+
+
+def revolving_door(
+    n: int, k: int, reverse: bool = False
+) -> typing.Iterator[typing.Tuple[int, ...]]:
+    """
+    Enumerates the combinations of k elements of range(n) in revolving-door order:
+    two consecutive combinations differ by one element out and one element in.
+    The order is defined recursively: the combinations of range(n - 1), followed by
+    the combinations of k - 1 elements of range(n - 1) in reverse order, each with n - 1
+    :param n: int, the number of elements
+    :param k: int, the size of the combinations
+    :param reverse: bool, if True, enumerate in reverse order
+        Default: False
+    :return: iterator over the combinations (sorted tuples)
+    """
+    if k == 0:
+        yield ()
+    elif k == n:
+        yield tuple(range(n))
+    elif 0 < k < n:
+        if not reverse:
+            yield from revolving_door(n - 1, k)
+        for _combination in revolving_door(n - 1, k - 1, reverse=not reverse):
+            yield _combination + (n - 1,)
+        if reverse:
+            yield from revolving_door(n - 1, k, reverse=True)
+
+
+def iter_prefix_group(
+    n: int,
+    prefix: typing.Tuple[int, ...],
+    start: int,
+    min_length: int = 2,
+    enumeration: str = "lexicographic",
+) -> typing.Iterator[typing.Tuple[int, ...]]:
+    """
+    :param n: int, the number of elements
+    :param prefix: tuple of int, the prefix of the group, see prefix_groups
+    :param start: int, the first element that can follow the prefix
+    :param min_length: int, the minimal size of the subsets
+        Default: 2
+    :param enumeration: str, one of "lexicographic" or "revolving_door",
+        the order of the subsets of each size
+        Default: "lexicographic"
+    :return: iterator over the subsets of the group with at least 'min_length' elements,
+        by increasing size, so that a parent comes before its children
+    """
+    for _length in range(max(min_length - len(prefix), 0), n - start + 1):
+        if enumeration == "revolving_door":
+            _tails: typing.Iterable[typing.Tuple[int, ...]] = (
+                tuple(start + i for i in _tail)
+                for _tail in revolving_door(n - start, _length)
+            )
+        else:
+            _tails = combinations(range(start, n), _length)
+        for _tail in _tails:
+            yield prefix + _tail
+
+
+def _cgroup_cpus(root: str = "/sys/fs/cgroup") -> typing.Optional[float]:
+    """
+    :param root: str, the mount point of the cgroup file system
+        Default: "/sys/fs/cgroup"
+    :return: Optional[float], the CPU quota of the cgroup of this process, in CPUs,
+        or None if there is no quota
+    """
+    try:
+        # cgroup v2: "<quota> <period>", or "max <period>" without quota
+        with open(os.path.join(root, "cpu.max")) as f:
+            _quota, _period = f.read().split()[:2]
+        if _quota == "max":
+            return None
+        return int(_quota) / int(_period)
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1: a quota of -1 means no quota
+        with open(os.path.join(root, "cpu", "cpu.cfs_quota_us")) as f:
+            _quota = f.read().strip()
+        with open(os.path.join(root, "cpu", "cpu.cfs_period_us")) as f:
+            _period = f.read().strip()
+        if int(_quota) <= 0:
+            return None
+        return int(_quota) / int(_period)
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus() -> int:
+    """
+    :return: int, the number of CPUs this process can use: the CPUs it is allowed
+        to run on (sched_getaffinity), capped by the CPU quota of its cgroup, e.g. the
+        CPU limit of a container, rounded up. At least 1
+    """
+    if hasattr(os, "sched_getaffinity"):
+        _cpus = len(os.sched_getaffinity(0))
+    else:
+        _cpus = os.cpu_count() or 1
+    _quota = _cgroup_cpus()
+    if _quota is not None:
+        _cpus = min(_cpus, ceil(_quota))
+    return max(_cpus, 1)
+
+
+def default_n_jobs() -> int:
+    """
+    :return: int, the default number of worker processes: the value of the environment variable
+        MULTIWAY_ALIGNMENT_N_JOBS if set, otherwise the available CPUs minus one
+        (for the main process), and at least 1
+    """
+    _n_jobs = os.environ.get(N_JOBS_ENV)
+    if _n_jobs:
+        return max(int(_n_jobs), 1)
+    return max(available_cpus() - 1, 1)
+
+
+def default_threads_per_worker(n_jobs: int) -> int:
+    """
+    :param n_jobs: int, the number of worker processes
+    :return: int, the default number of native threads of each worker: the value of the
+        environment variable MULTIWAY_ALIGNMENT_THREADS_PER_WORKER if set, otherwise
+        the available CPUs split across the workers, and at least 1
+    """
+    _threads = os.environ.get(THREADS_ENV)
+    if _threads:
+        return max(int(_threads), 1)
+    return max(available_cpus() // max(n_jobs, 1), 1)
+
+
+def _in_worker() -> bool:
+    """
+    :return: bool, True in a pool worker process, which cannot start processes of its own
+    """
+    return mp.current_process().daemon
+
+
+def _init_worker(emi_cache: typing.Optional[EMICache], threads: int):
+    """
+    Pool initializer of the Executor workers
+    :param emi_cache: Optional[EMICache], the EMI cache of the worker, if shared
+    :param threads: int, the maximal number of threads of the native thread pools of the worker
+    :return: None
+    """
+    if emi_cache is not None:
+        set_emi_cache(emi_cache)
+    # the pools already loaded by numpy, scipy and sklearn are capped in place,
+    # the ones started later read the environment
+    for _var in _THREAD_ENV_VARS:
+        os.environ[_var] = str(threads)
+    threadpool_limits(limits=threads)
+
+
+def _flushing_emi(f: typing.Callable, *args: typing.Any) -> typing.Any:
+    """
+    Runs a task in a worker, then writes the EMI it computed to the shared EMI cache
+    :param f: callable, the task
+    :param args: its arguments
+    :return: f(*args)
+    """
+    result = f(*args)
+    _emi_cache = get_emi_cache()
+    if _emi_cache is not None:
+        _emi_cache.flush()
+    return result
+
+
+class Executor:
+    """
+    Long-lived pool of worker processes, shared by the entry points that run in parallel
+    (see the 'executor' parameter of score.maximal_alignment_curves, score.multiway_alignment_score,
+    streaming.parallel_alignment_scores and the null models), so that the processes
+    are started once and not by every call.
+    The pool is only started on the first parallel task. In a worker process, or with n_jobs=1,
+    tasks run in the calling process: nested calls never start pools inside pool workers.
+    The executor keeps the measured cost of each kind of task, from which the size
+    of the chunks of later tasks is tuned (see Executor.chunk_size).
+    If 'share_emi', the workers share the expected mutual information they compute
+    through a multiprocessing.Manager dictionary. This starts one more process, and costs
+    a round trip to it on every local miss and at the end of every task that computed new values,
+    so it only pays off for adjusted scores whose EMI is expensive and shared across workers.
+    The workers are sized from the CPUs actually available (see available_cpus), and
+    the native thread pools of each worker are capped, so that the workers do not
+    oversubscribe the CPUs with BLAS/OpenMP threads.
+    ------------
+    Example
+    ------------
+    >>> with Executor(n_jobs=8) as executor:
+    ...     curves = maximal_alignment_curves(df, ["nmi", "ami"], executor=executor)
+    ...     random_full_alignment_curves(df, "null", executor=executor)
+    """
+
+    def __init__(
+        self,
+        n_jobs: typing.Optional[int] = None,
+        target_task_seconds: float = 0.1,
+        share_emi: bool = False,
+        threads_per_worker: typing.Optional[int] = None,
+    ):
+        """
+        :param n_jobs: Optional[int], the number of worker processes
+            Default: None (see default_n_jobs)
+        :param target_task_seconds: float, the longest duration of a chunk of tasks,
+            once the cost of the tasks is known
+            Default: 0.1
+        :param share_emi: bool, if True, the workers share their EMI cache
+            Default: False (each worker has its own)
+        :param threads_per_worker: Optional[int], the maximal number of threads
+            of the native (BLAS/OpenMP) thread pools of each worker
+            Default: None (see default_threads_per_worker)
+        """
+        self.n_jobs = default_n_jobs() if n_jobs is None else n_jobs
+        self.threads_per_worker = (
+            default_threads_per_worker(self.n_jobs)
+            if threads_per_worker is None
+            else threads_per_worker
+        )
+        self.target_task_seconds = target_task_seconds
+        self.share_emi = share_emi
+        self._pool: typing.Optional[Pool] = None
+        self._manager: typing.Optional[typing.Any] = None
+        self._costs: typing.Dict[str, float] = dict()
+        # counters reported by each worker process, e.g. its partition cache hits
+        self.worker_stats: typing.Dict[int, typing.Dict[str, int]] = dict()
+
+    def __repr__(self) -> str:
+        return (
+            f"Executor(n_jobs={self.n_jobs}, threads_per_worker={self.threads_per_worker}, "
+            f"started={self._pool is not None})"
+        )
+
+    def __getstate__(self) -> typing.Dict[str, typing.Any]:
+        # a copy sent to a worker runs its tasks serially
+        return dict(self.__dict__, _pool=None, _manager=None)
+
+    @property
+    def serial(self) -> bool:
+        """
+        :return: bool, True if the tasks run in the calling process
+        """
+        return self.n_jobs <= 1 or _in_worker()
+
+    @property
+    def pool(self) -> Pool:
+        """
+        :return: Pool, the worker processes, started on first use
+        """
+        if self._pool is None:
+            _emi_cache = None
+            if self.share_emi:
+                self._manager = mp.Manager()
+                _emi_cache = EMICache(shared=self._manager.dict())
+            self._pool = Pool(
+                processes=self.n_jobs,
+                initializer=_init_worker,
+                initargs=(_emi_cache, self.threads_per_worker),
+            )
+        return self._pool
+
+    def _task(self, f: typing.Callable) -> typing.Callable:
+        """
+        :param f: callable, picklable function run by the workers
+        :return: callable, f, followed by a flush of the shared EMI cache if 'share_emi'
+        """
+        return partial(_flushing_emi, f) if self.share_emi else f
+
+    def chunk_size(self, key: str, n_items: int) -> int:
+        """
+        :param key: str, the kind of task
+        :param n_items: int, the number of items to split in chunks
+        :return: int, the number of items per chunk: chunks are small enough to balance
+            the load across the workers, and no longer than 'target_task_seconds'
+            once the cost of an item of this kind has been measured
+        """
+        _balanced = max(ceil(n_items / (self.n_jobs * _CHUNKS_PER_JOB)), 1)
+        _cost = self._costs.get(key)
+        if _cost is None or _cost <= 0:
+            return _balanced
+        return int(min(max(self.target_task_seconds / _cost, 1), _balanced))
+
+    def record(self, key: str, n_items: int, seconds: float):
+        """
+        Updates the measured cost of an item of a kind of task
+        :param key: str, the kind of task
+        :param n_items: int, the number of items processed
+        :param seconds: float, the wall time taken by the workers to process them
+        :return: None
+        """
+        if n_items <= 0:
+            return
+        # wall time over all the workers, i.e. the cost of an item on one worker
+        _cost = seconds * (1 if self.serial else self.n_jobs) / n_items
+        _previous = self._costs.get(key)
+        self._costs[key] = _cost if _previous is None else (_previous + _cost) / 2
+
+    def add_worker_stats(self, pid: int, **counts: int):
+        """
+        Adds the counters reported by a task to the totals of the worker that ran it
+        :param pid: int, the process id of the worker
+        :param counts: int, the counters, e.g. hits=..., misses=...
+        :return: None
+        """
+        _stats = self.worker_stats.setdefault(pid, dict())
+        for _name, _count in counts.items():
+            _stats[_name] = _stats.get(_name, 0) + _count
+
+    def worker_hit_rates(self) -> typing.Dict[int, float]:
+        """
+        :return: dict[int, float], the cache hit rate of each worker, from its 'hits' and 'misses'
+        """
+        return {
+            pid: _stats.get("hits", 0)
+            / max(_stats.get("hits", 0) + _stats.get("misses", 0), 1)
+            for pid, _stats in self.worker_stats.items()
+        }
+
+    def map(
+        self,
+        f: typing.Callable,
+        items: typing.Sequence,
+        key: typing.Optional[str] = None,
+    ) -> typing.List:
+        """
+        :param f: callable, picklable function of one item
+        :param items: list, the items
+        :param key: Optional[str], the kind of task, to tune the chunk size from its measured cost
+            Default: None (the qualified name of f)
+        :return: list, f of each item, in order
+        """
+        key = getattr(f, "__qualname__", repr(f)) if key is None else key
+        _start = time.perf_counter()
+        if self.serial:
+            result = [f(item) for item in items]
+        else:
+            result = self.pool.map(
+                self._task(f), items, chunksize=self.chunk_size(key, len(items))
+            )
+        self.record(key, len(items), time.perf_counter() - _start)
+        return result
+
+    def starmap(
+        self,
+        f: typing.Callable,
+        items: typing.Sequence[typing.Sequence],
+        key: typing.Optional[str] = None,
+    ) -> typing.List:
+        """
+        :param f: callable, picklable function
+        :param items: list of argument tuples
+        :param key: Optional[str], see Executor.map
+        :return: list, f of each argument tuple, in order
+        """
+        key = getattr(f, "__qualname__", repr(f)) if key is None else key
+        _start = time.perf_counter()
+        if self.serial:
+            result = [f(*item) for item in items]
+        else:
+            result = self.pool.starmap(
+                self._task(f), items, chunksize=self.chunk_size(key, len(items))
+            )
+        self.record(key, len(items), time.perf_counter() - _start)
+        return result
+
+    def imap_unordered(
+        self, f: typing.Callable, items: typing.Iterable
+    ) -> typing.Iterator:
+        """
+        :param f: callable, picklable function of one item, e.g. a chunk of work
+        :param items: iterable, the items, each sent to the first idle worker
+        :return: iterator over f of each item, in order of completion
+        """
+        if self.serial:
+            return map(f, items)
+        return self.pool.imap_unordered(self._task(f), items, chunksize=1)
+
+    def close(self):
+        """
+        Stops the worker processes, if they were started
+        :return: None
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+    def __enter__(self) -> "Executor":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+@contextmanager
+def executor_scope(
+    executor: typing.Optional[Executor] = None, n_jobs: typing.Optional[int] = None
+) -> typing.Iterator[Executor]:
+    """
+    :param executor: Optional[Executor], an executor shared by the caller
+    :param n_jobs: Optional[int], the number of worker processes of a new executor,
+        if 'executor' is None
+    :return: context manager returning 'executor', or a new Executor(n_jobs) closed on exit
+    ------------
+    Example
+    ------------
+    >>> with executor_scope(executor, n_jobs) as _executor:
+    ...     _executor.map(f, items)
+    """
+    if executor is not None:
+        yield executor
+        return
+    with Executor(n_jobs=n_jobs) as _executor:
+        yield _executor
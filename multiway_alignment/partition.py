@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+
+class ConsensusPartition:
+    """
+    Compact (CSR-style) representation of a consensus partition.
+    The partition is stored as three integer arrays:
+        labels: the consensus group id of each individual (-1 if excluded),
+        offsets: the members of group g are members[offsets[g]:offsets[g + 1]],
+        members: the positions of the individuals, sorted by group id
+    Group names (e.g. 'A0_B1_C0') and the old dictionary form are only built on request.
+    ------------
+    Example
+    ------------
+    >>> df = pd.DataFrame({"A": [0, 0, 1], "B": [1, 1, 0], "C": [0, 0, 1]})
+    >>> partition = get_consensus_partition(opinions=df, compact=True)
+    >>> partition.sizes
+    array([2, 1])
+    >>> partition.to_dict()
+    {'A0_B1_C0': {0, 1}, 'A1_B0_C1': {2}}
+    """
+
+    def __init__(
+        self,
+        labels: np.ndarray,
+        n_groups: int,
+        index: Optional[pd.Index] = None,
+        topics: Sequence[Any] = (),
+        uniques: Sequence[np.ndarray] = (),
+        group_codes: Optional[np.ndarray] = None,
+        group_prefixes: Optional[Sequence[str]] = None,
+    ):
+        """
+        :param labels: 1d np.array, the dense consensus group id of each individual (-1 if excluded)
+        :param n_groups: int, the number of consensus groups
+        :param index: pd.Index, the label of each individual
+            Default: None (individuals are labelled by position)
+        :param topics: sequence, the topic names, used for the group names
+        :param uniques: sequence of np.ndarray, the unique opinions on each topic
+        :param group_codes: (n_groups x n_topics) np.array with the opinion code of each group on each topic
+        :param group_prefixes: sequence of str, an optional prefix for each group name
+        """
+        _dtype = np.int32 if n_groups < np.iinfo(np.int32).max else np.int64
+        self.labels: np.ndarray = np.asarray(labels).astype(_dtype, copy=False)
+        self.n_groups = int(n_groups)
+        self.index = pd.RangeIndex(len(self.labels)) if index is None else index
+        self.topics = list(topics)
+        self.uniques = list(uniques)
+        self.group_codes = group_codes
+        self.group_prefixes = group_prefixes
+        # counting sort of the individuals by group id
+        _idx = np.flatnonzero(self.labels >= 0)
+        self.offsets = np.zeros(self.n_groups + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(self.labels[_idx], minlength=self.n_groups),
+            out=self.offsets[1:],
+        )
+        self.members = _idx[np.argsort(self.labels[_idx], kind="stable")]
+        self._names: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return self.n_groups
+
+    def __repr__(self) -> str:
+        return (
+            f"ConsensusPartition(n_groups={self.n_groups}, "
+            f"n_individuals={len(self.members)}, topics={self.topics})"
+        )
+
+    def __reduce__(self) -> Tuple:
+        # only the labels travel: offsets and members are rebuilt on load
+        return (
+            self.__class__,
+            (
+                self.labels,
+                self.n_groups,
+                self.index,
+                self.topics,
+                self.uniques,
+                self.group_codes,
+                self.group_prefixes,
+            ),
+        )
+
+    @property
+    def sizes(self) -> np.ndarray:
+        """
+        :return: np.ndarray, the size of each consensus group, indexed by group id
+        """
+        return np.diff(self.offsets)
+
+    def size(self, group: int) -> int:
+        """
+        :param group: int, the consensus group id
+        :return: int, the number of members of the group
+        """
+        return int(self.offsets[group + 1] - self.offsets[group])
+
+    def size_histogram(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: Tuple[np.ndarray, np.ndarray], the distinct group sizes (ascending)
+            and the number of groups having each size
+        """
+        _counts = np.bincount(self.sizes)
+        _sizes = np.flatnonzero(_counts)
+        return _sizes, _counts[_sizes]
+
+    def members_of(self, group: int) -> pd.Index:
+        """
+        :param group: int, the consensus group id
+        :return: pd.Index, the labels of the members of the group
+        """
+        return self.index[self.members[self.offsets[group] : self.offsets[group + 1]]]
+
+    @property
+    def names(self) -> List[str]:
+        """
+        :return: List[str], the name of each consensus group (e.g. 'A0_B1_C0'), indexed by group id
+        """
+        if self._names is None:
+            if self.group_codes is None:
+                _names = [str(g) for g in range(self.n_groups)]
+            else:
+                _names = [
+                    "_".join(
+                        "".join((str(topic), str(self.uniques[j][codes[j]])))
+                        for j, topic in enumerate(self.topics)
+                    )
+                    for codes in self.group_codes
+                ]
+            if self.group_prefixes is not None:
+                _names = [p + n for p, n in zip(self.group_prefixes, _names)]
+            self._names = _names
+        return self._names
+
+    def to_dict(self) -> Dict[str, Set[Any]]:
+        """
+        :return: dict[str, set], a dictionary of consensus group label (str) -> consensus group members (set)
+        """
+        return {
+            name: set(self.members_of(g))
+            for g, name in enumerate(self.names)
+            if self.offsets[g + 1] > self.offsets[g]
+        }
@@ -0,0 +1,426 @@
+import json
+import os
+import typing
+
+import numpy as np
+import pandas as pd
+from joblib import load  # type: ignore
+
+from multiway_alignment.parallel import rank_combination, unrank_combination
+
+# file of the layer names and settings of a store saved as .npy files
+_META_FILE = "store.json"
+# key of the layer names and settings in the metadata of a Parquet file
+_PARQUET_KEY = b"multiway_alignment"
+
+
+class AlignmentCurve(tuple):
+    """
+    Maximal alignment curve of one score, as returned by score.maximal_alignment_curves
+    and its wrappers. Whatever the search, it unpacks as the pair (all_scores, best):
+        all_scores: dict[str, float], the score of each combination keyed by "size+layer+layer"
+            (a CurveStore if compact); only the scored combinations with a search other than
+            "exhaustive", and only the top_k best combinations of each size with top_k
+        best: dict[int, tuple[float, Optional[list]]], the maximal alignment curve: for each size,
+            the best score and the layers of the first combination with that score
+            (0.0, or inf if lower is better, and None if no combination scores better)
+    The results of some searches are attributes:
+        approximated: list of int, the sorted sizes whose combinations were not all scored,
+            so that their best score may not be the maximum (empty for the exact searches)
+        summary: Optional[dict[int, dict]], with top_k, the summary of the scores of all the
+            combinations of each size: "count" (without NaN scores), "mean", "variance",
+            and approximate "quantiles" (dict, quantile -> score); None otherwise
+        report: Optional[dict[int, dict]], with search "sampled", the summary of the sampled
+            scores of each size (see search.CurveSearch.sample_curve), including an upper bound
+            of the probability that the best combination was not drawn ("p_missed"); None otherwise
+    ------------
+    Example
+    ------------
+    >>> curve = maximal_alignment_curve(opinions, search="sampled")
+    >>> all_scores, best = curve
+    >>> curve.approximated, curve.report[10]["p_missed"]
+    """
+
+    all_scores: typing.Union[typing.Dict[str, float], "CurveStore"]
+    best: typing.Dict[int, typing.Tuple[float, typing.Optional[typing.List]]]
+    approximated: typing.List[int]
+    summary: typing.Optional[typing.Dict[int, typing.Dict[str, typing.Any]]]
+    report: typing.Optional[typing.Dict[int, typing.Dict[str, typing.Any]]]
+
+    def __new__(
+        cls,
+        all_scores: typing.Union[typing.Dict[str, float], "CurveStore"],
+        best: typing.Dict[int, typing.Tuple[float, typing.Optional[typing.List]]],
+        approximated: typing.Optional[typing.List[int]] = None,
+        summary: typing.Optional[typing.Dict[int, typing.Dict[str, typing.Any]]] = None,
+        report: typing.Optional[typing.Dict[int, typing.Dict[str, typing.Any]]] = None,
+    ) -> "AlignmentCurve":
+        """
+        :param all_scores: dict[str, float] or CurveStore, see AlignmentCurve
+        :param best: dict[int, tuple], see AlignmentCurve
+        :param approximated: Optional[list of int], see AlignmentCurve
+            Default: None (no size)
+        :param summary: Optional[dict[int, dict]], see AlignmentCurve
+            Default: None
+        :param report: Optional[dict[int, dict]], see AlignmentCurve
+            Default: None
+        """
+        curve = super().__new__(cls, (all_scores, best))
+        curve.all_scores = all_scores
+        curve.best = best
+        curve.approximated = [] if approximated is None else list(approximated)
+        curve.summary = summary
+        curve.report = report
+        return curve
+
+    def __reduce__(self):
+        return (
+            AlignmentCurve,
+            (self.all_scores, self.best, self.approximated, self.summary, self.report),
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"AlignmentCurve(sizes={list(self.best)}, approximated={self.approximated}, "
+            f"summary={self.summary is not None}, report={self.report is not None})"
+        )
+
+    def with_scores(
+        self, all_scores: typing.Union[typing.Dict[str, float], "CurveStore"]
+    ) -> "AlignmentCurve":
+        """
+        :param all_scores: dict[str, float] or CurveStore, the scores of the combinations
+        :return: AlignmentCurve, the same curve with these scores
+        """
+        return AlignmentCurve(
+            all_scores, self.best, self.approximated, self.summary, self.report
+        )
+
+
+class CurveStore:
+    """
+    Compact (columnar) representation of the scores of the combinations of layers.
+    The combinations of each size are indexed by their rank in the combinatorial number system,
+    i.e. their position in the order of itertools.combinations(range(n_layers), size),
+    and each size is stored as two arrays:
+        scores: the score of each stored combination (float64),
+        ranks: the rank of each stored combination (int64, ascending),
+            None if every combination of that size is stored in rank order
+    The layer names of a combination (and the old "size+layer+layer" keys) are only built on request.
+    A store is saved as a directory of .npy files, or as a Parquet file, and loaded memory-mapped
+    ------------
+    Example
+    ------------
+    >>> store = CurveStore(["A", "B", "C"], {2: np.array([0.1, 0.5, 0.2]), 3: np.array([0.3])})
+    >>> store.combination(2, 1)
+    ['A', 'C']
+    >>> store.best()
+    {2: (0.5, ['A', 'C']), 3: (0.3, ['A', 'B', 'C'])}
+    >>> store.save("resultfile_all")
+    >>> CurveStore.load("resultfile_all").to_dict()
+    {'2+A+B': 0.1, '2+A+C': 0.5, '2+B+C': 0.2, '3+A+B+C': 0.3}
+    """
+
+    def __init__(
+        self,
+        layers: typing.Sequence[typing.Any],
+        scores: typing.Dict[int, np.ndarray],
+        ranks: typing.Optional[typing.Dict[int, typing.Optional[np.ndarray]]] = None,
+        greater_is_better: bool = True,
+    ):
+        """
+        :param layers: list, the layer names
+        :param scores: dict[int, np.ndarray], for each size, the scores of the stored combinations
+        :param ranks: Optional[dict[int, Optional[np.ndarray]]], for each size, the ranks of the stored
+            combinations, in the order of the scores
+            Default: None (every combination of each size, in rank order)
+        :param greater_is_better: bool, if False, the best combinations have the lowest scores
+            Default: True
+        """
+        self.layers = list(layers)
+        self.n_layers = len(self.layers)
+        self.greater_is_better = greater_is_better
+        self.scores: typing.Dict[int, np.ndarray] = dict()
+        self.ranks: typing.Dict[int, typing.Optional[np.ndarray]] = dict()
+        for length in sorted(scores):
+            _scores = scores[length]
+            _ranks = None if ranks is None else ranks.get(length)
+            if _ranks is not None and len(_ranks) and (np.diff(_ranks) <= 0).any():
+                _order = np.argsort(_ranks, kind="stable")
+                _scores, _ranks = _scores[_order], _ranks[_order]
+            self.scores[length] = _scores
+            self.ranks[length] = _ranks
+
+    def __len__(self) -> int:
+        return sum(len(_scores) for _scores in self.scores.values())
+
+    def __repr__(self) -> str:
+        return (
+            f"CurveStore(n_combinations={len(self)}, sizes={self.sizes}, "
+            f"layers={self.layers})"
+        )
+
+    @property
+    def sizes(self) -> typing.List[int]:
+        """
+        :return: list of int, the sizes of the stored combinations
+        """
+        return list(self.scores)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        :return: int, the memory used by the arrays
+        """
+        return sum(_scores.nbytes for _scores in self.scores.values()) + sum(
+            _ranks.nbytes for _ranks in self.ranks.values() if _ranks is not None
+        )
+
+    def ranks_of(self, length: int) -> np.ndarray:
+        """
+        :param length: int, the size of the combinations
+        :return: np.ndarray, the ranks of the stored combinations of that size
+        """
+        _ranks = self.ranks[length]
+        if _ranks is None:
+            return np.arange(len(self.scores[length]), dtype=np.int64)
+        return _ranks
+
+    def combination(self, length: int, rank: int) -> typing.List[typing.Any]:
+        """
+        :param length: int, the size of the combination
+        :param rank: int, the rank of the combination
+        :return: list, the names of its layers
+        """
+        return [self.layers[j] for j in unrank_combination(self.n_layers, length, rank)]
+
+    def best(
+        self,
+    ) -> typing.Dict[
+        int, typing.Tuple[float, typing.Optional[typing.List[typing.Any]]]
+    ]:
+        """
+        :return: dict[int, tuple], for each size, the best score and the names of the layers
+            of the first combination with that score, as in the maximal alignment curve
+            (0.0, or inf if lower is better, and None if no combination scores better)
+        """
+        curve: typing.Dict[int, typing.Tuple] = dict()
+        for length, _scores in self.scores.items():
+            _start = 0.0 if self.greater_is_better else np.inf
+            curve[length] = (_start, None)
+            _valid = ~np.isnan(_scores)
+            if not _valid.any():
+                continue
+            _masked = np.where(
+                _valid, _scores, -np.inf if self.greater_is_better else np.inf
+            )
+            i = int(
+                np.argmax(_masked) if self.greater_is_better else np.argmin(_masked)
+            )
+            _score = float(_scores[i])
+            if _score > _start if self.greater_is_better else _score < _start:
+                curve[length] = (
+                    _score,
+                    self.combination(length, int(self.ranks_of(length)[i])),
+                )
+        return curve
+
+    def to_frame(self, names: bool = False) -> pd.DataFrame:
+        """
+        :param names: bool, if True, add the names of the layers of each combination
+            Default: False
+        :return: pd.DataFrame with one row per stored combination and columns
+            "order" (the size), "rank", "score", and "topics" if names
+        """
+        frame = pd.DataFrame(
+            {
+                "order": np.concatenate(
+                    [
+                        np.full(len(_scores), length, dtype=np.int64)
+                        for length, _scores in self.scores.items()
+                    ]
+                    or [np.empty(0, dtype=np.int64)]
+                ),
+                "rank": np.concatenate(
+                    [self.ranks_of(length) for length in self.scores]
+                    or [np.empty(0, dtype=np.int64)]
+                ),
+                "score": np.concatenate(
+                    list(self.scores.values()) or [np.empty(0, dtype=np.float64)]
+                ),
+            }
+        )
+        if names:
+            frame["topics"] = [
+                self.combination(length, rank)
+                for length, rank in zip(frame["order"].tolist(), frame["rank"].tolist())
+            ]
+        return frame
+
+    def to_dict(self) -> typing.Dict[str, float]:
+        """
+        :return: dict[str, float], the scores keyed by "size+layer+layer",
+            as returned by score.maximal_alignment_curve
+        """
+        return {
+            f"{length}+" + "+".join(sorted(self.combination(length, _rank))): _score
+            for length, _scores in self.scores.items()
+            for _rank, _score in zip(self.ranks_of(length).tolist(), _scores.tolist())
+        }
+
+    @classmethod
+    def from_dict(
+        cls,
+        all_scores: typing.Dict[str, float],
+        layers: typing.Optional[typing.Sequence[typing.Any]] = None,
+        greater_is_better: bool = True,
+    ) -> "CurveStore":
+        """
+        :param all_scores: dict[str, float], the scores keyed by "size+layer+layer"
+            (see score.maximal_alignment_curve)
+        :param layers: Optional[list], the layer names
+            Default: None (the sorted names in the keys)
+        :param greater_is_better: bool, see CurveStore
+            Default: True
+        :return: CurveStore with the same scores
+        """
+        _combinations = [_key.split("+")[1:] for _key in all_scores]
+        if layers is None:
+            layers = sorted({layer for _names in _combinations for layer in _names})
+        _ids = {str(layer): j for j, layer in enumerate(layers)}
+        _by_length: typing.Dict[int, typing.Tuple[list, list]] = dict()
+        for _names, _score in zip(_combinations, all_scores.values()):
+            _ranks, _scores = _by_length.setdefault(len(_names), ([], []))
+            _ranks.append(
+                rank_combination(len(layers), sorted(_ids[name] for name in _names))
+            )
+            _scores.append(_score)
+        return cls(
+            layers,
+            {
+                length: np.array(_scores, dtype=np.float64)
+                for length, (_, _scores) in _by_length.items()
+            },
+            ranks={
+                length: np.array(_ranks, dtype=np.int64)
+                for length, (_ranks, _) in _by_length.items()
+            },
+            greater_is_better=greater_is_better,
+        )
+
+    def _meta(self) -> typing.Dict[str, typing.Any]:
+        """
+        :return: dict, the layer names and settings, saved with the arrays
+        """
+        return dict(
+            layers=self.layers,
+            greater_is_better=self.greater_is_better,
+            sizes=self.sizes,
+            dense=[length for length in self.sizes if self.ranks[length] is None],
+        )
+
+    def save(self, path: str):
+        """
+        :param path: str, a directory, where each size is saved as scores_<size>.npy
+            (and ranks_<size>.npy), or a .parquet file, with columns "order", "rank" and "score"
+            (requires pyarrow)
+        """
+        if _is_parquet(path):
+            pa, pq = _import_pyarrow()
+            _frame = self.to_frame()
+            _table = pa.Table.from_pandas(_frame, preserve_index=False)
+            _table = _table.replace_schema_metadata(
+                {_PARQUET_KEY: json.dumps(self._meta()).encode()}
+            )
+            pq.write_table(_table, path)
+            return
+        os.makedirs(path, exist_ok=True)
+        for length, _scores in self.scores.items():
+            np.save(os.path.join(path, f"scores_{length}.npy"), _scores)
+            _ranks = self.ranks[length]
+            if _ranks is not None:
+                np.save(os.path.join(path, f"ranks_{length}.npy"), _ranks)
+        with open(os.path.join(path, _META_FILE), "w") as f:
+            json.dump(self._meta(), f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "CurveStore":
+        """
+        :param path: str, a directory or a .parquet file written by CurveStore.save
+        :param mmap: bool, if True, the arrays are memory-mapped instead of read
+            Default: True
+        :return: CurveStore
+        """
+        if _is_parquet(path):
+            _, pq = _import_pyarrow()
+            _table = pq.read_table(path, memory_map=mmap)
+            _meta = json.loads(_table.schema.metadata[_PARQUET_KEY])
+            _order = _table.column("order").to_numpy()
+            _rank = _table.column("rank").to_numpy()
+            _score = _table.column("score").to_numpy()
+            # the rows of each size are contiguous, see to_frame
+            _bounds = np.searchsorted(_order, _meta["sizes"] + [np.iinfo(np.int64).max])
+            scores = {
+                length: _score[_bounds[i] : _bounds[i + 1]]
+                for i, length in enumerate(_meta["sizes"])
+            }
+            ranks = {
+                length: None
+                if length in _meta["dense"]
+                else _rank[_bounds[i] : _bounds[i + 1]]
+                for i, length in enumerate(_meta["sizes"])
+            }
+        else:
+            with open(os.path.join(path, _META_FILE)) as f:
+                _meta = json.load(f)
+            _mode: typing.Optional[typing.Literal["r"]] = "r" if mmap else None
+            scores = {
+                length: np.load(
+                    os.path.join(path, f"scores_{length}.npy"), mmap_mode=_mode
+                )
+                for length in _meta["sizes"]
+            }
+            ranks = {
+                length: None
+                if length in _meta["dense"]
+                else np.load(os.path.join(path, f"ranks_{length}.npy"), mmap_mode=_mode)
+                for length in _meta["sizes"]
+            }
+        return cls(
+            _meta["layers"],
+            scores,
+            ranks=ranks,
+            greater_is_better=_meta["greater_is_better"],
+        )
+
+
+def _is_parquet(path: str) -> bool:
+    """
+    :param path: str
+    :return: bool, True if the path is a Parquet file
+    """
+    return os.path.splitext(path)[1] in (".parquet", ".pq")
+
+
+def _import_pyarrow() -> typing.Tuple[typing.Any, typing.Any]:
+    """
+    :return: Tuple, the pyarrow and pyarrow.parquet modules
+    :raise ImportError: if pyarrow is not installed
+    """
+    try:
+        import pyarrow as pa  # type: ignore
+        import pyarrow.parquet as pq  # type: ignore
+    except ImportError as e:
+        raise ImportError("Parquet results require pyarrow") from e
+    return pa, pq
+
+
+def load_scores(path: str) -> CurveStore:
+    """
+    :param path: str, a CurveStore saved by CurveStore.save,
+        or a dictionary of scores keyed by "size+layer+layer" saved with joblib
+    :return: CurveStore, the scores
+    """
+    if os.path.isdir(path) or _is_parquet(path):
+        return CurveStore.load(path)
+    return CurveStore.from_dict(load(path))
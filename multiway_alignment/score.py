@@ -1,273 +1,1328 @@
+import os
+import time
 import typing
 import pandas as pd
 import numpy as np
-from itertools import combinations
-from functools import partial
+from contextlib import ExitStack
+from itertools import combinations, repeat
+from math import comb
+from uuid import uuid4
 from joblib import dump  # type: ignore
 
-from sklearn.metrics.cluster import normalized_mutual_info_score  # type: ignore
-from sklearn.metrics import adjusted_mutual_info_score  # type: ignore
-
-import multiprocessing as mp
-from multiprocessing.pool import Pool
 from tqdm import tqdm
 
-from multiway_alignment.consensus import get_consensus_labels
+from multiway_alignment.cache import IncrementalConsensus, PartitionCache
+from multiway_alignment.consensus import _encode_opinions, _leave_one_out_codes
+from multiway_alignment.constraints import LayerConstraints
+from multiway_alignment.metrics import (
+    Contingency,
+    available_scores,
+    get_emi_cache,
+    greater_is_better,
+    expected_score,
+    label_scores,
+)
+from multiway_alignment.parallel import (
+    Executor,
+    SharedArray,
+    executor_scope,
+    iter_combinations,
+    iter_prefix_group,
+    prefix_groups,
+    rank_combination,
+    revolving_door,
+    unrank_combination,
+)
+from multiway_alignment.results import AlignmentCurve, CurveStore
+from multiway_alignment.streaming import ScoreSummary, parallel_alignment_scores
 
 from multiway_alignment.utils.logging import logger
 
+# number of random permutations of each layer when adjusted
+_N_PERMUTATIONS = 10
+
+# number of combinations scored between two updates of the results in serial
+_CHUNK_SIZE = 4096
+
+# shared codes, partition cache and incremental consensus of each replica
+# of the current batch of curve tasks in a worker process, see _score_prefix_group
+_curve_worker: typing.Dict[
+    typing.Tuple[str, int],
+    typing.Tuple[SharedArray, PartitionCache, typing.Optional[IncrementalConsensus]],
+] = dict()
+
+
+def _check_layer(layer_codes: np.ndarray) -> np.ndarray:
+    """
+    :param layer_codes: 1d np.array with the integer codes of a layer, -1 for missing values
+    :return: 1d np.array, the same codes
+    :raise ValueError: if the layer has missing values
+    """
+    if (layer_codes < 0).any():
+        raise ValueError("Input contains NaN")
+    return layer_codes
+
 
 def _layer_expectation(
-    layer: typing.Iterable, scoring_function: typing.Callable
+    layer: np.ndarray,
+    consensus: np.ndarray,
+    which_score: str = "nmi",
+    analytic: bool = False,
 ) -> float:
     """
     :param layer: 1d np.array with clustering assignment
-    :param scoring_function: partial Callable, will be called on random permutations of 'layer'
-    :return: float, the expected score of 'scoring_function' under random model
+    :param consensus: 1d np.array, the consensus labels the layer is compared with
+    :param which_score: str, the name of a registered score
+    :param analytic: bool, if True, the exact expectation instead of
+        the average over random permutations of 'layer'
+        Default: False
+    :return: float, the expected score under random model
+    """
+    return expected_score(
+        consensus,
+        layer,
+        which_score=which_score,
+        analytic=analytic,
+        n_permutations=_N_PERMUTATIONS,
+        seed=42,
+    )
+
+
+def _check_scores(
+    which_score: typing.Union[str, typing.Sequence[str]]
+) -> typing.List[str]:
+    """
+    :param which_score: str or list of str, the names of registered scores
+        (see metrics.available_scores(), e.g. "nmi", "ami", "nmi_max", "ari", "vi", "mi")
+    :return: list of str, the names of the scores
+    """
+    _scores = [which_score] if isinstance(which_score, str) else list(which_score)
+    for _score in _scores:
+        assert _score in available_scores(), f"Unknown score {_score}"
+    return _scores
+
+
+def _average_score(
+    layers: typing.Sequence[np.ndarray],
+    consensus: typing.Sequence[np.ndarray],
+    which_scores: typing.Sequence[str],
+    adjusted: bool = False,
+    analytic: bool = False,
+    executor: typing.Optional[Executor] = None,
+) -> typing.Dict[str, float]:
+    """
+    :param layers: list of 1d np.array, the codes of each layer
+    :param consensus: list of 1d np.array, the consensus labels each layer is compared with
+    :param which_scores: list of str, the names of the scores,
+        all computed from the same contingency table of each layer and its consensus
+    :param adjusted: bool, default: False
+    :param analytic: bool, if adjusted, subtract the exact expected scores instead of
+        the average over random permutations
+        Default: False
+    :param executor: Optional[Executor], scores the layers in parallel
+        Default: None (serial)
+    :return: dict[str, float], each average score between each layer and its consensus
+    """
+    if executor is not None:
+        _scores = executor.starmap(
+            label_scores, list(zip(layers, consensus, repeat(which_scores)))
+        )
+    else:
+        _scores = [
+            label_scores(_l, _c, which_scores) for _l, _c in zip(layers, consensus)
+        ]
+
+    avg_nmi = dict.fromkeys(which_scores, 0.0)
+    _expected_nmi = dict.fromkeys(which_scores, 0.0)
+    for _layer, _consensus, _layer_scores in zip(layers, consensus, _scores):
+        for _which in which_scores:
+            avg_nmi[_which] += _layer_scores[_which]
+
+            if adjusted:
+                _expected_nmi[_which] += _layer_expectation(
+                    layer=_layer,
+                    consensus=_consensus,
+                    which_score=_which,
+                    analytic=analytic,
+                )
+    return {
+        _which: (avg_nmi[_which] - _expected_nmi[_which]) / len(layers)
+        for _which in which_scores
+    }
+
+
+def _combination_score(
+    cache: PartitionCache,
+    layer_ids: typing.Sequence[int],
+    which_scores: typing.Sequence[str],
+    adjusted: bool = False,
+    fullpartition: bool = False,
+    analytic: bool = False,
+    consensus: typing.Optional[IncrementalConsensus] = None,
+) -> typing.Dict[str, float]:
+    """
+    :param cache: PartitionCache over the encoded opinions
+    :param layer_ids: list of int, the positions of the layers in the combination
+    :param which_scores: list of str, the names of the scores
+    :param adjusted: bool, default: False
+    :param fullpartition: bool, if True, compare each layer with the consensus of all
+        the layers in the combination, instead of the consensus of the other layers
+        Default: False
+    :param analytic: bool, if adjusted, subtract the exact expected scores
+        Default: False
+    :param consensus: Optional[IncrementalConsensus], if given and fullpartition,
+        the consensus is moved to the combination from the previous one instead of being
+        looked up in the cache (see _incremental_combination_score)
+        Default: None
+    :return: dict[str, float], each multiway alignment score of the combination,
+        computed on the individuals that have labels for all the layers in the combination
+    """
+    if fullpartition and consensus is not None:
+        return _incremental_combination_score(
+            consensus, layer_ids, which_scores, adjusted=adjusted, analytic=analytic
+        )
+    _mask = sum(1 << j for j in layer_ids)
+    # keep only items that have labels for all layers in the combination
+    _rows = cache.rows(_mask)
+    if len(cache.codes) == 0 or (_rows is not None and len(_rows) == 0):
+        raise ZeroDivisionError("The dataframe is empty")
+
+    def _select(labels: np.ndarray) -> np.ndarray:
+        # without missing values the full arrays are used as they are, without copies
+        return labels if _rows is None else labels[_rows]
+
+    _layers = [_select(cache.codes[:, j]) for j in layer_ids]
+    if fullpartition:
+        _consensus = [_select(cache.get(_mask))] * len(layer_ids)
+    else:
+        _consensus = [_select(cache.get(_mask ^ (1 << j))) for j in layer_ids]
+    return _average_score(
+        _layers, _consensus, which_scores, adjusted=adjusted, analytic=analytic
+    )
+
+
+def _incremental_consensus(
+    codes: np.ndarray, fullpartition: bool, enumeration: str
+) -> typing.Optional[IncrementalConsensus]:
+    """
+    :param codes: (n_individuals x n_layers) int64 matrix of layer codes, -1 for missing values
+    :param fullpartition: bool, see maximal_alignment_curves
+    :param enumeration: str, see maximal_alignment_curves
+    :return: Optional[IncrementalConsensus], the consensus moved along the combinations,
+        for the full-partition score in revolving-door order, if its keys fit in an int64
+    """
+    if not fullpartition or enumeration != "revolving_door":
+        return None
+    if not IncrementalConsensus.fits(codes):
+        logger.info("too many opinions for the incremental consensus: using the cache")
+        return None
+    return IncrementalConsensus(codes)
+
+
+def _incremental_combination_score(
+    consensus: IncrementalConsensus,
+    layer_ids: typing.Sequence[int],
+    which_scores: typing.Sequence[str],
+    adjusted: bool = False,
+    analytic: bool = False,
+) -> typing.Dict[str, float]:
+    """
+    Full-partition score of a combination from an incrementally updated consensus:
+    the consensus refines each of its layers, so the contingency table of a layer
+    has one cell per consensus group, read from the group sizes and keys, without
+    a pass over the individuals. The scores are the same as from _combination_score
+    :param consensus: IncrementalConsensus over the encoded opinions
+    :param layer_ids: list of int, the positions of the layers in the combination
+    :param which_scores: list of str, the names of the scores
+    :param adjusted: bool, default: False
+    :param analytic: bool, if adjusted, subtract the exact expected scores
+        Default: False
+    :return: dict[str, float], each multiway alignment score of the combination
+    """
+    consensus.move_to(layer_ids)
+    _rows, _labels, _, _sizes = consensus.groups()
+    if len(_labels) == 0:
+        raise ZeroDivisionError("The dataframe is empty")
+
+    avg_nmi = dict.fromkeys(which_scores, 0.0)
+    _expected_nmi = dict.fromkeys(which_scores, 0.0)
+    for j in layer_ids:
+        _group_codes = consensus.group_codes(j)
+        table = Contingency.from_refinement(_group_codes, _sizes)
+        for _which in which_scores:
+            avg_nmi[_which] += table.score(_which)
+
+            if adjusted and analytic:
+                # the expectation takes the consensus as rows, as in _layer_expectation
+                _expected_nmi[_which] += Contingency.from_refinement(
+                    _group_codes, _sizes, transpose=True
+                ).expected(_which)
+            elif adjusted:
+                _codes = consensus.codes[:, j]
+                _expected_nmi[_which] += _layer_expectation(
+                    layer=_codes if _rows is None else _codes[_rows],
+                    consensus=_labels,
+                    which_score=_which,
+                )
+    return {
+        _which: (avg_nmi[_which] - _expected_nmi[_which]) / len(layer_ids)
+        for _which in which_scores
+    }
+
+
+def _score_combinations(
+    cache: PartitionCache,
+    length: int,
+    which_scores: typing.Sequence[str],
+    adjusted: bool = False,
+    fullpartition: bool = False,
+    analytic: bool = False,
+    enumeration: str = "lexicographic",
+    consensus: typing.Optional[IncrementalConsensus] = None,
+    progress: bool = False,
+    candidates: typing.Optional[typing.Sequence[typing.Tuple[int, ...]]] = None,
+    chunk_size: int = _CHUNK_SIZE,
+) -> typing.Iterator[typing.Tuple[np.ndarray, np.ndarray]]:
+    """
+    :param cache: PartitionCache over the encoded opinions
+    :param length: int, the size of the combinations
+    :param which_scores: list of str, the names of the scores
+    :param adjusted: bool, see _combination_score
+    :param fullpartition: bool, see _combination_score
+    :param analytic: bool, see _combination_score
+    :param enumeration: str, one of "lexicographic" or "revolving_door", the order
+        in which the combinations are scored
+        Default: "lexicographic"
+    :param consensus: Optional[IncrementalConsensus], see _combination_score
+        Default: None
+    :param progress: bool, if True, show a progress bar
+        Default: False
+    :param candidates: Optional[list of tuples of int], the combinations to score,
+        in lexicographic order, e.g. the allowed combinations (see LayerConstraints.combinations)
+        Default: None (all the combinations of that size)
+    :param chunk_size: int, the number of combinations of each chunk
+        Default: 4096
+    :return: iterator of (np.ndarray, np.ndarray), chunks of the ranks (int64) of the combinations
+        in the order of itertools.combinations (of the candidates), and of the matrix
+        of their scores (float64, one column per score)
     """
-    _all_scores = []
-    with Pool(processes=mp.cpu_count() - 1) as pool:
-        result = pool.map_async(
-            scoring_function, [np.random.default_rng(seed=42).permutation(layer) for _ in range(10)]  # type: ignore
-        )  # type: ignore
-        for value in result.get():
-            # NOTE: in case of AMI, it is possible to get negative scores,
-            # but we cap them to 0 so we get only scores >= 0
-            _all_scores.append(max(value, 0))
-    return np.array(_all_scores).mean()
+    _n = cache.codes.shape[1]
+    if candidates is not None:
+        _combinations: typing.Iterable = candidates
+        enumeration = "lexicographic"
+    elif enumeration == "revolving_door":
+        _combinations = revolving_door(_n, length)
+    else:
+        _combinations = iter_combinations(_n, length)
+    ranks, scores = [], []
+    for i, _l_comb in enumerate(
+        tqdm(
+            _combinations,
+            total=comb(_n, length) if candidates is None else len(candidates),
+            disable=not progress,
+        )
+    ):
+        nmi = _combination_score(
+            cache,
+            _l_comb,
+            which_scores,
+            adjusted=adjusted,
+            fullpartition=fullpartition,
+            analytic=analytic,
+            consensus=consensus,
+        )
+        ranks.append(
+            i if enumeration == "lexicographic" else rank_combination(_n, _l_comb)
+        )
+        scores.append([nmi[_which] for _which in which_scores])
+        if len(ranks) == chunk_size:
+            yield np.array(ranks, dtype=np.int64), np.array(scores, dtype=np.float64)
+            ranks, scores = [], []
+    if ranks:
+        yield np.array(ranks, dtype=np.int64), np.array(scores, dtype=np.float64)
+
+
+def _attach_replica(
+    batch: str, replica: int, spec: typing.Any, settings: typing.Dict[str, typing.Any]
+) -> typing.Tuple[PartitionCache, typing.Optional[IncrementalConsensus]]:
+    """
+    Attaches the shared codes of a replica in a worker process, and builds their partition cache,
+    on the first task of the batch
+    :param batch: str, the batch of the task, see _combination_scores
+    :param replica: int, the index of the replica
+    :param spec: the spec of the shared codes of the replica (see parallel.SharedArray)
+    :param settings: dict, see _combination_scores
+    :return: Tuple[PartitionCache, Optional[IncrementalConsensus]], the partition cache
+        and incremental consensus of the replica in this worker
+    """
+    if any(_key[0] != batch for _key in _curve_worker):
+        # drop the replicas of the previous batch
+        _curve_worker.clear()
+    if (batch, replica) not in _curve_worker:
+        _shared = SharedArray.attach(spec)
+        _curve_worker[(batch, replica)] = (
+            _shared,
+            PartitionCache(_shared.array, max_bytes=settings["cache_max_bytes"]),
+            _incremental_consensus(
+                _shared.array, settings["fullpartition"], settings["enumeration"]
+            ),
+        )
+    _, cache, _consensus = _curve_worker[(batch, replica)]
+    return cache, _consensus
+
+
+def _score_prefix_group(
+    task: typing.Tuple,
+) -> typing.Tuple[int, int, int, int, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Scores a group of combinations sharing a prefix in a worker process. The shared codes
+    of each replica are attached, and their partition cache built, on the first group of the batch
+    :param task: tuple (batch, replica, spec, settings, prefix, start), see _combination_scores
+        and parallel.prefix_groups
+    :return: Tuple[int, int, int, int, np.ndarray, np.ndarray, np.ndarray], the replica,
+        the process id of the worker, its partition cache hits and misses on the group,
+        and the size (int64), rank (int64) and scores (float64, one column per score)
+        of each combination of the group
+    """
+    _batch, _replica, _spec, _settings, _prefix, _start = task
+    cache, _consensus = _attach_replica(_batch, _replica, _spec, _settings)
+    _n = cache.codes.shape[1]
+    return _score_task(
+        cache,
+        _consensus,
+        _replica,
+        _settings,
+        [
+            (_l_comb, rank_combination(_n, _l_comb))
+            for _l_comb in iter_prefix_group(
+                _n, _prefix, _start, enumeration=_settings["enumeration"]
+            )
+        ],
+    )
+
+
+def _score_candidates(
+    task: typing.Tuple,
+) -> typing.Tuple[int, int, int, int, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Scores a chunk of consecutive allowed combinations of one size in a worker process
+    (see LayerConstraints.combinations), which share their prefixes in lexicographic order
+    :param task: tuple (batch, replica, spec, settings, start, candidates), see _combination_scores
+    :return: see _score_prefix_group, where the rank of a combination is its position
+        among the allowed combinations of its size
+    """
+    _batch, _replica, _spec, _settings, _start, _candidates = task
+    cache, _consensus = _attach_replica(_batch, _replica, _spec, _settings)
+    return _score_task(
+        cache,
+        _consensus,
+        _replica,
+        _settings,
+        [(_l_comb, _start + i) for i, _l_comb in enumerate(_candidates)],
+    )
+
+
+def _score_task(
+    cache: PartitionCache,
+    consensus: typing.Optional[IncrementalConsensus],
+    replica: int,
+    settings: typing.Dict[str, typing.Any],
+    ranked: typing.Iterable[typing.Tuple[typing.Tuple[int, ...], int]],
+) -> typing.Tuple[int, int, int, int, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :param cache: PartitionCache of the replica in this worker
+    :param consensus: Optional[IncrementalConsensus], see _combination_score
+    :param replica: int, the index of the replica
+    :param settings: dict, see _combination_scores
+    :param ranked: iterable of (combination, rank) pairs
+    :return: see _score_prefix_group
+    """
+    _hits, _misses = cache.hits, cache.misses
+    _which_scores = settings["which_scores"]
+    lengths, ranks, scores = [], [], []
+    for _l_comb, _rank in ranked:
+        nmi = _combination_score(
+            cache,
+            _l_comb,
+            _which_scores,
+            adjusted=settings["adjusted"],
+            fullpartition=settings["fullpartition"],
+            analytic=settings["analytic"],
+            consensus=consensus,
+        )
+        lengths.append(len(_l_comb))
+        ranks.append(_rank)
+        scores.append([nmi[_which] for _which in _which_scores])
+    return (
+        replica,
+        os.getpid(),
+        cache.hits - _hits,
+        cache.misses - _misses,
+        np.array(lengths, dtype=np.int64),
+        np.array(ranks, dtype=np.int64),
+        np.array(scores, dtype=np.float64).reshape(-1, len(_which_scores)),
+    )
+
+
+def _iter_combination_scores(
+    codes: typing.Sequence[np.ndarray],
+    which_scores: typing.Sequence[str],
+    fullpartition: bool = False,
+    adjusted: bool = False,
+    analytic: bool = False,
+    cache_max_bytes: int = 2**28,
+    spill_to: typing.Optional[str] = None,
+    executor: typing.Optional[Executor] = None,
+    enumeration: str = "lexicographic",
+    space: typing.Optional[LayerConstraints] = None,
+) -> typing.Iterator[typing.Tuple[int, int, np.ndarray, np.ndarray]]:
+    """
+    Scores all the combinations of size 2 or more of the layers of one or more replicas,
+    chunk by chunk.
+    In parallel, the codes of each replica are shared with the workers through shared memory,
+    and the combinations of all sizes of all the replicas are handed out in groups sharing
+    a prefix in the lattice of layer subsets (see parallel.prefix_groups), so that a worker
+    finds the parent partitions of the combinations of a group in its own cache.
+    The partition cache hit rate of each worker is logged, and kept in executor.worker_stats
+    :param codes: list of (n_individuals x n_layers) int64 matrices of layer codes,
+        -1 for missing values, one per replica
+    :param which_scores: list of str, the names of the scores
+    :param fullpartition: bool, see maximal_alignment_curves
+    :param adjusted: bool, see maximal_alignment_curves
+    :param analytic: bool, see maximal_alignment_curves
+    :param cache_max_bytes: int, memory budget of the caches of consensus partitions
+        of each process, split across the replicas in parallel
+    :param spill_to: Optional[str], see maximal_alignment_curves (serial only)
+    :param executor: Optional[Executor], runs the chunks of combinations
+        Default: None (serial)
+    :param enumeration: str, see maximal_alignment_curves
+        Default: "lexicographic"
+    :param space: Optional[LayerConstraints], the allowed combinations, which are the only ones
+        enumerated, in lexicographic order and in chunks of consecutive combinations in parallel
+        Default: None (all the combinations)
+    :return: iterator of (int, int, np.ndarray, np.ndarray), chunks of combinations
+        of one replica and one size: the replica, the size, the ranks (int64) of the combinations
+        in the order of itertools.combinations (of LayerConstraints.combinations),
+        and the matrix of their scores (float64, one column per score)
+    """
+    if space is not None:
+        enumeration = "lexicographic"
+    if executor is None or executor.serial:
+        for _replica, _codes in enumerate(codes):
+            cache = PartitionCache(_codes, max_bytes=cache_max_bytes, spill_to=spill_to)
+            _consensus = _incremental_consensus(_codes, fullpartition, enumeration)
+            # skipping size 1
+            for length in (
+                range(2, _codes.shape[1] + 1) if space is None else space.sizes()
+            ):
+                logger.info(f"combinations of size {length}")
+                for _ranks, _scores in _score_combinations(
+                    cache,
+                    length,
+                    which_scores,
+                    adjusted=adjusted,
+                    fullpartition=fullpartition,
+                    analytic=analytic,
+                    enumeration=enumeration,
+                    consensus=_consensus,
+                    progress=True,
+                    candidates=None if space is None else space.combinations(length),
+                ):
+                    yield _replica, length, _ranks, _scores
+            logger.info(f"partition cache hit rate: {cache.hit_rate:.3f}")
+            cache.close()
+        return
+
+    _batch = uuid4().hex
+    _settings = dict(
+        which_scores=list(which_scores),
+        fullpartition=fullpartition,
+        adjusted=adjusted,
+        analytic=analytic,
+        cache_max_bytes=cache_max_bytes // max(len(codes), 1),
+        enumeration=enumeration,
+    )
+    _tasks: typing.List[typing.Tuple] = []
+    _total = 0
+    for _codes in codes:
+        _total += sum(_n_combinations(_codes.shape[1], space).values())
+    _size = executor.chunk_size("combination", _total)
+    _start = time.perf_counter()
+    with ExitStack() as stack:
+        for _replica, _codes in enumerate(codes):
+            _spec = stack.enter_context(SharedArray.create(_codes)).spec
+            if space is None:
+                _tasks += [
+                    (_batch, _replica, _spec, _settings, _prefix, _group_start)
+                    for _prefix, _group_start in prefix_groups(_codes.shape[1], _size)
+                ]
+                continue
+            for length in space.sizes():
+                _candidates = space.combinations(length)
+                _tasks += [
+                    (
+                        _batch,
+                        _replica,
+                        _spec,
+                        _settings,
+                        _chunk_start,
+                        _candidates[_chunk_start : _chunk_start + _size],
+                    )
+                    for _chunk_start in range(0, len(_candidates), _size)
+                ]
+        # each group of combinations sharing a prefix goes to one worker,
+        # which finds the parents of most combinations in its own cache
+        for _replica, _pid, _hits, _misses, _lengths, _ranks, _scores in tqdm(
+            executor.imap_unordered(
+                _score_prefix_group if space is None else _score_candidates, _tasks
+            ),
+            total=len(_tasks),
+        ):
+            executor.add_worker_stats(_pid, hits=_hits, misses=_misses)
+            for length in np.unique(_lengths).tolist():
+                _mask = _lengths == length
+                yield _replica, length, _ranks[_mask], _scores[_mask]
+    executor.record("combination", _total, time.perf_counter() - _start)
+    for _pid, _hit_rate in sorted(executor.worker_hit_rates().items()):
+        logger.info(f"worker {_pid} partition cache hit rate: {_hit_rate:.3f}")
+
+
+def _combination_scores(
+    codes: typing.Sequence[np.ndarray],
+    which_scores: typing.Sequence[str],
+    fullpartition: bool = False,
+    adjusted: bool = False,
+    analytic: bool = False,
+    cache_max_bytes: int = 2**28,
+    spill_to: typing.Optional[str] = None,
+    executor: typing.Optional[Executor] = None,
+    enumeration: str = "lexicographic",
+    space: typing.Optional[LayerConstraints] = None,
+) -> typing.List[typing.Dict[int, np.ndarray]]:
+    """
+    :param codes: list of (n_individuals x n_layers) int64 matrices of layer codes,
+        -1 for missing values, one per replica
+    :param which_scores: list of str, the names of the scores
+    :param fullpartition: bool, see maximal_alignment_curves
+    :param adjusted: bool, see maximal_alignment_curves
+    :param analytic: bool, see maximal_alignment_curves
+    :param cache_max_bytes: int, see _iter_combination_scores
+    :param spill_to: Optional[str], see maximal_alignment_curves (serial only)
+    :param executor: Optional[Executor], runs the chunks of combinations
+        Default: None (serial)
+    :param enumeration: str, see maximal_alignment_curves
+        Default: "lexicographic"
+    :param space: Optional[LayerConstraints], see _iter_combination_scores
+        Default: None (all the combinations)
+    :return: list of dict[int, np.ndarray], for each replica and each size of the combinations,
+        the (n_combinations x n_scores) matrix of scores, in the order of itertools.combinations
+        (of LayerConstraints.combinations)
+    """
+    result: typing.List[typing.Dict[int, np.ndarray]] = [
+        {
+            length: np.empty((_count, len(which_scores)), dtype=np.float64)
+            for length, _count in _n_combinations(_codes.shape[1], space).items()
+        }
+        for _codes in codes
+    ]
+    for _replica, length, _ranks, _scores in _iter_combination_scores(
+        codes,
+        which_scores,
+        fullpartition=fullpartition,
+        adjusted=adjusted,
+        analytic=analytic,
+        cache_max_bytes=cache_max_bytes,
+        spill_to=spill_to,
+        executor=executor,
+        enumeration=enumeration,
+        space=space,
+    ):
+        result[_replica][length][_ranks] = _scores
+    return result
+
+
+def _combination_summaries(
+    codes: np.ndarray,
+    which_scores: typing.Sequence[str],
+    top_k: int,
+    fullpartition: bool = False,
+    adjusted: bool = False,
+    analytic: bool = False,
+    cache_max_bytes: int = 2**28,
+    spill_to: typing.Optional[str] = None,
+    executor: typing.Optional[Executor] = None,
+    enumeration: str = "lexicographic",
+    space: typing.Optional[LayerConstraints] = None,
+) -> typing.Dict[str, typing.Dict[int, ScoreSummary]]:
+    """
+    Scores all the combinations of size 2 or more of the layers, keeping only the streaming
+    summary of the scores of each size (see streaming.ScoreSummary), so that the memory
+    does not depend on the number of combinations
+    :param codes: (n_individuals x n_layers) int64 matrix of layer codes, -1 for missing values
+    :param which_scores: list of str, the names of the scores
+    :param top_k: int, the number of best combinations of each size that are kept
+    :param fullpartition: bool, see maximal_alignment_curves
+    :param adjusted: bool, see maximal_alignment_curves
+    :param analytic: bool, see maximal_alignment_curves
+    :param cache_max_bytes: int, see _iter_combination_scores
+    :param spill_to: Optional[str], see maximal_alignment_curves (serial only)
+    :param executor: Optional[Executor], runs the chunks of combinations
+        Default: None (serial)
+    :param enumeration: str, see maximal_alignment_curves
+        Default: "lexicographic"
+    :param space: Optional[LayerConstraints], see _iter_combination_scores
+        Default: None (all the combinations)
+    :return: dict[str, dict[int, ScoreSummary]], for each score and each size,
+        the summary of the scores of the combinations, ranked as in _combination_scores
+    """
+    summaries = {
+        _which: {
+            length: ScoreSummary(top_k, greater_is_better=greater_is_better(_which))
+            for length in _n_combinations(codes.shape[1], space)
+        }
+        for _which in which_scores
+    }
+    for _, length, _ranks, _scores in _iter_combination_scores(
+        [codes],
+        which_scores,
+        fullpartition=fullpartition,
+        adjusted=adjusted,
+        analytic=analytic,
+        cache_max_bytes=cache_max_bytes,
+        spill_to=spill_to,
+        executor=executor,
+        enumeration=enumeration,
+        space=space,
+    ):
+        for i, _which in enumerate(which_scores):
+            summaries[_which][length].update(_ranks, _scores[:, i])
+    return summaries
+
+
+def _n_combinations(
+    n_layers: int, space: typing.Optional[LayerConstraints] = None
+) -> typing.Dict[int, int]:
+    """
+    :param n_layers: int, the number of layers
+    :param space: Optional[LayerConstraints], the allowed combinations
+        Default: None (all the combinations)
+    :return: dict[int, int], the number of combinations of each size of 2 or more
+    """
+    if space is None:
+        return {length: comb(n_layers, length) for length in range(2, n_layers + 1)}
+    return {length: space.count(length) for length in space.sizes()}
+
+
+def _curves_from_scores(
+    layers: typing.Sequence[typing.Any],
+    scores_by_length: typing.Dict[int, np.ndarray],
+    which_scores: typing.Sequence[str],
+    space: typing.Optional[LayerConstraints] = None,
+) -> typing.Dict[str, AlignmentCurve]:
+    """
+    :param layers: list, the layer names
+    :param scores_by_length: dict[int, np.ndarray], see _combination_scores
+    :param which_scores: list of str, the names of the scores
+    :param space: Optional[LayerConstraints], the allowed combinations that were scored
+        Default: None (all the combinations)
+    :return: dict[str, AlignmentCurve], for each score, the scores of all the combinations
+        and the maximal alignment curve
+    """
+    best_by_combination_size: typing.Dict[str, typing.Dict] = {
+        _which: dict() for _which in which_scores
+    }
+    all_scores_by_combination_size: typing.Dict[str, typing.Dict] = {
+        _which: dict() for _which in which_scores
+    }
+    _greater = {_which: greater_is_better(_which) for _which in which_scores}
+    for length, _length_scores in scores_by_length.items():
+        # Get all combinations of opinions.columns of length "length"
+        _columns_combinations: typing.Iterable[typing.Tuple[int, ...]] = (
+            combinations(range(len(layers)), length)
+            if space is None
+            else space.combinations(length)
+        )
+
+        best_layers_combination = dict.fromkeys(which_scores)
+        best_nmi = {
+            _which: 0.0 if _greater[_which] else np.inf for _which in which_scores
+        }
+
+        for _rank, _l_comb in enumerate(_columns_combinations):
+            l_comb = [layers[j] for j in _l_comb]
+            _key = f"{length}+" + "+".join(sorted(l_comb))
+
+            # CRITERIA
+            nmi = dict(zip(which_scores, _length_scores[_rank].tolist()))
+
+            for _which in which_scores:
+                all_scores_by_combination_size[_which][_key] = nmi[_which]
+
+                if (
+                    nmi[_which] > best_nmi[_which]
+                    if _greater[_which]
+                    else nmi[_which] < best_nmi[_which]
+                ):
+                    best_nmi[_which] = nmi[_which]
+                    best_layers_combination[_which] = l_comb
+
+        # RESULTS
+        for _which in which_scores:
+            best_by_combination_size[_which][length] = (
+                best_nmi[_which],
+                best_layers_combination[_which],
+            )
+            logger.info(
+                f"{length}-combination with best {_which} {best_nmi[_which]}: {best_layers_combination[_which]}"
+            )
+
+    return {
+        _which: AlignmentCurve(
+            all_scores_by_combination_size[_which],
+            best_by_combination_size[_which],
+        )
+        for _which in which_scores
+    }
+
+
+def _stores_from_scores(
+    layers: typing.Sequence[typing.Any],
+    scores_by_length: typing.Dict[int, np.ndarray],
+    which_scores: typing.Sequence[str],
+    space: typing.Optional[LayerConstraints] = None,
+) -> typing.Dict[str, AlignmentCurve]:
+    """
+    :param layers: list, the layer names
+    :param scores_by_length: dict[int, np.ndarray], see _combination_scores
+    :param which_scores: list of str, the names of the scores
+    :param space: Optional[LayerConstraints], the allowed combinations that were scored
+        Default: None (all the combinations)
+    :return: dict[str, AlignmentCurve], for each score, the CurveStore of the scores
+        and the maximal alignment curve, as _curves_from_scores, without naming every combination
+    """
+    _ranks: typing.Dict[int, typing.Optional[np.ndarray]] = {
+        length: None
+        if space is None
+        else np.array(
+            [rank_combination(len(layers), c) for c in space.combinations(length)],
+            dtype=np.int64,
+        )
+        for length in scores_by_length
+    }
+    curves: typing.Dict[str, AlignmentCurve] = dict()
+    for i, _which in enumerate(which_scores):
+        store = CurveStore(
+            layers,
+            {
+                length: np.ascontiguousarray(_length_scores[:, i])
+                for length, _length_scores in scores_by_length.items()
+            },
+            ranks=_ranks,
+            greater_is_better=greater_is_better(_which),
+        )
+        best_by_combination_size = store.best()
+        for length, (
+            best_nmi,
+            best_layers_combination,
+        ) in best_by_combination_size.items():
+            logger.info(
+                f"{length}-combination with best {_which} {best_nmi}: {best_layers_combination}"
+            )
+        curves[_which] = AlignmentCurve(store, best_by_combination_size)
+    return curves
+
+
+def _dump_scores(
+    all_scores: typing.Union[typing.Dict[str, float], CurveStore], path: str
+):
+    """
+    :param all_scores: dict[str, float] or CurveStore, the scores of the combinations
+    :param path: str, the file (joblib) or the directory (CurveStore.save) to save them to
+    """
+    if isinstance(all_scores, CurveStore):
+        all_scores.save(path)
+    else:
+        dump(all_scores, path)
+
+
+def _curves_from_summaries(
+    layers: typing.Sequence[typing.Any],
+    summaries: typing.Dict[str, typing.Dict[int, ScoreSummary]],
+    space: typing.Optional[LayerConstraints] = None,
+) -> typing.Dict[str, AlignmentCurve]:
+    """
+    :param layers: list, the layer names
+    :param summaries: dict[str, dict[int, ScoreSummary]], see _combination_summaries
+    :param space: Optional[LayerConstraints], the allowed combinations that were scored
+        Default: None (all the combinations)
+    :return: dict[str, AlignmentCurve], for each score, the scores of the top_k best
+        combinations of each size, the maximal alignment curve,
+        and the summary of the scores of each size
+    """
+    curves: typing.Dict[str, AlignmentCurve] = dict()
+    for _which, _summaries in summaries.items():
+        _greater = greater_is_better(_which)
+        top_scores_by_combination_size: typing.Dict[str, float] = dict()
+        best_by_combination_size: typing.Dict[int, typing.Tuple] = dict()
+        summary_by_combination_size: typing.Dict[int, typing.Dict] = dict()
+        for length, _summary in _summaries.items():
+            best_nmi, best_layers_combination = (0.0 if _greater else np.inf), None
+            for _rank, _score in _summary.top():
+                l_comb = [
+                    layers[j]
+                    for j in (
+                        unrank_combination(len(layers), length, _rank)
+                        if space is None
+                        else space.unrank(length, _rank)
+                    )
+                ]
+                top_scores_by_combination_size[
+                    f"{length}+" + "+".join(sorted(l_comb))
+                ] = _score
+                if best_layers_combination is None and (
+                    _score > best_nmi if _greater else _score < best_nmi
+                ):
+                    best_nmi, best_layers_combination = _score, l_comb
+            best_by_combination_size[length] = (best_nmi, best_layers_combination)
+            summary_by_combination_size[length] = dict(
+                count=_summary.count,
+                mean=_summary.mean,
+                variance=_summary.variance,
+                quantiles=_summary.quantiles(),
+            )
+            logger.info(
+                f"{length}-combination with best {_which} {best_nmi}: {best_layers_combination}"
+            )
+        curves[_which] = AlignmentCurve(
+            top_scores_by_combination_size,
+            best_by_combination_size,
+            summary=summary_by_combination_size,
+        )
+    return curves
 
 
 def multiway_alignment_score(
     opinions: typing.Union[pd.DataFrame, pd.Series],
     which_score: str = "nmi",
     adjusted: bool = False,
+    n_jobs: int = 1,
+    parallel: str = "rows",
+    analytic: bool = False,
+    executor: typing.Optional[Executor] = None,
 ) -> float:
     """
     :param opinions: pd.DataFrame having one column per layer and one row per node,
         where each element a_ij is an integer representing the cluster labels for node i at layer j
-    :param which_score: str, one of "nmi" or "ami"
+    :param which_score: str, the name of a registered score (see metrics.available_scores())
+        Default: "nmi"
     :param adjusted: bool, default: False
+    :param analytic: bool, if adjusted, subtract the exact expected score under random permutations
+        instead of the average over random permutations of each layer
+        Default: False
+    :param n_jobs: int, the number of worker processes
+        Default: 1
+    :param parallel: str, one of "rows" or "layers", what is split across the workers if n_jobs > 1.
+        If "rows", the rows are counted in parallel (see streaming.parallel_alignment_scores),
+        which falls back to "layers" if adjusted; if "layers", the layers are scored in parallel
+        Default: "rows"
+    :param executor: Optional[Executor], the worker processes, shared across calls;
+        if given, 'n_jobs' is ignored
+        Default: None (a new pool of n_jobs processes for this call)
     :return: float, between 0 and 1
     """
-    assert which_score in ("nmi", "ami")
-
-    if which_score == "nmi":
-        _score_f = normalized_mutual_info_score
-    elif which_score == "ami":
-        _score_f = adjusted_mutual_info_score
+    assert parallel in ("rows", "layers")
+    _scores = _check_scores(which_score)
 
     if opinions.empty:
         raise ZeroDivisionError("The dataframe is empty")
 
-    avg_nmi = 0
-    _expected_nmi = 0.0
-    for layer_id in opinions.columns:
-        _layer = opinions[layer_id].values
-        _k_minus_one_consensus = get_consensus_labels(
-            opinions.copy().drop(columns=[layer_id])
-        )
-        _score = _score_f(_layer, _k_minus_one_consensus, average_method="arithmetic")
-        avg_nmi += _score
-
-        if adjusted:
-            _expected_nmi += _layer_expectation(
-                layer=_layer,
-                scoring_function=partial(
-                    _score_f, _k_minus_one_consensus, **{"average_method": "arithmetic"}
-                ),
-            )
-    return (avg_nmi - _expected_nmi) / len(opinions.columns)
+    with executor_scope(executor, n_jobs) as _executor:
+        if not _executor.serial and parallel == "rows" and not adjusted:
+            if isinstance(opinions, pd.Series):
+                opinions = opinions.to_frame()
+            if opinions.isna().any(axis=None):
+                raise ValueError("Input contains NaN")
+            (_score,) = parallel_alignment_scores(
+                opinions, which_score=which_score, executor=_executor
+            ).values()
+            return _score
+
+        # factorize every layer once, then build the k leave-one-out consensus
+        # partitions from shared prefix and suffix partitions
+        _codes, _ = _encode_opinions(opinions)
+        _layers = [_check_layer(_codes[:, j]) for j in range(_codes.shape[1])]
+        _k_minus_one_consensus = _leave_one_out_codes(_codes)
+        return _average_score(
+            _layers,
+            _k_minus_one_consensus,
+            _scores,
+            adjusted=adjusted,
+            analytic=analytic,
+            executor=None if _executor.serial else _executor,
+        )[which_score]
 
 
 def multiway_alignment_score_fullpartition(
     opinions: typing.Union[pd.DataFrame, pd.Series],
-    mutual_clusters_labels: typing.List,
+    mutual_clusters_labels: typing.Union[typing.List, np.ndarray],
     which_score: str = "nmi",
     adjusted: bool = False,
+    analytic: bool = False,
 ) -> float:
     """
     :param opinions: pd.DataFrame having one column per layer and one row per node,
         where each element a_ij is an integer representing the cluster labels for node i at layer j
-    :param mutual_clusters_labels: list, a list of labels for mutual clusters
-    :param which_score: str, one of "nmi" or "ami"
+    :param mutual_clusters_labels: list or 1d np.array, the labels for mutual clusters
+    :param which_score: str, the name of a registered score (see metrics.available_scores())
+        Default: "nmi"
     :param adjusted: bool, default: False
+    :param analytic: bool, if adjusted, subtract the exact expected score under random permutations
+        instead of the average over random permutations of each layer
+        Default: False
     :return: float, between 0 and 1
     """
-    assert which_score in ("nmi", "ami")
-
-    if which_score == "nmi":
-        _score_f = normalized_mutual_info_score
-    elif which_score == "ami":
-        _score_f = adjusted_mutual_info_score
+    _scores = _check_scores(which_score)
 
     if opinions.empty:
         raise ZeroDivisionError("The dataframe is empty")
 
-    avg_nmi = 0
-    _expected_nmi = 0.0
-    for layer_id in opinions.columns:
-        _layer = opinions[layer_id].values
-        _score = _score_f(_layer, mutual_clusters_labels, average_method="arithmetic")
-        avg_nmi += _score
-
-        if adjusted:
-            _expected_nmi += _layer_expectation(
-                layer=_layer,
-                scoring_function=partial(
-                    _score_f, mutual_clusters_labels, **{"average_method": "arithmetic"}
-                ),
-            )
-    return (avg_nmi - _expected_nmi) / len(opinions.columns)
+    _codes, _ = _encode_opinions(opinions)
+    _layers = [_check_layer(_codes[:, j]) for j in range(_codes.shape[1])]
+    return _average_score(
+        _layers,
+        [np.asarray(mutual_clusters_labels)] * len(_layers),
+        _scores,
+        adjusted=adjusted,
+        analytic=analytic,
+    )[which_score]
 
 
-def maximal_alignment_curve(
+def maximal_alignment_curves(
     opinions: typing.Union[pd.DataFrame, pd.Series],
-    which_score: str = "nmi",
+    which_scores: typing.Sequence[str] = ("nmi",),
+    fullpartition: bool = False,
     adjusted: bool = False,
     dump_to: typing.Optional[str] = None,
-) -> typing.Tuple:
+    cache_max_bytes: int = 2**28,
+    spill_to: typing.Optional[str] = None,
+    missing: str = "drop",
+    analytic: bool = False,
+    n_jobs: int = 1,
+    executor: typing.Optional[Executor] = None,
+    enumeration: str = "lexicographic",
+    search: str = "exhaustive",
+    beam_width: int = 1,
+    n_samples: int = 1000,
+    max_seconds: typing.Optional[float] = None,
+    stratified: bool = False,
+    include: typing.Optional[typing.Sequence[typing.Any]] = None,
+    exclude: typing.Optional[typing.Sequence[typing.Any]] = None,
+    groups: typing.Optional[typing.Sequence[typing.Sequence[typing.Any]]] = None,
+    min_size: int = 2,
+    max_size: typing.Optional[int] = None,
+    top_k: typing.Optional[int] = None,
+    compact: bool = False,
+) -> typing.Dict[str, AlignmentCurve]:
     """
+    Computes the maximal alignment curve of several scores in one traversal of the combinations:
+    each layer and its consensus are compared through one contingency table,
+    from which every score is computed
     :param opinions: pd.DataFrame having one column per layer and one row per node,
         where each element a_ij is an integer representing the cluster labels for node i at layer j
-    :param which_score: str, one of "nmi" or "ami"
+    :param which_scores: list of str, the names of registered scores (see metrics.available_scores())
+        Default: ("nmi",)
+    :param fullpartition: bool, if True, compare each layer with the consensus of all
+        the layers in the combination, as in maximal_alignment_curve_fullpartition
+        Default: False
     :param adjusted: bool, default: False
-    :param dump_to: Optional[str], filename to save results
+    :param analytic: bool, if adjusted, subtract the exact expected score under random permutations
+        instead of the average over random permutations of each layer
+        Default: False
+    :param dump_to: Optional[str], filename prefix to save results, one pair of files per score
         Default: None
-    :return: Tuple[dict[str, tuple[float, list]], dict[int, tuple[float, list, dict]]],
-        a tuple of two dictionaries, the first one including all the scores for all the combinations,
-        and the second one being the maximal alignment curve.
-        In the first dictionary, the key is the size of the combination (int) and
-        the list of layers and the value is a tuple, where the first element is the multiway alignment score,
-        and the second element is the dictionary of mutual communities for that combination;
-        In the second dictionary, the key is the size of the combination (int) and
-        the value is a list, where the first element is the highest multiway alignment score for that size,
-        the second element is the list of layers that gives the highest alignment score,
-        and the last element is the dictionary of mutual communities for that combination
-    """
-    assert which_score in ("nmi", "ami")
-
-    best_by_combination_size = dict()
-    all_scores_by_combination_size = dict()
-    _num_of_layers = len(opinions.columns)
-    # skipping size 1
-    for length in range(2, _num_of_layers + 1):
-        logger.info(f"combinations of size {length}")
-        # Get all combinations of opinions.columns of length "length"
-        _columns_combinations = combinations(opinions.columns, length)
-
-        best_layers_combination = None
-        best_nmi = 0.0
-        # best_layers_combination_mutual_communities = dict()
-
-        for _l_comb in tqdm(_columns_combinations):
-            l_comb = list(_l_comb)
-            l_comb_df = opinions[l_comb].copy()
-            # keep only items that have labels for all items in l_comb and reindex
-            l_comb_df.dropna(inplace=True)
-            l_comb_df.reset_index(drop=True, inplace=True)
+    :param cache_max_bytes: int, memory budget of the cache of consensus partitions.
+        The partition of each combination is built from the cached partition of a combination
+        with one layer less, so the combinations are walked as a dynamic program
+        over the lattice of layer subsets
+        Default: 256 MiB
+    :param spill_to: Optional[str], directory where partitions evicted from the cache are saved
+        (in a temporary subdirectory, deleted when the curves are done)
+        Default: None (evicted partitions are rebuilt if needed)
+    :param missing: str, one of "drop" or "category".
+        If "drop", each combination is scored on the individuals that have an opinion on all its layers;
+        if "category", a missing opinion is treated as one more opinion, and no individual is dropped
+        Default: "drop"
+    :param n_jobs: int, if greater than 1, the combinations are scored in groups sharing
+        a prefix by n_jobs worker processes, which read the encoded opinions
+        from shared memory and keep their own cache of consensus partitions.
+        The results are identical to the serial run
+        Default: 1
+    :param executor: Optional[Executor], the worker processes, shared across calls;
+        if given, 'n_jobs' is ignored
+        Default: None (a new pool of n_jobs processes for this call)
+    :param enumeration: str, one of "lexicographic" or "revolving_door", the order in which
+        the combinations of each size are scored. In revolving-door order, consecutive
+        combinations differ by one layer out and one layer in: the consensus partitions
+        of the other layers are found in the cache, and with fullpartition the consensus
+        is updated from the previous combination with a cost that does not depend on its size.
+        The results are the same in both orders
+        Default: "lexicographic"
+    :param search: str, one of "exhaustive" or "branch_and_bound". If "branch_and_bound",
+        the combinations of each size whose scores are bounded (from the entropies of the layers
+        and of the consensus of their subsets) below the best score found so far are not scored,
+        see search.CurveSearch. The maximal alignment curve is the same as the exhaustive one,
+        but the scores only have the scored combinations. Only for scores with a bound
+        (see metrics.has_bound, e.g. NMI, MI, VI but not AMI or ARI), and for adjusted scores
+        where greater is better. The search runs in the calling process, and only prunes
+        where it pays off (see search.prunes): with fullpartition, or for VI; the other scores
+        are enumerated exhaustively, with n_jobs. With missing values dropped, the individuals
+        depend on the combination and the entropies cannot bound the scores: the search is exhaustive.
+        If "forward" or "backward", the curve is approximated size by size in polynomial time
+        by forward selection from the pairs of layers, or backward elimination from all the layers,
+        keeping the beam_width best combinations of each size (see search.CurveSearch.beam_curve),
+        for any score and with missing values.
+        If "sampled", the curve is estimated from n_samples random combinations of each size,
+        scored as in the exhaustive search (see search.CurveSearch.sample_curve)
+        Default: "exhaustive"
+    :param beam_width: int, with search "forward" or "backward", the number of combinations
+        of each size that are extended (1 for a greedy search)
+        Default: 1
+    :param n_samples: int, with search "sampled", the number of random combinations of each size.
+        The sizes with at most n_samples combinations are enumerated
+        Default: 1000
+    :param max_seconds: Optional[float], with search "sampled", the time budget of each size
+        Default: None (no time budget)
+    :param stratified: bool, with search "sampled", if True, every layer is in the same share
+        of the random combinations of each size
+        Default: False
+    :param include: Optional[list], the layers in every combination
+        Default: None
+    :param exclude: Optional[list], the layers in no combination
+        Default: None
+    :param groups: Optional[list of lists], disjoint groups of layers, each of them
+        in a combination with all its layers or not at all (e.g. the questions of a survey block).
+        The constraints are applied while enumerating the combinations (see constraints.LayerConstraints),
+        by every search: only the allowed combinations are scored, in lexicographic order
+        Default: None
+    :param min_size: int, the smallest size of the combinations
+        Default: 2
+    :param max_size: Optional[int], the largest size of the combinations
+        Default: None (all the layers)
+    :param top_k: Optional[int], with search "exhaustive", if given, only the top_k best
+        combinations of each size are kept in the scores, with streaming statistics
+        of the scores of each size, so that the memory does not depend on the number
+        of combinations (see streaming.ScoreSummary)
+        Default: None (all the combinations are kept)
+    :param compact: bool, if True, the dictionary of the scores is replaced by a results.CurveStore,
+        which keeps the scores of each size in an array indexed by the rank of the combinations,
+        and only names the layers of a combination on request. With dump_to, it is saved
+        as a directory of .npy files, loaded memory-mapped with results.CurveStore.load
+        Default: False
+    :return: dict[str, results.AlignmentCurve], for each score, the scores of the combinations
+        and the maximal alignment curve, which unpack as a pair whatever the search,
+        with the approximated sizes, the summary (top_k) and the report (search "sampled")
+        as attributes. For scores where lower is better (e.g. "vi"), the curve keeps
+        the lowest score of each size
+    """
+    assert enumeration in ("lexicographic", "revolving_door")
+    assert search in (
+        "exhaustive",
+        "branch_and_bound",
+        "forward",
+        "backward",
+        "sampled",
+    )
+    assert top_k is None or (top_k >= 1 and search == "exhaustive")
+    _scores = _check_scores(which_scores)
 
-            # CRITERIA
-            nmi = multiway_alignment_score(
-                l_comb_df, which_score=which_score, adjusted=adjusted
-            )
+    _codes, _ = _encode_opinions(opinions, missing=missing)
+    _constraints = LayerConstraints(
+        list(opinions.columns),
+        include=include,
+        exclude=exclude,
+        groups=groups,
+        min_size=min_size,
+        max_size=max_size,
+    )
+    _space = None if _constraints.unconstrained else _constraints
+    if _space is not None and enumeration == "revolving_door":
+        logger.info(
+            "constraints: the combinations are enumerated in lexicographic order"
+        )
+    if search == "branch_and_bound" and (_codes < 0).any():
+        logger.info("missing values: the combinations are searched exhaustively")
+        search = "exhaustive"
+    curves: typing.Dict[str, AlignmentCurve] = dict()
+    _enumerated = _scores
+    if search != "exhaustive":
+        # imported here, since the search scores the combinations with this module
+        from multiway_alignment.search import _check_bounds, prunes, search_curves
 
-            all_scores_by_combination_size[f"{length}+" + "+".join(sorted(l_comb))] = (
-                nmi
+        _searched = _scores
+        if search == "branch_and_bound":
+            _check_bounds(_scores, adjusted)
+            _searched = [_which for _which in _scores if prunes(_which, fullpartition)]
+            if len(_searched) < len(_scores):
+                logger.info(
+                    f"leave-one-out scores: {[w for w in _scores if w not in _searched]} "
+                    "are enumerated, the bound prunes too few combinations"
+                )
+        _enumerated = [_which for _which in _scores if _which not in _searched]
+    if search != "exhaustive" and _searched:
+        curves = search_curves(
+            _codes,
+            list(opinions.columns),
+            _searched,
+            search=search,
+            beam_width=beam_width,
+            n_samples=n_samples,
+            max_seconds=max_seconds,
+            stratified=stratified,
+            fullpartition=fullpartition,
+            adjusted=adjusted,
+            analytic=analytic,
+            cache_max_bytes=cache_max_bytes,
+            spill_to=spill_to,
+            space=_space,
+        )
+    if _enumerated and top_k is not None:
+        with executor_scope(executor, n_jobs) as _executor:
+            _summaries = _combination_summaries(
+                _codes,
+                _enumerated,
+                top_k,
+                fullpartition=fullpartition,
+                adjusted=adjusted,
+                analytic=analytic,
+                cache_max_bytes=cache_max_bytes,
+                spill_to=spill_to,
+                executor=_executor,
+                enumeration=enumeration,
+                space=_space,
             )
-
-            if nmi > best_nmi:
-                best_nmi = nmi
-                best_layers_combination = l_comb
-
-        # RESULTS
-        best_by_combination_size[length] = (
-            best_nmi,
-            best_layers_combination,
+        curves.update(
+            _curves_from_summaries(list(opinions.columns), _summaries, space=_space)
         )
-        logger.info(
-            f"{length}-combination with highest score {best_nmi}: {best_layers_combination}"
+    elif _enumerated:
+        with executor_scope(executor, n_jobs) as _executor:
+            (_scores_by_length,) = _combination_scores(
+                [_codes],
+                _enumerated,
+                fullpartition=fullpartition,
+                adjusted=adjusted,
+                analytic=analytic,
+                cache_max_bytes=cache_max_bytes,
+                spill_to=spill_to,
+                executor=_executor,
+                enumeration=enumeration,
+                space=_space,
+            )
+        curves.update(
+            (_stores_from_scores if compact else _curves_from_scores)(
+                list(opinions.columns), _scores_by_length, _enumerated, space=_space
+            )
         )
+    curves = {_which: curves[_which] for _which in _scores}
+    if compact:
+        curves = {
+            _which: _curve.with_scores(
+                _curve.all_scores
+                if isinstance(_curve.all_scores, CurveStore)
+                else CurveStore.from_dict(
+                    _curve.all_scores,
+                    layers=list(opinions.columns),
+                    greater_is_better=greater_is_better(_which),
+                )
+            )
+            for _which, _curve in curves.items()
+        }
+
+    _emi_cache = get_emi_cache()
+    if _emi_cache is not None:
+        logger.info(f"EMI cache hit rate: {_emi_cache.hit_rate:.3f}")
 
     if dump_to:
-        dump(all_scores_by_combination_size, dump_to + "_all")
-        dump(best_by_combination_size, dump_to + "_best")
+        for _which in _scores:
+            _dump_scores(curves[_which].all_scores, f"{dump_to}_{_which}_all")
+            dump(curves[_which].best, f"{dump_to}_{_which}_best")
 
-    return all_scores_by_combination_size, best_by_combination_size
+    return curves
 
 
-def maximal_alignment_curve_fullpartition(
+def maximal_alignment_curve(
     opinions: typing.Union[pd.DataFrame, pd.Series],
     which_score: str = "nmi",
     adjusted: bool = False,
     dump_to: typing.Optional[str] = None,
-) -> typing.Tuple:
+    **kwargs: typing.Any,
+) -> AlignmentCurve:
     """
+    The maximal alignment curve of one score, see maximal_alignment_curves for the options
     :param opinions: pd.DataFrame having one column per layer and one row per node,
         where each element a_ij is an integer representing the cluster labels for node i at layer j
-    :param which_score: str, one of "nmi" or "ami"
+    :param which_score: str, the name of a registered score (see metrics.available_scores())
+        Default: "nmi"
     :param adjusted: bool, default: False
     :param dump_to: Optional[str], filename to save results
         Default: None
-    :return: Tuple[dict[str, tuple[float, list]], dict[int, tuple[float, list, dict]]],
-        a tuple of two dictionaries, the first one including all the scores for all the combinations,
-        and the second one being the maximal alignment curve.
-        In the first dictionary, the key is the size of the combination (int) and
-        the list of layers and the value is a tuple, where the first element is the multiway alignment score,
-        and the second element is the dictionary of mutual communities for that combination;
-        In the second dictionary, the key is the size of the combination (int) and
-        the value is a list, where the first element is the highest multiway alignment score for that size,
-        the second element is the list of layers that gives the highest alignment score,
-        and the last element is the dictionary of mutual communities for that combination
-    """
-    assert which_score in ("nmi", "ami")
-
-    best_by_combination_size = dict()
-    all_scores_by_combination_size = dict()
-    _num_of_layers = len(opinions.columns)
-    # skipping size 1
-    for length in range(2, _num_of_layers + 1):
-        logger.info(f"combinations of size {length}")
-        # Get all combinations of opinions.columns of length "length"
-        _columns_combinations = combinations(opinions.columns, length)
-
-        best_layers_combination = None
-        best_nmi = 0.0
-        # best_layers_combination_mutual_communities = dict()
-
-        for _l_comb in tqdm(_columns_combinations):
-            l_comb = list(_l_comb)
-            l_comb_df = opinions[l_comb].copy()
-            # keep only items that have labels for all items in l_comb and reindex
-            l_comb_df.dropna(inplace=True)
-            l_comb_df.reset_index(drop=True, inplace=True)
-
-            # consensus partition labels
-            labels_list = get_consensus_labels(opinions=l_comb_df)
+    :param kwargs: the other options of maximal_alignment_curves
+    :return: results.AlignmentCurve, the scores of the combinations and the maximal
+        alignment curve (see maximal_alignment_curves)
+    """
+    return _single_curve(opinions, which_score, adjusted, dump_to, False, kwargs)
 
-            # CRITERIA
-            nmi = multiway_alignment_score_fullpartition(
-                l_comb_df, labels_list, which_score=which_score, adjusted=adjusted
-            )
 
-            all_scores_by_combination_size[f"{length}+" + "+".join(sorted(l_comb))] = (
-                nmi
-            )
+def maximal_alignment_curve_fullpartition(
+    opinions: typing.Union[pd.DataFrame, pd.Series],
+    which_score: str = "nmi",
+    adjusted: bool = False,
+    dump_to: typing.Optional[str] = None,
+    **kwargs: typing.Any,
+) -> AlignmentCurve:
+    """
+    The maximal alignment curve of one score against the consensus of all the layers
+    of each combination, see maximal_alignment_curves (fullpartition=True) for the options
+    :param opinions: pd.DataFrame having one column per layer and one row per node,
+        where each element a_ij is an integer representing the cluster labels for node i at layer j
+    :param which_score: str, the name of a registered score (see metrics.available_scores())
+        Default: "nmi"
+    :param adjusted: bool, default: False
+    :param dump_to: Optional[str], filename to save results
+        Default: None
+    :param kwargs: the other options of maximal_alignment_curves
+    :return: results.AlignmentCurve, the scores of the combinations and the maximal
+        alignment curve (see maximal_alignment_curves)
+    """
+    return _single_curve(opinions, which_score, adjusted, dump_to, True, kwargs)
 
-            if nmi > best_nmi:
-                best_nmi = nmi
-                best_layers_combination = l_comb
 
-        # RESULTS
-        best_by_combination_size[length] = (
-            best_nmi,
-            best_layers_combination,
-        )
-        logger.info(
-            f"{length}-combination with highest score {best_nmi}: {best_layers_combination}"
-        )
+def _single_curve(
+    opinions: typing.Union[pd.DataFrame, pd.Series],
+    which_score: str,
+    adjusted: bool,
+    dump_to: typing.Optional[str],
+    fullpartition: bool,
+    options: typing.Dict[str, typing.Any],
+) -> AlignmentCurve:
+    """
+    :param opinions: pd.DataFrame having one column per layer and one row per node
+    :param which_score: str, the name of a registered score
+    :param adjusted: bool
+    :param dump_to: Optional[str], filename to save results
+    :param fullpartition: bool, see maximal_alignment_curves
+    :param options: dict, the other options of maximal_alignment_curves
+    :return: results.AlignmentCurve
+    """
+    curves = maximal_alignment_curves(
+        opinions,
+        which_scores=[which_score],
+        fullpartition=fullpartition,
+        adjusted=adjusted,
+        **options,
+    )[which_score]
 
     if dump_to:
-        dump(all_scores_by_combination_size, dump_to + "_all")
-        dump(best_by_combination_size, dump_to + "_best")
+        _dump_scores(curves.all_scores, dump_to + "_all")
+        dump(curves.best, dump_to + "_best")
 
-    return all_scores_by_combination_size, best_by_combination_size
+    return curves
@@ -0,0 +1,786 @@
+import heapq
+import time
+import typing
+from collections import Counter, OrderedDict
+from math import ceil, inf
+
+import numpy as np
+
+from multiway_alignment.cache import PartitionCache
+from multiway_alignment.constraints import LayerConstraints
+from multiway_alignment.metrics import (
+    _entropy_from_counts,
+    greater_is_better,
+    has_bound,
+    score_bound,
+)
+from multiway_alignment.results import AlignmentCurve
+from multiway_alignment.score import _combination_score
+from multiway_alignment.streaming import _QUANTILES
+
+from multiway_alignment.utils.logging import logger
+
+# relative tolerance of the pruning test, so that rounding in the entropies never prunes
+# a combination scoring as well as the best one
+_BOUND_TOLERANCE = 1e-9
+# approximate memory of an entropy kept by CurveSearch.entropy (key, value and links)
+_ENTROPY_BYTES = 128
+
+
+class CurveSearch:
+    """
+    Scores combinations of layers on demand for the searches of the maximal alignment curve
+    that do not enumerate every combination. Each combination is scored once,
+    with the same arithmetic as the exhaustive enumeration, and kept in 'scores'.
+    The searches only visit the combinations allowed by the constraints (see LayerConstraints),
+    extending the required layers with free units.
+    The exact search is a branch and bound over the combinations of each size
+    in lexicographic order: a partial combination S is pruned when the most favourable
+    score of any of its completions is worse than the best score found so far.
+    Each layer j scores at most score_bound(H(L_j), H(consensus), H(L_j and consensus), MI),
+    where the entropies of the consensus partitions are bounded from below by the entropy
+    of the consensus of a subset with the remaining units, since adding layers only refines
+    a partition, and from above by adding the entropies of the added layers.
+    Without fullpartition, the mutual information MI = H(L_j) + H(consensus) - H(L_j and consensus)
+    is also at most that of L_j with the consensus of all the other layers.
+    The entropies of the children of a partial combination are only computed
+    when the entropies inherited from its parent do not prune it.
+    The approximate searches are a beam search, forward or backward over the sizes (see beam_curve),
+    and a random sample of the combinations of each size (see sample_curve)
+    ------------
+    Example
+    ------------
+    >>> codes, _ = _encode_opinions(opinions)
+    >>> search = CurveSearch(PartitionCache(codes), "nmi", fullpartition=True)
+    >>> search.branch_and_bound(3)  # best score and combination of size 3
+    """
+
+    def __init__(
+        self,
+        cache: PartitionCache,
+        which_score: str = "nmi",
+        fullpartition: bool = False,
+        adjusted: bool = False,
+        analytic: bool = False,
+        space: typing.Optional[LayerConstraints] = None,
+    ):
+        """
+        :param cache: PartitionCache over the encoded opinions
+            (without missing values for the exact search)
+        :param which_score: str, the name of a registered score
+        :param fullpartition: bool, see score.maximal_alignment_curves
+        :param adjusted: bool, see score.maximal_alignment_curves
+        :param analytic: bool, see score.maximal_alignment_curves
+        :param space: Optional[LayerConstraints], the allowed combinations
+            Default: None (all the combinations of 2 or more layers)
+        """
+        self.cache = cache
+        self.which_score = which_score
+        self.fullpartition = fullpartition
+        self.adjusted = adjusted
+        self.analytic = analytic
+        self.n_layers = cache.codes.shape[1]
+        self.space = LayerConstraints(range(self.n_layers)) if space is None else space
+        # scores are compared as gains, the greater the better
+        self._sign = 1.0 if greater_is_better(which_score) else -1.0
+        self.scores: typing.Dict[typing.Tuple[int, ...], float] = dict()
+        # entropies of consensus partitions, in least-recently-used order,
+        # within the memory budget of the cache
+        self._entropies: OrderedDict[int, float] = OrderedDict()
+        self._max_entropies = max(cache.max_bytes // _ENTROPY_BYTES, 1)
+        self.n_pruned = 0
+
+    def score(self, combination: typing.Tuple[int, ...]) -> float:
+        """
+        :param combination: tuple of int, the sorted positions of the layers
+        :return: float, the score of the combination
+        """
+        if combination not in self.scores:
+            self.scores[combination] = _combination_score(
+                self.cache,
+                combination,
+                [self.which_score],
+                adjusted=self.adjusted,
+                fullpartition=self.fullpartition,
+                analytic=self.analytic,
+            )[self.which_score]
+        return self.scores[combination]
+
+    def gain(self, score: float) -> float:
+        """
+        :param score: float
+        :return: float, the score, negated if lower is better
+        """
+        return self._sign * score
+
+    def entropy(self, mask: int) -> float:
+        """
+        :param mask: int, the bitmask of the layers in the subset
+        :return: float, the entropy of the consensus partition of the subset
+            (0 for the empty subset)
+        """
+        if mask == 0:
+            return 0.0
+        if mask in self._entropies:
+            self._entropies.move_to_end(mask)
+            return self._entropies[mask]
+        _h = _entropy_from_counts(np.bincount(self.cache.get(mask)))
+        self._entropies[mask] = _h
+        if len(self._entropies) > self._max_entropies:
+            self._entropies.popitem(last=False)
+        return _h
+
+    def _layer_bound(
+        self,
+        h_layer: float,
+        h_joint: float,
+        mi: float,
+        h_without: typing.Tuple[float, float],
+    ) -> float:
+        """
+        :param h_layer: float, the entropy of a layer
+        :param h_joint: float, a lower bound of the entropy of the consensus of the combination
+        :param mi: float, an upper bound of the mutual information of the layer
+            with the consensus of any allowed combination (see _mi_bounds)
+        :param h_without: tuple of float, lower and upper bounds of the entropy of the consensus
+            of the combination without the layer (not used if fullpartition)
+        :return: float, the greatest gain of the layer in the combination
+        """
+        if self.fullpartition:
+            # the consensus refines the layer: the mutual information is the entropy of the layer
+            return self.gain(
+                score_bound(self.which_score, h_layer, h_joint, h_joint, mi=h_layer)
+            )
+        # MI(layer, consensus) = H(layer) + H(consensus) - H(consensus and layer)
+        # and H(consensus) >= H(consensus and layer) - H(layer)
+        _h_lo, _h_hi = h_without
+        return self.gain(
+            score_bound(
+                self.which_score,
+                h_layer,
+                max(_h_lo, h_joint - h_layer),
+                h_joint,
+                mi=max(min(mi, h_layer + _h_hi - h_joint), 0.0),
+            )
+        )
+
+    def _h_without(
+        self, mask: int, j: int, h_layer: float, exact: bool
+    ) -> typing.Tuple[float, float]:
+        """
+        :param mask: int, the bitmask of a subset including layer j
+        :param j: int, a layer of the subset
+        :param h_layer: float, the entropy of layer j
+        :param exact: bool, if True, the entropy is computed, otherwise only bounded
+        :return: tuple of float, lower and upper bounds of the entropy of the consensus
+            of the subset without j (zeros if fullpartition, where they are not used)
+        """
+        if self.fullpartition:
+            return 0.0, 0.0
+        if exact:
+            _h = self.entropy(mask ^ (1 << j))
+            return _h, _h
+        _h_subset = self.entropy(mask)
+        return max(_h_subset - h_layer, 0.0), _h_subset
+
+    def _mi_bounds(self, h: typing.Sequence[float]) -> typing.List[float]:
+        """
+        :param h: list of float, the entropy of each layer
+        :return: list of float, for each layer, an upper bound of its mutual information with
+            the consensus of any allowed combination: the entropy of the layer if fullpartition,
+            otherwise its mutual information with the consensus of all the other allowed layers,
+            since the consensus of fewer layers is less informative
+        """
+        if self.fullpartition:
+            return list(h)
+        _all = _mask(self.space.required) | _mask(
+            j for _unit in self.space.units for j in _unit
+        )
+        _h_all = self.entropy(_all)
+        return [
+            min(h[j], h[j] + self.entropy(_all ^ (1 << j)) - _h_all)
+            if _all >> j & 1
+            else h[j]
+            for j in range(self.n_layers)
+        ]
+
+    def branch_and_bound(
+        self,
+        length: int,
+        seed: typing.Optional[typing.Tuple[int, ...]] = None,
+    ) -> typing.Tuple[float, typing.Optional[typing.Tuple[int, ...]]]:
+        """
+        :param length: int, the size of the combinations
+        :param seed: Optional[tuple of int], an allowed combination of that size, whose score
+            is the pruning threshold until a better combination is found
+            Default: None
+        :return: Tuple[float, Optional[tuple]], the best score of the allowed combinations
+            of that size and the first combination in lexicographic order with that score, as from
+            the exhaustive enumeration (0.0 and None if no combination scores more than 0)
+        """
+        _units = self.space.units
+        _h = [self.entropy(1 << j) for j in range(self.n_layers)]
+        _mi = self._mi_bounds(_h)
+        # the consensus of a subset with a unit is at least as fine as the unit
+        _h_units = [max(_h[j] for j in _unit) for _unit in _units]
+        _longest = max([len(_unit) for _unit in _units], default=1)
+        _threshold = -inf if seed is None else self.gain(self.score(seed))
+        best_gain = self.gain(0.0 if self._sign > 0 else inf)
+        best_combination: typing.Optional[typing.Tuple[int, ...]] = None
+        # no consensus is finer than the partition of the individuals into singletons
+        _h_max = float(np.log(self.cache.codes.shape[0]))
+
+        def _added(
+            h_without: typing.Tuple[float, float],
+            h_added: float,
+            h_max: float = _h_max,
+        ) -> typing.Tuple[float, float]:
+            # bounds of the entropy of a consensus once layers of total entropy h_added are added
+            return h_without[0], min(h_without[1] + h_added, h_max)
+
+        def _beaten(bound: float) -> bool:
+            _best = max(_threshold, best_gain)
+            return bound < _best - _BOUND_TOLERANCE * max(1.0, abs(_best))
+
+        def _bound(
+            subset: typing.Tuple[int, ...],
+            mask: int,
+            i: int,
+            h_children: typing.List[float],
+            exact: bool,
+        ) -> float:
+            # h_children[k - i] is a lower bound of the entropy of the consensus
+            # of the subset with unit k
+            _missing = length - len(subset)
+            _h_subset = self.entropy(mask)
+            # any completion adds at least _n_units of the remaining units, and its consensus
+            # is at least as fine as the consensus of the subset with each of them
+            _n_units = ceil(_missing / _longest)
+            _smallest = heapq.nsmallest(_n_units, h_children)
+            if len(_smallest) < _n_units:
+                return -inf
+            _h_lo = max([_h_subset] + _smallest[-1:])
+            # without one of its layers, a completion still adds _n_units - 1 units
+            _h_others = max([_h_subset] + _smallest[-2:-1])
+            # and at most the entropy of each layer it adds: H(A and B) <= H(A) + H(B)
+            _h_added = heapq.nlargest(
+                _missing, [_h[j] for _unit in _units[i:] for j in _unit]
+            )
+            _bound_in = sum(
+                self._layer_bound(
+                    _h[j],
+                    _h_lo,
+                    _mi[j],
+                    _added(self._h_without(mask, j, _h[j], exact), sum(_h_added)),
+                )
+                for j in subset
+            )
+            _bound_out = [
+                self._layer_bound(
+                    _h[j],
+                    max(_h_lo, _h_child),
+                    _mi[j],
+                    _added((_h_others, _h_subset), sum(_h_added[:-1])),
+                )
+                for _h_child, _unit in zip(h_children, _units[i:])
+                for j in _unit
+            ]
+            return (_bound_in + sum(heapq.nlargest(_missing, _bound_out))) / length
+
+        def _leaf_bound(
+            subset: typing.Tuple[int, ...],
+            mask: int,
+            unit: typing.Tuple[int, ...],
+            h_combination: float,
+            exact: bool,
+        ) -> float:
+            # the bound of the combination of the subset with a unit, given a lower bound
+            # of the entropy of its consensus, which is exact if exact
+            _h_subset = self.entropy(mask)
+            _h_unit = sum(_h[j] for j in unit)
+            _h_hi = h_combination if exact else _h_max
+            return (
+                sum(
+                    self._layer_bound(
+                        _h[j],
+                        h_combination,
+                        _mi[j],
+                        _added(self._h_without(mask, j, _h[j], exact), _h_unit, _h_hi),
+                    )
+                    for j in subset
+                )
+                + sum(
+                    self._layer_bound(
+                        _h[j],
+                        h_combination,
+                        _mi[j],
+                        _added((_h_subset, _h_subset), _h_unit - _h[j], _h_hi),
+                    )
+                    for j in unit
+                )
+            ) / length
+
+        def _visit(
+            i: int,
+            subset: typing.Tuple[int, ...],
+            mask: int,
+            h_children: typing.Dict[int, float],
+        ):
+            nonlocal best_gain, best_combination
+            _missing = length - len(subset)
+            if _missing == 0:
+                _combination = tuple(sorted(subset))
+                _gain = self.gain(self.score(_combination))
+                # the first combination in lexicographic order wins a tie, whatever the visit order
+                if _gain > best_gain or (
+                    _gain == best_gain
+                    and best_combination is not None
+                    and _combination < best_combination
+                ):
+                    best_gain, best_combination = _gain, _combination
+                return
+            _h_subset = self.entropy(mask)
+            # first with the entropies inherited from the parent, then, if that does not
+            # prune the subset, with the entropies of the children that are not combinations
+            _h_lower = [
+                max(h_children.get(k, 0.0), _h_subset, _h_units[k])
+                for k in range(i, len(_units))
+            ]
+            if _beaten(_bound(subset, mask, i, _h_lower, exact=False)):
+                self.n_pruned += 1
+                return
+            _h_children = _h_lower
+            if any(len(_unit) < _missing for _unit in _units[i:]):
+                _h_children = [
+                    self.entropy(mask | _mask(_units[k])) for k in range(i, len(_units))
+                ]
+                if _beaten(_bound(subset, mask, i, _h_children, exact=True)):
+                    self.n_pruned += 1
+                    return
+            for k in range(i, len(_units)):
+                _unit = _units[k]
+                if self.space.completions(k + 1, _missing - len(_unit)) == 0:
+                    continue
+                if len(_unit) == _missing:
+                    # a combination: bounded with the inherited entropy of its consensus,
+                    # then with the entropy itself, before it is scored
+                    if _beaten(
+                        _leaf_bound(subset, mask, _unit, _h_children[k - i], False)
+                    ) or _beaten(
+                        _leaf_bound(
+                            subset,
+                            mask,
+                            _unit,
+                            self.entropy(mask | _mask(_unit)),
+                            True,
+                        )
+                    ):
+                        self.n_pruned += 1
+                        continue
+                    _visit(k + 1, subset + _unit, mask | _mask(_unit), dict())
+                    continue
+                # the consensus of the child with a later unit is at least as fine
+                # as the consensus of the subset with either unit
+                _visit(
+                    k + 1,
+                    subset + _unit,
+                    mask | _mask(_unit),
+                    {
+                        _k: max(_h_children[_k - i], _h_children[k - i])
+                        for _k in range(k + 1, len(_units))
+                    },
+                )
+
+        _visit(0, self.space.required, _mask(self.space.required), dict())
+        return self.gain(best_gain), best_combination
+
+    def branch_and_bound_curve(
+        self,
+    ) -> typing.Dict[int, typing.Tuple[float, typing.Optional[typing.Tuple[int, ...]]]]:
+        """
+        The sizes are searched in increasing order, the search of each size being seeded
+        with the best of the combinations of a smaller size extended with one free unit
+        (see greedy_step), e.g. all the pairs of layers then the best pair with one more layer
+        :return: dict[int, tuple], for each allowed size, the best score
+            and combination (see branch_and_bound)
+        """
+        curve: typing.Dict[int, typing.Tuple] = dict()
+        for length in self.space.sizes():
+            _seed = self.greedy_step(
+                {
+                    _length: [_combination]
+                    for _length, (_, _combination) in curve.items()
+                    if _combination is not None
+                },
+                length,
+            )
+            curve[length] = self.branch_and_bound(
+                length, seed=self.best(_seed)[1] if _seed else None
+            )
+        return curve
+
+    def greedy_step(
+        self,
+        beams: typing.Dict[int, typing.List[typing.Tuple[int, ...]]],
+        length: int,
+        forward: bool = True,
+    ) -> typing.Set[typing.Tuple[int, ...]]:
+        """
+        :param beams: dict[int, list of tuples of int], combinations of some sizes
+        :param length: int, the size of the new combinations
+        :param forward: bool, if True, add one free unit to the smaller combinations,
+            otherwise remove one free unit from the larger combinations
+            Default: True
+        :return: set of tuples of int, the allowed combinations of that size
+            one free unit away from the combinations of 'beams'
+        """
+        candidates = set()
+        for _unit in self.space.units:
+            _length = length - len(_unit) if forward else length + len(_unit)
+            for _combination in beams.get(_length, []):
+                if forward and not set(_unit).intersection(_combination):
+                    candidates.add(tuple(sorted(_combination + _unit)))
+                elif not forward and set(_unit).issubset(_combination):
+                    candidates.add(tuple(j for j in _combination if j not in _unit))
+        return candidates
+
+    def best(
+        self, candidates: typing.Iterable[typing.Tuple[int, ...]]
+    ) -> typing.Tuple[float, typing.Optional[typing.Tuple[int, ...]]]:
+        """
+        :param candidates: iterable of tuple of int, combinations of the same size
+        :return: Tuple[float, Optional[tuple]], the best score of the candidates and the first
+            candidate in lexicographic order with that score, as from the exhaustive enumeration
+            (0.0 and None if no candidate scores more than 0)
+        """
+        best_gain = self.gain(0.0 if self._sign > 0 else inf)
+        best_combination = None
+        for _combination in sorted(candidates):
+            _gain = self.gain(self.score(_combination))
+            if _gain > best_gain:
+                best_gain, best_combination = _gain, _combination
+        return self.gain(best_gain), best_combination
+
+    def beam_curve(
+        self, forward: bool = True, beam_width: int = 1
+    ) -> typing.Dict[int, typing.Tuple[float, typing.Optional[typing.Tuple[int, ...]]]]:
+        """
+        Approximate curve by beam search over the sizes, scoring O(beam_width * n_layers^2)
+        combinations per size: forward selection starts from all the pairs of layers
+        and extends each of the beam_width best combinations of a size with every other layer;
+        backward elimination starts from all the layers and removes each layer
+        of the beam_width best combinations of a size. With beam_width 1, the search is greedy.
+        With constraints, the combinations are extended (reduced) by one free unit,
+        from all the allowed combinations of the smallest (largest) size
+        :param forward: bool, if True, forward selection, otherwise backward elimination
+            Default: True
+        :param beam_width: int, the number of combinations of each size that are extended
+            Default: 1
+        :return: dict[int, tuple], for each allowed size, the best score and combination
+            among the scored combinations of that size (see best)
+        """
+        assert beam_width >= 1
+        _lengths = self.space.sizes(bounded=False)
+        if not forward:
+            _lengths = _lengths[::-1]
+        _sizes = set(self.space.sizes())
+        curve: typing.Dict[int, typing.Tuple] = dict()
+        beams: typing.Dict[int, typing.List[typing.Tuple[int, ...]]] = dict()
+        for length in _lengths:
+            if length == _lengths[0]:
+                _candidates = set(self.space.combinations(length))
+            else:
+                _candidates = self.greedy_step(beams, length, forward=forward)
+            if length in _sizes:
+                curve[length] = self.best(_candidates)
+            elif (length > self.space.max_size) == forward:
+                # past the allowed sizes
+                break
+            beams[length] = sorted(
+                _candidates,
+                key=lambda _combination: (
+                    -self.gain(self.score(_combination)),
+                    _combination,
+                ),
+            )[:beam_width]
+        return dict(sorted(curve.items()))
+
+    def sample_curve(
+        self,
+        n_samples: int = 1000,
+        max_seconds: typing.Optional[float] = None,
+        stratified: bool = False,
+        seed: int = 42,
+    ) -> typing.Tuple[
+        typing.Dict[int, typing.Tuple[float, typing.Optional[typing.Tuple[int, ...]]]],
+        typing.Dict[int, typing.Dict[str, typing.Any]],
+    ]:
+        """
+        Approximate curve from random combinations of each size, drawn uniformly with replacement.
+        If stratified, the i-th draw of a size includes free unit i mod n_units (a layer
+        without constraints) and is drawn uniformly among the combinations including it:
+        without constraints each draw is still a uniform combination, and every layer
+        is in the same share of the draws
+        :param n_samples: int, the number of draws of each size;
+            the sizes with at most n_samples combinations are enumerated
+            Default: 1000
+        :param max_seconds: Optional[float], the time budget of the draws of each size
+            Default: None (no time budget)
+        :param stratified: bool, if True, stratify the draws by layer
+            Default: False
+        :param seed: int, the seed of the draws
+            Default: 42
+        :return: Tuple[dict, dict], for each allowed size, the best score and combination among
+            the drawn combinations (see best), and the summary of the scores of the draws:
+            number of draws ("n_draws"), of distinct combinations ("n_scored")
+            and of combinations ("n_combinations"), an upper bound of the probability that
+            the best combination of the size was not drawn ("p_missed"), "mean", "std",
+            and "quantiles" (dict, quantile -> score)
+        """
+        assert n_samples >= 1
+        _rng = np.random.default_rng(seed)
+        curve: typing.Dict[int, typing.Tuple] = dict()
+        report: typing.Dict[int, typing.Dict[str, typing.Any]] = dict()
+        for length in self.space.sizes():
+            _n_combinations = self.space.count(length)
+            _units = [
+                k
+                for k in range(len(self.space.units))
+                if self.space.count(length, k) > 0
+            ]
+            _draws: typing.List[typing.Tuple[int, ...]] = []
+            if _n_combinations <= n_samples:
+                _draws = self.space.combinations(length)
+            else:
+                _start = time.perf_counter()
+                while len(_draws) < n_samples and (
+                    max_seconds is None
+                    or not _draws
+                    or time.perf_counter() - _start < max_seconds
+                ):
+                    _draws.append(
+                        self.space.sample(
+                            length,
+                            _rng,
+                            unit=_units[len(_draws) % len(_units)]
+                            if stratified
+                            else None,
+                        )
+                    )
+            _scores = np.array([self.score(_draw) for _draw in _draws])
+            curve[length] = self.best(set(_draws))
+            report[length] = dict(
+                n_draws=len(_draws),
+                n_scored=len(set(_draws)),
+                n_combinations=_n_combinations,
+                p_missed=_p_missed(
+                    self.space,
+                    length,
+                    _units,
+                    len(_draws),
+                    len(set(_draws)),
+                    stratified,
+                ),
+                mean=float(_scores.mean()),
+                std=float(_scores.std()),
+                quantiles=dict(
+                    zip(_QUANTILES, np.quantile(_scores, _QUANTILES).tolist())
+                ),
+            )
+        return curve, report
+
+
+def prunes(which_score: str, fullpartition: bool) -> bool:
+    """
+    :param which_score: str, the name of a registered score with a bound
+    :param fullpartition: bool, see score.maximal_alignment_curves
+    :return: bool, True if the branch and bound search is used by score.maximal_alignment_curves:
+        with fullpartition, where the mutual information of a layer with its consensus is known,
+        or for the variation of information, which grows with the size of the consensus.
+        Otherwise the bound of the leave-one-out scores depends on the entropies of
+        k - 1 layer consensuses that the subsets bound loosely, and on homogeneous layers
+        the search scores nearly every combination, more slowly than the enumeration
+    """
+    return fullpartition or which_score == "vi"
+
+
+def _check_bounds(which_scores: typing.Sequence[str], adjusted: bool):
+    """
+    :param which_scores: list of str, the names of registered scores
+    :param adjusted: bool, see score.maximal_alignment_curves
+    :raise ValueError: if the branch and bound search cannot bound a score (see metrics.has_bound)
+    """
+    for _which in which_scores:
+        if not has_bound(_which) or (adjusted and not greater_is_better(_which)):
+            raise ValueError(f"The branch and bound search cannot bound {_which}")
+
+
+def _mask(layer_ids: typing.Iterable[int]) -> int:
+    """
+    :param layer_ids: iterable of int, the positions of layers
+    :return: int, the bitmask of the layers (see cache.PartitionCache)
+    """
+    return sum(1 << j for j in layer_ids)
+
+
+def _p_missed(
+    space: LayerConstraints,
+    length: int,
+    units: typing.Sequence[int],
+    n_draws: int,
+    n_scored: int,
+    stratified: bool,
+) -> float:
+    """
+    :param space: LayerConstraints, the allowed combinations
+    :param length: int, the size of the combinations
+    :param units: list of int, the indices of the free units in some combination of that size
+    :param n_draws: int, the number of draws (see CurveSearch.sample_curve)
+    :param n_scored: int, the number of distinct combinations drawn
+    :param stratified: bool, whether the draws were stratified by free unit
+    :return: float, an upper bound of the probability that a given combination was not drawn,
+        0 if every combination was drawn
+    """
+    if n_scored == space.count(length):
+        return 0.0
+    if stratified:
+        # each free unit of a combination starts at least n_draws // len(units) draws,
+        # which draw the combination with probability 1 / (combinations with the unit)
+        _n_units = ceil(
+            (length - len(space.required)) / max(len(space.units[k]) for k in units)
+        )
+        return (1.0 - 1.0 / max(space.count(length, k) for k in units)) ** (
+            _n_units * (n_draws // len(units))
+        )
+    return (1.0 - 1.0 / space.count(length)) ** n_draws
+
+
+def search_curves(
+    codes: np.ndarray,
+    layers: typing.Sequence[typing.Any],
+    which_scores: typing.Sequence[str],
+    search: str = "branch_and_bound",
+    beam_width: int = 1,
+    n_samples: int = 1000,
+    max_seconds: typing.Optional[float] = None,
+    stratified: bool = False,
+    seed: int = 42,
+    fullpartition: bool = False,
+    adjusted: bool = False,
+    analytic: bool = False,
+    cache_max_bytes: int = 2**28,
+    spill_to: typing.Optional[str] = None,
+    space: typing.Optional[LayerConstraints] = None,
+) -> typing.Dict[str, AlignmentCurve]:
+    """
+    Maximal alignment curves without scoring every combination (see CurveSearch),
+    each score searched separately
+    :param codes: (n_individuals x n_layers) int64 matrix of layer codes, -1 for missing values
+    :param layers: list, the layer names
+    :param which_scores: list of str, the names of registered scores
+    :param search: str, one of "branch_and_bound" (exact, see CurveSearch.branch_and_bound_curve),
+        "forward" or "backward" (approximate, see CurveSearch.beam_curve)
+        or "sampled" (approximate, see CurveSearch.sample_curve)
+        Default: "branch_and_bound"
+    :param beam_width: int, see CurveSearch.beam_curve
+        Default: 1
+    :param n_samples: int, see CurveSearch.sample_curve
+        Default: 1000
+    :param max_seconds: Optional[float], see CurveSearch.sample_curve
+        Default: None
+    :param stratified: bool, see CurveSearch.sample_curve
+        Default: False
+    :param seed: int, see CurveSearch.sample_curve
+        Default: 42
+    :param fullpartition: bool, see score.maximal_alignment_curves
+    :param adjusted: bool, see score.maximal_alignment_curves. The bounds of the scores
+        hold for the adjusted scores if greater is better, since the expected scores are not negative
+    :param analytic: bool, see score.maximal_alignment_curves
+    :param cache_max_bytes: int, memory budget of the cache of consensus partitions
+    :param spill_to: Optional[str], see score.maximal_alignment_curves
+    :param space: Optional[LayerConstraints], the allowed combinations
+        Default: None (all the combinations of 2 or more layers)
+    :return: dict[str, AlignmentCurve], for each score, the scored combinations of the allowed
+        sizes and the maximal alignment curve, with the sizes whose combinations were not all
+        scored and, if "sampled", the report of the sampled scores (see CurveSearch.sample_curve)
+    :raise ValueError: if the branch and bound search cannot bound a score (see metrics.has_bound),
+        or the layers have missing values
+    """
+    assert search in ("branch_and_bound", "forward", "backward", "sampled")
+    if search == "branch_and_bound":
+        _check_bounds(which_scores, adjusted)
+        if (codes < 0).any():
+            raise ValueError(
+                "The branch and bound search needs layers without missing values"
+            )
+
+    cache = PartitionCache(codes, max_bytes=cache_max_bytes, spill_to=spill_to)
+    if space is None:
+        space = LayerConstraints(range(codes.shape[1]))
+    _sizes = set(space.sizes())
+    curves: typing.Dict[str, AlignmentCurve] = dict()
+    for _which in which_scores:
+        curve_search = CurveSearch(
+            cache,
+            _which,
+            fullpartition=fullpartition,
+            adjusted=adjusted,
+            analytic=analytic,
+            space=space,
+        )
+        if search == "branch_and_bound":
+            _curve = curve_search.branch_and_bound_curve()
+        elif search == "sampled":
+            _curve, _report = curve_search.sample_curve(
+                n_samples=n_samples,
+                max_seconds=max_seconds,
+                stratified=stratified,
+                seed=seed,
+            )
+        else:
+            _curve = curve_search.beam_curve(
+                forward=search == "forward", beam_width=beam_width
+            )
+        _scored = Counter(len(_combination) for _combination in curve_search.scores)
+
+        best_by_combination_size: typing.Dict[int, typing.Tuple] = dict()
+        for length, (_best_score, _best_combination) in _curve.items():
+            best_by_combination_size[length] = (
+                _best_score,
+                None
+                if _best_combination is None
+                else [layers[j] for j in _best_combination],
+            )
+            logger.info(
+                f"{length}-combination with best {_which} {_best_score}: "
+                f"{best_by_combination_size[length][1]} "
+                f"({_scored[length]} of {space.count(length)} combinations scored)"
+            )
+        all_scores_by_combination_size = {
+            f"{len(_combination)}+"
+            + "+".join(sorted(layers[j] for j in _combination)): _score
+            for _combination, _score in sorted(
+                curve_search.scores.items(), key=lambda item: (len(item[0]), item[0])
+            )
+            if len(_combination) in _sizes
+        }
+        _approximated: typing.List[int] = []
+        if search != "branch_and_bound":
+            _approximated = [
+                length for length in _curve if _scored[length] < space.count(length)
+            ]
+            logger.info(f"sizes with an approximate best {_which}: {_approximated}")
+        if search == "sampled":
+            for length in _approximated:
+                logger.info(
+                    f"{length}-combinations: probability that the best {_which} "
+                    f"was not drawn <= {_report[length]['p_missed']:.3g}"
+                )
+        curves[_which] = AlignmentCurve(
+            all_scores_by_combination_size,
+            best_by_combination_size,
+            approximated=_approximated,
+            report=_report if search == "sampled" else None,
+        )
+    cache.close()
+    return curves
@@ -0,0 +1,501 @@
+import os
+import typing
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from multiway_alignment.consensus import _encode_opinions
+from multiway_alignment.metrics import available_scores, score_from_contingency
+from multiway_alignment.parallel import Executor, executor_scope
+from multiway_alignment.utils.logging import logger
+
+# quantiles of the scores summarized by default, see ScoreSummary
+_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+class _StreamingEncoder:
+    """
+    Encodes the opinions of successive chunks with codes that are consistent across chunks
+    """
+
+    def __init__(self, topics: typing.Sequence[typing.Any]):
+        """
+        :param topics: list, the topic names
+        """
+        self.topics = list(topics)
+        self._codes: typing.List[typing.Dict[typing.Any, int]] = [
+            dict() for _ in self.topics
+        ]
+
+    def encode(self, chunk: pd.DataFrame) -> np.ndarray:
+        """
+        :param chunk: pd.DataFrame with (at least) one column per topic
+        :return: (n_rows x n_topics) int64 matrix of codes, -1 for missing values
+        """
+        codes = np.empty((len(chunk), len(self.topics)), dtype=np.int64)
+        for j, topic in enumerate(self.topics):
+            _local, _uniques = pd.factorize(chunk[topic].values)
+            _mapping = self._codes[j]
+            _to_global = np.array(
+                [_mapping.setdefault(u, len(_mapping)) for u in _uniques] + [-1],
+                dtype=np.int64,
+            )
+            # local code -1 (missing) maps to the last element, i.e. -1
+            codes[:, j] = _to_global[_local]
+        return codes
+
+
+def _merge_tables(
+    keys: typing.Sequence[np.ndarray], counts: typing.Sequence[np.ndarray]
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Merges sparse count tables, summing the counts of equal keys
+    :param keys: list of (n_cells x n_layers) int64 matrices, the codes of each cell
+    :param counts: list of 1d np.array, the count of each cell
+    :return: Tuple[np.ndarray, np.ndarray], the distinct keys and their total counts
+    """
+    _keys = np.concatenate(keys)
+    _unique, _inverse = np.unique(_keys, axis=0, return_inverse=True)
+    _counts = np.bincount(
+        _inverse.ravel(), weights=np.concatenate(counts), minlength=len(_unique)
+    )
+    return _unique, _counts.astype(np.int64)
+
+
+class JointCounts:
+    """
+    Sparse table of the counts of each joint combination of codes over a set of layers.
+    Individuals with a missing opinion on any of the layers are not counted.
+    The table grows with the number of distinct joint codes, not with the number of individuals
+    """
+
+    def __init__(self, n_layers: int):
+        """
+        :param n_layers: int, the number of layers
+        """
+        self.keys = np.empty((0, n_layers), dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    @property
+    def n_individuals(self) -> int:
+        """
+        :return: int, the number of individuals counted so far
+        """
+        return int(self.counts.sum())
+
+    @property
+    def nbytes(self) -> int:
+        """
+        :return: int, the memory used by the table
+        """
+        return self.keys.nbytes + self.counts.nbytes
+
+    def update(self, codes: np.ndarray) -> "JointCounts":
+        """
+        :param codes: (n_rows x n_layers) int64 matrix of codes, -1 for missing values
+        :return: JointCounts, self, with the rows counted
+        """
+        codes = codes[(codes >= 0).all(axis=1)]
+        if len(codes) == 0:
+            return self
+        _keys, _counts = np.unique(codes, axis=0, return_counts=True)
+        self.keys, self.counts = _merge_tables(
+            [self.keys, _keys], [self.counts, _counts]
+        )
+        return self
+
+    def merge(self, other: "JointCounts") -> "JointCounts":
+        """
+        :param other: JointCounts over the same layers and codes
+        :return: JointCounts, self, with the counts of 'other' added
+        """
+        self.keys, self.counts = _merge_tables(
+            [self.keys, other.keys], [self.counts, other.counts]
+        )
+        return self
+
+    def score(self, which_score: str = "nmi", fullpartition: bool = False) -> float:
+        """
+        :param which_score: str, the name of a registered score (see metrics.available_scores())
+        :param fullpartition: bool, if True, compare each layer with the consensus of all
+            the layers, instead of the consensus of the other layers
+            Default: False
+        :return: float, the multiway alignment score of the layers
+        """
+        if self.n_individuals == 0:
+            raise ZeroDivisionError("The dataframe is empty")
+        _n_layers = self.keys.shape[1]
+        if _n_layers < 2 and not fullpartition:
+            raise ValueError("At least two layers are needed to compute the score")
+        avg_nmi = 0.0
+        for j in range(_n_layers):
+            _rows = np.unique(self.keys[:, j], return_inverse=True)[1].ravel()
+            if fullpartition:
+                # every cell of the joint table is a consensus group
+                _cols = np.arange(len(self.keys))
+            else:
+                _others = np.delete(self.keys, j, axis=1)
+                _cols = np.unique(_others, axis=0, return_inverse=True)[1].ravel()
+            avg_nmi += score_from_contingency(
+                _rows, _cols, self.counts, which_score=which_score
+            )
+        return avg_nmi / _n_layers
+
+
+class QuantileSketch:
+    """
+    Mergeable sketch of the quantiles of a stream of values, in memory logarithmic
+    in their number. The values are kept in levels, a value of level h standing for 2^h values:
+    when a level has more than 'size' values, they are sorted and every other one
+    (alternately the even and odd ones) moves to the next level. The rank of a value
+    is then off by at most about n_levels / size of the number of values.
+    While there are at most 'size' values, the quantiles are exact
+    """
+
+    def __init__(self, size: int = 256):
+        """
+        :param size: int, the number of values of each level
+            Default: 256
+        """
+        assert size >= 2
+        self.size = size
+        self.levels: typing.List[np.ndarray] = []
+        self._odd = False
+
+    @property
+    def count(self) -> int:
+        """
+        :return: int, the number of values summarized
+        """
+        return sum(len(_level) << h for h, _level in enumerate(self.levels))
+
+    def update(self, values: np.ndarray) -> "QuantileSketch":
+        """
+        :param values: 1d np.array of float
+        :return: QuantileSketch, self, with the values added
+        """
+        return self._add([np.asarray(values, dtype=np.float64)])
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """
+        :param other: QuantileSketch
+        :return: QuantileSketch, self, with the values of 'other' added
+        """
+        return self._add(other.levels)
+
+    def _add(self, levels: typing.Sequence[np.ndarray]) -> "QuantileSketch":
+        """
+        :param levels: list of 1d np.array, the values of each level to add
+        :return: QuantileSketch, self, with the levels added and compacted
+        """
+        h = 0
+        _carry = np.empty(0, dtype=np.float64)
+        while h < max(len(self.levels), len(levels)) or len(_carry):
+            if h == len(self.levels):
+                self.levels.append(np.empty(0, dtype=np.float64))
+            _level = np.concatenate(
+                [self.levels[h], levels[h] if h < len(levels) else _carry[:0], _carry]
+            )
+            _carry = np.empty(0, dtype=np.float64)
+            if len(_level) > self.size:
+                _level = np.sort(_level)
+                # an odd value out stays at this level, so that the count is exact
+                _kept, _level = (
+                    _level[len(_level) // 2 * 2 :],
+                    _level[: len(_level) // 2 * 2],
+                )
+                _carry = _level[int(self._odd) :: 2]
+                self._odd = not self._odd
+                _level = _kept
+            self.levels[h] = _level
+            h += 1
+        return self
+
+    def quantiles(
+        self, q: typing.Sequence[float] = _QUANTILES
+    ) -> typing.Dict[float, float]:
+        """
+        :param q: list of float in [0, 1], the quantiles
+            Default: (0.05, 0.25, 0.5, 0.75, 0.95)
+        :return: dict[float, float], for each quantile, the smallest value whose share
+            of values less than or equal to it is at least the quantile (NaN without values)
+        """
+        if self.count == 0:
+            return dict.fromkeys(q, np.nan)
+        _values = np.concatenate(self.levels)
+        _weights = np.concatenate(
+            [np.full(len(_level), 1 << h) for h, _level in enumerate(self.levels)]
+        )
+        _order = np.argsort(_values, kind="stable")
+        _cumulative = np.cumsum(_weights[_order])
+        _positions = np.searchsorted(
+            _cumulative, np.asarray(q, dtype=np.float64) * _cumulative[-1]
+        )
+        return dict(
+            zip(
+                q,
+                _values[_order][np.minimum(_positions, len(_values) - 1)].tolist(),
+            )
+        )
+
+
+class ScoreSummary:
+    """
+    Streaming summary of the scores of combinations: count, mean and variance
+    (merged as in Chan et al.), a quantile sketch, and the top_k best combinations,
+    in memory that does not depend on the number of combinations.
+    The best combinations are ranked by score, then by rank, so that a tie goes
+    to the first combination whatever the order of the updates. NaN scores are not summarized
+    ------------
+    Example
+    ------------
+    >>> summary = ScoreSummary(top_k=3).update(np.arange(5), np.array([0.1, 0.5, 0.2, 0.5, 0.3]))
+    >>> summary.top()
+    [(1, 0.5), (3, 0.5), (4, 0.3)]
+    """
+
+    def __init__(
+        self, top_k: int = 10, greater_is_better: bool = True, sketch_size: int = 256
+    ):
+        """
+        :param top_k: int, the number of best combinations kept
+            Default: 10
+        :param greater_is_better: bool, if False, the best combinations have the lowest scores
+            Default: True
+        :param sketch_size: int, see QuantileSketch
+            Default: 256
+        """
+        assert top_k >= 1
+        self.top_k = top_k
+        self._sign = 1.0 if greater_is_better else -1.0
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.sketch = QuantileSketch(sketch_size)
+        self._ranks = np.empty(0, dtype=np.int64)
+        self._scores = np.empty(0, dtype=np.float64)
+
+    @property
+    def variance(self) -> float:
+        """
+        :return: float, the (population) variance of the scores, NaN without scores
+        """
+        return self._m2 / self.count if self.count else np.nan
+
+    def update(self, ranks: np.ndarray, scores: np.ndarray) -> "ScoreSummary":
+        """
+        :param ranks: 1d int64 np.array, the ranks of the combinations
+        :param scores: 1d float64 np.array, their scores
+        :return: ScoreSummary, self, with the scores added
+        """
+        _valid = ~np.isnan(scores)
+        ranks, scores = ranks[_valid], scores[_valid]
+        if len(scores) == 0:
+            return self
+        _mean = float(scores.mean())
+        self._add_moments(len(scores), _mean, float(((scores - _mean) ** 2).sum()))
+        self.sketch.update(scores)
+        self._keep_top(ranks, scores)
+        return self
+
+    def merge(self, other: "ScoreSummary") -> "ScoreSummary":
+        """
+        :param other: ScoreSummary of other combinations, with the same direction
+        :return: ScoreSummary, self, with the scores of 'other' added
+        """
+        if other.count:
+            self._add_moments(other.count, other.mean, other._m2)
+            self.sketch.merge(other.sketch)
+            self._keep_top(other._ranks, other._scores)
+        return self
+
+    def _add_moments(self, count: int, mean: float, m2: float):
+        """
+        :param count: int, the number of scores added
+        :param mean: float, their mean
+        :param m2: float, the sum of their squared deviations from their mean
+        """
+        _total = self.count + count
+        _delta = mean - self.mean
+        self.mean += _delta * count / _total
+        self._m2 += m2 + _delta**2 * self.count * count / _total
+        self.count = _total
+
+    def _keep_top(self, ranks: np.ndarray, scores: np.ndarray):
+        """
+        :param ranks: 1d int64 np.array, the ranks of other combinations
+        :param scores: 1d float64 np.array, their scores
+        """
+        _ranks = np.concatenate([self._ranks, ranks])
+        _scores = np.concatenate([self._scores, scores])
+        _order = np.lexsort((_ranks, -self._sign * _scores))[: self.top_k]
+        self._ranks, self._scores = _ranks[_order], _scores[_order]
+
+    def top(self) -> typing.List[typing.Tuple[int, float]]:
+        """
+        :return: list of (int, float), the rank and score of the best combinations, best first
+        """
+        return list(zip(self._ranks.tolist(), self._scores.tolist()))
+
+    def quantiles(
+        self, q: typing.Sequence[float] = _QUANTILES
+    ) -> typing.Dict[float, float]:
+        """
+        :param q: list of float in [0, 1], the quantiles
+            Default: (0.05, 0.25, 0.5, 0.75, 0.95)
+        :return: dict[float, float], the approximate quantiles of the scores (see QuantileSketch)
+        """
+        return self.sketch.quantiles(q)
+
+
+def iter_chunks(
+    path: str,
+    columns: typing.Optional[typing.List[str]] = None,
+    chunksize: int = 100_000,
+) -> typing.Iterator[pd.DataFrame]:
+    """
+    Reads a CSV or Parquet file in chunks of rows
+    :param path: str, path to a .csv or .parquet file
+    :param columns: Optional[list], the columns to read
+        Default: None (all columns)
+    :param chunksize: int, the number of rows per chunk
+        Default: 100000
+    :return: Iterator[pd.DataFrame]
+    """
+    if os.path.splitext(path)[1] in (".parquet", ".pq"):
+        try:
+            import pyarrow.parquet as pq  # type: ignore
+        except ImportError as e:
+            raise ImportError("Reading Parquet files in chunks requires pyarrow") from e
+        _file = pq.ParquetFile(path)
+        for batch in _file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(
+            path, usecols=columns, chunksize=chunksize, low_memory=False
+        )
+
+
+def streaming_alignment_scores(
+    chunks: typing.Iterable[pd.DataFrame],
+    layers_combinations: typing.Optional[typing.Sequence[typing.Sequence]] = None,
+    which_score: str = "nmi",
+    fullpartition: bool = False,
+) -> typing.Dict[str, float]:
+    """
+    Computes multiway alignment scores from a stream of row chunks, without holding the data
+    in memory: only the joint code counts of each combination of layers are accumulated,
+    and the scores are computed from them at the end
+    :param chunks: Iterable[pd.DataFrame], chunks of rows having one column per layer,
+        e.g. iter_chunks("data.csv")
+    :param layers_combinations: Optional[list of lists], the combinations of layers to score
+        Default: None (a single combination with all the columns of the first chunk)
+    :param which_score: str, the name of a registered score (see metrics.available_scores())
+    :param fullpartition: bool, if True, compare each layer with the consensus of all
+        the layers in the combination, as in multiway_alignment_score_fullpartition
+        Default: False
+    :return: dict[str, float], the multiway alignment score of each combination,
+        with the same keys as maximal_alignment_curve (size and sorted layers joined by '+')
+    """
+    assert which_score in available_scores(), f"Unknown score {which_score}"
+
+    encoder = None
+    tables: typing.List[JointCounts] = []
+    _positions: typing.List[typing.List[int]] = []
+    _n_rows = 0
+    for chunk in chunks:
+        if encoder is None:
+            if layers_combinations is None:
+                layers_combinations = [list(chunk.columns)]
+            _topics = sorted({t for comb in layers_combinations for t in comb}, key=str)
+            encoder = _StreamingEncoder(_topics)
+            _positions = [
+                [_topics.index(t) for t in comb] for comb in layers_combinations
+            ]
+            tables = [JointCounts(len(comb)) for comb in layers_combinations]
+        codes = encoder.encode(chunk)
+        for table, positions in zip(tables, _positions):
+            table.update(codes[:, positions])
+        _n_rows += len(chunk)
+
+    if encoder is None or layers_combinations is None:
+        raise ZeroDivisionError("The dataframe is empty")
+    logger.info(
+        f"{_n_rows} rows streamed, "
+        f"{sum(t.nbytes for t in tables)} bytes of joint counts accumulated"
+    )
+    return {
+        f"{len(comb)}+"
+        + "+".join(sorted(comb)): table.score(which_score, fullpartition=fullpartition)
+        for comb, table in zip(layers_combinations, tables)
+    }
+
+
+def _count_rows(
+    codes: np.ndarray, positions: typing.Sequence[typing.Sequence[int]]
+) -> typing.List[JointCounts]:
+    """
+    Map step: counts the joint codes of a slice of rows for every combination
+    :param codes: (n_rows x n_layers) int matrix of codes, -1 for missing values
+    :param positions: list of lists, the positions of the layers of each combination
+    :return: list of JointCounts, one per combination
+    """
+    return [JointCounts(len(p)).update(codes[:, p].astype(np.int64)) for p in positions]
+
+
+def parallel_alignment_scores(
+    opinions: pd.DataFrame,
+    layers_combinations: typing.Optional[typing.Sequence[typing.Sequence]] = None,
+    which_score: str = "nmi",
+    fullpartition: bool = False,
+    n_jobs: typing.Optional[int] = None,
+    executor: typing.Optional[Executor] = None,
+) -> typing.Dict[str, float]:
+    """
+    Computes multiway alignment scores of a large dataset with a map-reduce over rows:
+    the rows are split across worker processes, each worker counts the joint codes
+    of its rows, and the sparse count tables are merged before scoring
+    :param opinions: pd.DataFrame having one column per layer and one row per node,
+        where each element a_ij is an integer representing the cluster labels for node i at layer j
+    :param layers_combinations: Optional[list of lists], the combinations of layers to score
+        Default: None (a single combination with all the columns)
+    :param which_score: str, the name of a registered score (see metrics.available_scores())
+    :param fullpartition: bool, if True, compare each layer with the consensus of all
+        the layers in the combination, as in multiway_alignment_score_fullpartition
+        Default: False
+    :param n_jobs: Optional[int], the number of worker processes
+        Default: None (see parallel.default_n_jobs)
+    :param executor: Optional[Executor], the worker processes, shared across calls;
+        if given, 'n_jobs' is ignored
+        Default: None (a new pool of n_jobs processes for this call)
+    :return: dict[str, float], the multiway alignment score of each combination,
+        with the same keys as maximal_alignment_curve (size and sorted layers joined by '+')
+    """
+    assert which_score in available_scores(), f"Unknown score {which_score}"
+    if opinions.empty:
+        raise ZeroDivisionError("The dataframe is empty")
+    if layers_combinations is None:
+        layers_combinations = [list(opinions.columns)]
+    _topics = list(opinions.columns)
+    _positions = [[_topics.index(t) for t in comb] for comb in layers_combinations]
+    codes, _ = _encode_opinions(opinions)
+    # smallest signed dtype that holds the codes, to ship less data to the workers
+    codes = codes.astype(np.min_scalar_type(-max(int(codes.max(initial=0)), 1)))
+    tables = [JointCounts(len(p)) for p in _positions]
+    with executor_scope(executor, n_jobs) as _executor:
+        _slices = np.array_split(codes, _executor.n_jobs)
+        # reduce step: merge the partial tables of each combination
+        for partial_tables in _executor.map(
+            partial(_count_rows, positions=_positions), _slices, key="count_rows"
+        ):
+            for table, partial_table in zip(tables, partial_tables):
+                table.merge(partial_table)
+    return {
+        f"{len(comb)}+"
+        + "+".join(sorted(comb)): table.score(which_score, fullpartition=fullpartition)
+        for comb, table in zip(layers_combinations, tables)
+    }
@@ -1,6 +1,5 @@
 import pandas as pd
 import numpy as np
-from joblib import load  # type: ignore
 import matplotlib.pyplot as plt  # type: ignore
 import matplotlib.markers as markers  # type: ignore
 from mpl_toolkits.axes_grid1.inset_locator import inset_axes  # type: ignore
@@ -8,8 +7,10 @@ import random
 import seaborn as sns  # type: ignore
 import typing
 
+from multiway_alignment.consensus import get_consensus_partition
 from multiway_alignment.score import maximal_alignment_curve  # type: ignore
-from multiway_alignment.null_models import expected_curve_equal_sized_clusters  # type: ignore
+from multiway_alignment.null_models import expected_curve_fullpartition_equal_sized_clusters  # type: ignore
+from multiway_alignment.results import load_scores
 from multiway_alignment.utils.logging import logger
 
 
@@ -22,7 +23,7 @@ def plot_maximal_alignment_curve(
     :param opinions: pd.DataFrame having one column per layer and one row per node,
         where each element a_ij is an integer representing the cluster labels for node i at layer j
         and column names are layers names
-    :param which_score: str, one of "nmi" or "ami"
+    :param which_score: str, the name of a registered score (see metrics.available_scores())
     :param adjusted: bool, default: False
     :return: plt.Figure with 2 subplots (1 row x 2 columns)
     """
@@ -35,11 +36,14 @@ def plot_maximal_alignment_curve(
     communities_size = []
     for key, value in res.items():
         _anmi = value[0]
-        _mc = value[2]
         combination_sizes.append(key)
         anmi_scores.append(_anmi)
+        if value[1] is None:
+            continue
+        # mutual communities of the best combination (only their sizes are needed)
+        _mc = get_consensus_partition(opinions[value[1]].dropna(), compact=True)
         communities_idx += [key] * len(_mc)
-        communities_size += [len(v) for v in _mc.values()]
+        communities_size += _mc.sizes.tolist()  # type: ignore
 
     fig, (ax0, ax1) = plt.subplots(1, 2, figsize=(21, 10))
     ax0.plot(combination_sizes, anmi_scores, "ro--")
@@ -71,11 +75,12 @@ def plot_full_alignment_curve(
         and column names are layers names
     :param which_score: str, one of "nmi" or "ami" or None
     :param adjusted: bool
-    :param full_dump_path: str
+    :param full_dump_path: str, the scores of all the combinations, saved as a results.CurveStore
+        or as a dictionary with joblib (see results.load_scores)
     :return: plt.Figure
     """
     if full_dump_path is not None:
-        all_results = load(full_dump_path)
+        all_results = load_scores(full_dump_path)
     else:
         assert (
             opinions is not None and which_score is not None and adjusted is not None
@@ -84,21 +89,21 @@ def plot_full_alignment_curve(
             opinions=opinions,
             which_score=which_score,
             adjusted=adjusted,
+            compact=True,
         )
 
-    _points = [
-        (k.split("+")[0], v[0], k.split("+")[1:]) for k, v in all_results.items()
-    ]
-    points = pd.DataFrame(_points)
-    top = points.sort_values(by=[1, 0], ascending=False).groupby(0).head(1)  # type: ignore
+    points = all_results.to_frame()
+    top = points.sort_values(by=["score", "order"], ascending=False).groupby("order").head(1)  # type: ignore
 
-    logger.info(f"Area under the curve: {np.trapezoid(top[1], dx=1 / (len(top) - 1))}")
+    logger.info(
+        f"Area under the curve: {np.trapezoid(top['score'], dx=1 / (len(top) - 1))}"
+    )
 
-    x = points[~points.index.isin(top.index)][0]
-    y = points[~points.index.isin(top.index)][1]
+    x = points[~points.index.isin(top.index)]["order"]
+    y = points[~points.index.isin(top.index)]["score"]
 
-    x_top = top[0]
-    y_top = top[1]
+    x_top = top["order"]
+    y_top = top["score"]
 
     fig = plt.figure(figsize=(20, 10))
     marker = markers.MarkerStyle(marker="s", fillstyle="none")
@@ -111,8 +116,9 @@ def plot_full_alignment_curve(
         alpha=0.7,
     )
     # Annotate each point with its label
-    for i, label in top[[2]].iterrows():
-        label = label[2]
+    for i, (order, rank) in top[["order", "rank"]].iterrows():
+        # only the layers of the best combinations are named
+        label = all_results.combination(order, rank)
         _text = [lab.replace("_", " ") for lab in label]
         text = "\n".join(_text)
         plt.annotate(
@@ -146,38 +152,40 @@ def plot_full_alignment_curve(
 def plot_full_alignment_with_null_models(
     full_result: str, full_null_path: str
 ) -> plt.Figure:
-    r = load(full_result)
-    _points = [(k.split("+")[0], v[0], k.split("+")[1:]) for k, v in r.items()]
-    points = pd.DataFrame(_points)
-
-    _dfs = []
-    for i in range(10):
-        r = load(f"{full_null_path}/null_{i}")
-        _points = [(k.split("+")[0], v[0], k.split("+")[1:]) for k, v in r.items()]
-        _dfs.append(pd.DataFrame(_points))
+    """
+    :param full_result: str, the scores of all the combinations (see results.load_scores)
+    :param full_null_path: str, the folder of the scores of the null models
+        (see null_models.random_full_alignment_curves)
+    :return: plt.Figure
+    """
+    store = load_scores(full_result)
+    points = store.to_frame()
 
-    points_df = pd.concat(_dfs, ignore_index=True)
+    points_df = pd.concat(
+        [load_scores(f"{full_null_path}/null_{i}").to_frame() for i in range(10)],
+        ignore_index=True,
+    )
 
-    top = points.sort_values(by=[1, 0], ascending=False).groupby(0).head(1)  # type: ignore
-    x_top = top[0]
+    top = points.sort_values(by=["score", "order"], ascending=False).groupby("order").head(1)  # type: ignore
+    x_top = top["order"]
     x_top = [int(v) for v in x_top]  # type: ignore
-    y_top = top[1]
+    y_top = top["score"]
 
     _strip = points[~points.index.isin(top.index)]  # type: ignore
 
-    null_avg = points_df.groupby(0)[1].mean().to_dict()
+    null_avg = points_df.groupby("order")["score"].mean().to_dict()
     y_top_ = y_top.values - np.array([null_avg[k] for k in null_avg.keys()])
 
-    null_upper_q = points_df.groupby(0)[1].quantile(q=0.975).to_dict()
-    null_lower_q = points_df.groupby(0)[1].quantile(q=0.025).to_dict()
+    null_upper_q = points_df.groupby("order")["score"].quantile(q=0.975).to_dict()
+    null_lower_q = points_df.groupby("order")["score"].quantile(q=0.025).to_dict()
     sig = [
         (_i, v - null_avg[_i])
-        for _i, v in _strip[[0, 1]].values  # type: ignore
+        for _i, v in _strip[["order", "score"]].values  # type: ignore
         if v > null_upper_q[_i] or v < null_lower_q[_i]
     ]
     not_sig = [
         (_i, v - null_avg[_i])
-        for _i, v in _strip[[0, 1]].values  # type: ignore
+        for _i, v in _strip[["order", "score"]].values  # type: ignore
         if null_lower_q[_i] <= v <= null_upper_q[_i]
     ]
 
@@ -191,8 +199,8 @@ def plot_full_alignment_with_null_models(
         alpha=1.0,
     )
     # Annotate each point with its label
-    for j, (i, label) in enumerate(top[[2]].iterrows()):  # type: ignore
-        label = label[2]
+    for j, (order, rank) in enumerate(top[["order", "rank"]].values):  # type: ignore
+        label = store.combination(order, rank)
         _text = [lab.replace("_", " ") for lab in label]
         text = "\n".join(_text)
         ax.annotate(
@@ -255,8 +263,8 @@ def plot_full_alignment_with_null_models(
     )
     sns.lineplot(
         data=points_df,
-        x=points_df[0].astype(int),
-        y=1,
+        x="order",
+        y="score",
         estimator="mean",
         errorbar=("ci", 95),
         n_boot=1000,
@@ -267,7 +275,9 @@ def plot_full_alignment_with_null_models(
     )
     sns.lineplot(
         x=x_top,
-        y=expected_curve_equal_sized_clusters(int(max(int(c) for c in x_top))),
+        y=expected_curve_fullpartition_equal_sized_clusters(
+            int(max(int(c) for c in x_top))
+        ),
         linestyle="-.",
         color="grey",
         label="equal-sized clusters",
@@ -15,6 +15,7 @@ setup(
         "scikit-learn",
         "scipy",
         "seaborn",
+        "threadpoolctl",
         "tqdm",
     ],
     author="Letizia Iannucci",
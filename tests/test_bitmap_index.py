@@ -0,0 +1,145 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from multiway_alignment.bitmap_index import BitmapIndex
+from multiway_alignment.consensus import get_consensus_codes, get_consensus_partition
+
+
+class TestBitmapIndex(unittest.TestCase):
+    """
+    Test functionality of bitmap_index.BitmapIndex
+    ------------
+    Example
+    ------------
+    >>> python3 -m unittest -v tests.test_bitmap_index
+    """
+
+    def setUp(self):
+        _rng = np.random.default_rng(seed=0)
+        self._a = pd.DataFrame(
+            {c: _rng.integers(0, 3, size=130).astype(float) for c in "ABC"},
+            index=_rng.permutation(1000)[:130],
+        )
+        self._a = self._a.mask(_rng.random(self._a.shape) < 0.05)
+
+    def test_queries(self):
+        """
+        BitmapIndex returns the members and size of a consensus group
+        """
+        _index = BitmapIndex(self._a)
+        _expected = self._a[(self._a["A"] == 1) & (self._a["C"] == 2)].index
+        _res0 = _index.members({"A": 1, "C": 2})
+        self.assertListEqual(
+            list(_res0),
+            list(_expected),
+            f"""BitmapIndex should return the members of the group, but returned {_res0}""",
+        )
+        self.assertEqual(
+            _index.count({"A": 1, "C": 2}),
+            len(_expected),
+            """BitmapIndex should return the size of the group""",
+        )
+        self.assertEqual(
+            _index.count({"A": 7}),
+            0,
+            """BitmapIndex should return an empty group for an unknown opinion""",
+        )
+        self.assertEqual(
+            _index.count({}),
+            len(self._a),
+            """BitmapIndex should return everybody when no opinion is given""",
+        )
+
+    def test_consensus_with_index(self):
+        """
+        get_consensus_partition and get_consensus_codes return the same groups when using the index
+        """
+        _index = BitmapIndex(self._a)
+        for _topics in (["A"], ["C", "A"], ["A", "B", "C"]):
+            for _missing in ("category", "drop"):
+                _res0 = get_consensus_partition(
+                    self._a[_topics], index=_index, missing=_missing
+                )
+                _expected0 = get_consensus_partition(self._a[_topics], missing=_missing)
+                self.assertDictEqual(
+                    _res0,
+                    _expected0,
+                    f"""get_consensus_partition should return the same groups when using the index,
+                    with missing={_missing}, but returned {_res0}""",
+                )
+            _res1 = get_consensus_codes(self._a[_topics], index=_index)
+            _expected1 = get_consensus_codes(self._a[_topics])
+            self.assertListEqual(
+                _res1.tolist(),
+                _expected1.tolist(),
+                f"""get_consensus_codes should return the same ids when using the index,
+                but returned {_res1}""",
+            )
+
+    def test_on_other_opinions(self):
+        """
+        get_consensus_partition raises ValueError if the index was built on other opinions
+        """
+        _index = BitmapIndex(self._a.iloc[:10])
+        with self.assertRaises(ValueError):
+            get_consensus_partition(self._a, index=_index)
+
+    def test_on_modified_opinions(self):
+        """
+        get_consensus_codes raises ValueError if the opinions differ from the indexed ones:
+        on the fingerprint of the index, or on every opinion with validate
+        """
+        _index = BitmapIndex(self._a)
+        _b = self._a.copy()
+        _b.iloc[3, 1] = 7.0
+        with self.assertRaises(ValueError):
+            get_consensus_codes(_b, index=_index, validate=True)
+        _b = self._a.fillna(0.0)
+        with self.assertRaises(ValueError):
+            get_consensus_codes(_b, index=_index, validate=True)
+        _b = self._a.assign(A=self._a["B"])
+        with self.assertRaises(ValueError):
+            get_consensus_codes(_b, index=_index)
+        _b = self._a.sample(frac=1.0, random_state=0)
+        with self.assertRaises(ValueError):
+            get_consensus_codes(_b, index=_index)
+        _b = self._a.set_axis(self._a.index + 1)
+        with self.assertRaises(ValueError):
+            get_consensus_codes(_b, index=_index)
+        self.assertTrue(_index.matches(self._a[self._a.columns[::-1]], validate=True))
+
+    def test_on_many_groups(self):
+        """
+        BitmapIndex.consensus_groups combines the opinion codes when the groups get
+        close to singletons, and returns the same groups as the intersection of bitmaps
+        """
+        _rng = np.random.default_rng(seed=1)
+        _a = pd.DataFrame({c: _rng.integers(0, 4, size=2000) for c in "ABCDEFGH"})
+        _index = BitmapIndex(_a)
+        _b = _a.mask(_rng.random(_a.shape) < 0.05)
+        _res0 = get_consensus_partition(_b, index=BitmapIndex(_b))
+        self.assertDictEqual(
+            _res0,
+            get_consensus_partition(_b),
+            """the combined opinion codes should keep the missing opinions as groups""",
+        )
+        for _topics in (["A"], ["A", "B", "C", "D", "E", "F", "G", "H"]):
+            _labels, _n_groups, _codes = _index.consensus_groups(_topics)
+            _expected = get_consensus_codes(_a[_topics])
+            self.assertListEqual(
+                _labels.tolist(),
+                _expected.tolist(),
+                f"""consensus_groups should return the consensus group ids, but returned {_labels}""",
+            )
+            self.assertEqual(_n_groups, _expected.max() + 1)
+            self.assertListEqual(
+                _codes[_labels].tolist(),
+                _index.codes(_topics).tolist(),
+                """consensus_groups should return the opinion codes of each group""",
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
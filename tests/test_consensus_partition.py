@@ -0,0 +1,112 @@
+import pickle
+import unittest
+
+import pandas as pd
+
+from multiway_alignment.consensus import (
+    get_consensus_partition,
+    get_consensus_partition_recursive,
+)
+from multiway_alignment.partition import ConsensusPartition
+
+
+class TestConsensusPartition(unittest.TestCase):
+    """
+    Test functionality of partition.ConsensusPartition
+    ------------
+    Example
+    ------------
+    >>> python3 -m unittest -v tests.test_consensus_partition
+    """
+
+    def setUp(self):
+        self._a = pd.DataFrame(
+            {"A": [0, 0, 1, 1, 0], "B": [1, 1, 0, 1, 1], "C": [0, 0, 1, 0, 1]},
+            index=[10, 11, 12, 13, 14],
+        )
+
+    def test_on_empty(self):
+        """
+        get_consensus_partition with compact=True returns an empty ConsensusPartition
+        """
+        _res0 = get_consensus_partition(opinions=pd.DataFrame(), compact=True)
+        self.assertIsInstance(
+            _res0,
+            ConsensusPartition,
+            f"""get_consensus_partition should return a ConsensusPartition, but returned {type(_res0)}""",
+        )
+        self.assertEqual(
+            len(_res0),
+            0,
+            f"""ConsensusPartition of an empty dataframe should have no groups, but has {len(_res0)}""",
+        )
+        self.assertDictEqual(
+            _res0.to_dict(),
+            dict(),
+            f"""ConsensusPartition of an empty dataframe should convert to an empty dictionary,
+            but returned {_res0.to_dict()}""",
+        )
+
+    def test_sizes(self):
+        """
+        ConsensusPartition returns group sizes and their histogram
+        """
+        _res0 = get_consensus_partition(opinions=self._a, compact=True)
+        self.assertListEqual(
+            _res0.sizes.tolist(),
+            [2, 1, 1, 1],
+            f"""ConsensusPartition should return the correct sizes, but returned {_res0.sizes}""",
+        )
+        self.assertEqual(
+            _res0.size(0),
+            2,
+            f"""ConsensusPartition should return the correct size, but returned {_res0.size(0)}""",
+        )
+        _sizes, _counts = _res0.size_histogram()
+        self.assertListEqual(
+            [_sizes.tolist(), _counts.tolist()],
+            [[1, 2], [3, 1]],
+            f"""ConsensusPartition should return the correct size histogram,
+            but returned {_sizes}, {_counts}""",
+        )
+        self.assertListEqual(
+            list(_res0.members_of(0)),
+            [10, 11],
+            f"""ConsensusPartition should return the members of a group,
+            but returned {_res0.members_of(0)}""",
+        )
+
+    def test_to_dict(self):
+        """
+        ConsensusPartition converts to the dictionary returned by default
+        """
+        for _f in (get_consensus_partition, get_consensus_partition_recursive):
+            _res0 = _f(opinions=self._a, compact=True)
+            _expected0 = _f(opinions=self._a)
+            self.assertDictEqual(
+                _res0.to_dict(),
+                _expected0,
+                f"""ConsensusPartition should convert to the same dictionary returned by {_f.__name__},
+                but returned {_res0.to_dict()}""",
+            )
+
+    def test_pickle(self):
+        """
+        ConsensusPartition survives a pickle round trip
+        """
+        _res0 = get_consensus_partition(opinions=self._a, compact=True)
+        _res1 = pickle.loads(pickle.dumps(_res0))
+        self.assertListEqual(
+            _res1.members.tolist(),
+            _res0.members.tolist(),
+            """ConsensusPartition should rebuild the same members after unpickling""",
+        )
+        self.assertDictEqual(
+            _res1.to_dict(),
+            _res0.to_dict(),
+            """ConsensusPartition should convert to the same dictionary after unpickling""",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
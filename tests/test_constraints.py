@@ -0,0 +1,142 @@
+import unittest
+from collections import Counter
+from itertools import combinations
+
+import numpy as np
+
+from multiway_alignment.constraints import LayerConstraints
+
+
+class TestLayerConstraints(unittest.TestCase):
+    """
+    Test functionality of constraints.LayerConstraints
+    ------------
+    Example
+    ------------
+    >>> python3 -m unittest -v tests.test_constraints
+    """
+
+    def setUp(self):
+        self._layers = [f"L{j}" for j in range(7)]
+
+    def _expected(self, include=(), exclude=(), groups=(), min_size=2, max_size=7):
+        """
+        the allowed combinations, filtered from all the combinations
+        """
+        _ids = {layer: j for j, layer in enumerate(self._layers)}
+        return {
+            length: [
+                _combination
+                for _combination in combinations(range(len(self._layers)), length)
+                if all(_ids[layer] in _combination for layer in include)
+                and not any(_ids[layer] in _combination for layer in exclude)
+                and all(
+                    len({_ids[layer] in _combination for layer in _group}) == 1
+                    for _group in groups
+                )
+            ]
+            for length in range(min_size, max_size + 1)
+        }
+
+    def test_unconstrained(self):
+        """
+        without constraints, the combinations are those of itertools.combinations
+        """
+        _space = LayerConstraints(self._layers)
+        self.assertTrue(_space.unconstrained)
+        self.assertListEqual(_space.sizes(), list(range(2, 8)))
+        for length in range(2, 8):
+            self.assertListEqual(
+                _space.combinations(length), list(combinations(range(7), length))
+            )
+
+    def test_combinations(self):
+        """
+        the combinations of each size are the allowed combinations, in lexicographic order
+        """
+        for _constraints in (
+            dict(include=["L1"]),
+            dict(exclude=["L0", "L4"]),
+            dict(groups=[["L2", "L5"], ["L3", "L6", "L0"]]),
+            dict(min_size=3, max_size=5),
+            dict(
+                include=["L5"],
+                exclude=["L1"],
+                groups=[["L2", "L5"], ["L0", "L6"]],
+                max_size=6,
+            ),
+            dict(exclude=["L2"], groups=[["L2", "L3"]]),
+        ):
+            _space = LayerConstraints(self._layers, **_constraints)
+            self.assertFalse(_space.unconstrained)
+            _expected = {
+                length: _combinations
+                for length, _combinations in self._expected(**_constraints).items()
+                if _combinations
+            }
+            self.assertListEqual(
+                _space.sizes(),
+                list(_expected),
+                f"""LayerConstraints with {_constraints} should have sizes {list(_expected)}""",
+            )
+            for length, _combinations in _expected.items():
+                self.assertListEqual(
+                    _space.combinations(length),
+                    _combinations,
+                    f"""LayerConstraints with {_constraints} should enumerate {_combinations}""",
+                )
+                self.assertEqual(_space.count(length), len(_combinations))
+                for k, _unit in enumerate(_space.units):
+                    self.assertEqual(
+                        _space.count(length, k),
+                        sum(set(_unit) <= set(c) for c in _combinations),
+                    )
+
+    def test_unrank(self):
+        """
+        a combination is found from its position among the allowed combinations
+        """
+        _space = LayerConstraints(
+            self._layers, include=["L4"], groups=[["L0", "L5"], ["L1", "L3", "L6"]]
+        )
+        for length in _space.sizes():
+            self.assertListEqual(
+                [_space.unrank(length, i) for i in range(_space.count(length))],
+                _space.combinations(length),
+            )
+
+    def test_sample(self):
+        """
+        the combinations are drawn uniformly, with or without a given unit
+        """
+        _space = LayerConstraints(self._layers, include=["L0"], groups=[["L1", "L2"]])
+        _rng = np.random.default_rng(seed=0)
+        for _unit in (None, 0):
+            _counts = Counter(_space.sample(4, _rng, unit=_unit) for _ in range(4000))
+            _expected = [
+                c
+                for c in _space.combinations(4)
+                if _unit is None or set(_space.units[_unit]) <= set(c)
+            ]
+            self.assertSetEqual(set(_counts), set(_expected))
+            for _count in _counts.values():
+                self.assertAlmostEqual(
+                    _count / 4000, 1 / len(_expected), delta=0.3 / len(_expected)
+                )
+
+    def test_errors(self):
+        """
+        unknown layers, overlapping groups, and layers both included and excluded are refused
+        """
+        for _constraints in (
+            dict(include=["L9"]),
+            dict(groups=[["L0", "L1"], ["L1", "L2"]]),
+            dict(include=["L0"], exclude=["L0"]),
+            dict(include=["L0"], exclude=["L1"], groups=[["L0", "L1"]]),
+        ):
+            with self.assertRaises(ValueError):
+                LayerConstraints(self._layers, **_constraints)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from multiway_alignment.results import CurveStore, load_scores
+from multiway_alignment.score import maximal_alignment_curves
+
+
+class TestCurveStore(unittest.TestCase):
+    """
+    Test functionality of results.CurveStore
+    ------------
+    Example
+    ------------
+    >>> python3 -m unittest -v tests.test_curve_store
+    """
+
+    def setUp(self):
+        _rng = np.random.default_rng(seed=0)
+        self._a = pd.DataFrame({c: _rng.integers(0, 3, size=200) for c in "ABCDE"})
+
+    def test_same_results(self):
+        """
+        the compact results have the scores and the curve of the dictionaries
+        """
+        for _constraints in (dict(), dict(include=["C"], groups=[["A", "E"]])):
+            for _fullpartition in (False, True):
+                _res0 = maximal_alignment_curves(
+                    self._a,
+                    ["nmi", "vi"],
+                    fullpartition=_fullpartition,
+                    compact=True,
+                    **_constraints,
+                )
+                _expected0 = maximal_alignment_curves(
+                    self._a, ["nmi", "vi"], fullpartition=_fullpartition, **_constraints
+                )
+                for _which in ("nmi", "vi"):
+                    _store, _best = _res0[_which]
+                    self.assertIsInstance(_store, CurveStore)
+                    self.assertDictEqual(
+                        _store.to_dict(),
+                        _expected0[_which][0],
+                        f"""CurveStore should have the scores of {_which}""",
+                    )
+                    self.assertDictEqual(_best, _expected0[_which][1])
+                    self.assertDictEqual(_store.best(), _expected0[_which][1])
+
+    def test_ranks(self):
+        """
+        the combinations are indexed by their rank, and named on request
+        """
+        _store = CurveStore(
+            ["A", "B", "C", "D"],
+            {2: np.array([0.4, 0.1]), 3: np.array([0.2, 0.3, 0.1, 0.3])},
+            ranks={2: np.array([5, 1]), 3: None},
+        )
+        self.assertListEqual(_store.ranks_of(2).tolist(), [1, 5])
+        self.assertListEqual(_store.scores[2].tolist(), [0.1, 0.4])
+        self.assertListEqual(_store.combination(2, 5), ["C", "D"])
+        self.assertDictEqual(
+            _store.best(), {2: (0.4, ["C", "D"]), 3: (0.3, ["A", "B", "D"])}
+        )
+        self.assertListEqual(
+            _store.to_frame(names=True)["topics"].tolist()[:2], [["A", "C"], ["C", "D"]]
+        )
+        self.assertEqual(len(CurveStore.from_dict(_store.to_dict())), 6)
+        self.assertDictEqual(
+            CurveStore.from_dict(_store.to_dict()).to_dict(), _store.to_dict()
+        )
+
+    def test_save_load(self):
+        """
+        the store is saved as .npy files and loaded memory-mapped,
+        and the results of a previous version are loaded from their dictionary
+        """
+        _store, _ = maximal_alignment_curves(self._a, ["vi"], compact=True)["vi"]
+        _sparse = CurveStore.from_dict(
+            dict(list(_store.to_dict().items())[::3]), layers=list("ABCDE")
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            for _name, _expected in (("dense", _store), ("sparse", _sparse)):
+                _expected.save(os.path.join(tmp, _name))
+                _loaded = CurveStore.load(os.path.join(tmp, _name))
+                self.assertIsInstance(_loaded.scores[2], np.memmap)
+                self.assertDictEqual(_loaded.to_dict(), _expected.to_dict())
+                self.assertDictEqual(_loaded.best(), _expected.best())
+            maximal_alignment_curves(
+                self._a, ["nmi"], dump_to=os.path.join(tmp, "legacy")
+            )
+            self.assertDictEqual(
+                load_scores(os.path.join(tmp, "legacy_nmi_all")).to_dict(),
+                maximal_alignment_curves(self._a, ["nmi"])["nmi"][0],
+            )
+
+    @unittest.skipIf(
+        importlib.util.find_spec("pyarrow") is None, "pyarrow is not installed"
+    )
+    def test_parquet(self):
+        """
+        the store is saved as a Parquet file
+        """
+        _store, _ = maximal_alignment_curves(self._a, ["nmi"], compact=True)["nmi"]
+        with tempfile.TemporaryDirectory() as tmp:
+            _path = os.path.join(tmp, "scores.parquet")
+            _store.save(_path)
+            self.assertDictEqual(load_scores(_path).to_dict(), _store.to_dict())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+import numpy as np
+
+from multiway_alignment.cache import EMICache
+from multiway_alignment.metrics import (
+    adjusted_mutual_info,
+    get_emi_cache,
+    set_emi_cache,
+)
+
+
+class TestEMICache(unittest.TestCase):
+    """
+    Test functionality of cache.EMICache
+    ------------
+    Example
+    ------------
+    >>> python3 -m unittest -v tests.test_emi_cache
+    """
+
+    def setUp(self):
+        self._previous = get_emi_cache()
+        self.addCleanup(set_emi_cache, self._previous)
+
+    def test_key(self):
+        """
+        EMICache.key only depends on the pair of multisets of cluster sizes
+        """
+        _key = EMICache.key(np.array([3, 1, 2]), np.array([4, 0, 2]))
+        self.assertEqual(_key, EMICache.key(np.array([1, 2, 3]), np.array([2, 4])))
+        self.assertEqual(_key, EMICache.key(np.array([2, 4]), np.array([2, 3, 1])))
+        self.assertNotEqual(_key, EMICache.key(np.array([1, 1, 4]), np.array([2, 4])))
+
+    def test_eviction(self):
+        """
+        EMICache keeps the memory within budget
+        """
+        _cache = EMICache(max_bytes=3 * EMICache._ENTRY_BYTES)
+        for i in range(1, 10):
+            _cache.put(EMICache.key(np.array([i]), np.array([i])), float(i))
+        self.assertEqual(len(_cache), 3)
+        self.assertEqual(_cache.get(EMICache.key(np.array([9]), np.array([9]))), 9.0)
+        self.assertIsNone(_cache.get(EMICache.key(np.array([1]), np.array([1]))))
+
+    def test_shared(self):
+        """
+        EMICache reads the values written by another cache to the shared mapping
+        """
+        _shared: dict = {}
+        _key = EMICache.key(np.array([1, 2]), np.array([3]))
+        _writer = EMICache(shared=_shared, batch_size=2)
+        _writer.put(_key, 0.5)
+        self.assertDictEqual(_shared, {}, "EMICache should write the values in batches")
+        _writer.flush()
+        _cache = EMICache(shared=_shared)
+        self.assertEqual(_cache.get(_key), 0.5)
+        self.assertEqual(_cache.hits, 1)
+        for i in range(1, 3):
+            _writer.put(EMICache.key(np.array([i]), np.array([i])), float(i))
+        self.assertEqual(len(_shared), 3, "EMICache should write a full batch")
+
+    def test_ami_on_permutations(self):
+        """
+        adjusted_mutual_info computes the EMI once for permutations of the same layers
+        """
+        _cache = EMICache()
+        set_emi_cache(_cache)
+        _rng = np.random.default_rng(seed=0)
+        _x = _rng.integers(0, 4, size=300)
+        _y = _rng.integers(0, 6, size=300)
+        _res0 = adjusted_mutual_info(_x, _y)
+        _res1 = adjusted_mutual_info(_rng.permutation(_x), _rng.permutation(_y))
+        self.assertEqual((_cache.misses, _cache.hits), (1, 1))
+        set_emi_cache(None)
+        self.assertEqual(_res0, adjusted_mutual_info(_x, _y))
+        self.assertNotEqual(_res0, _res1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from multiway_alignment.consensus import (
+    _combine_codes,
+    _encode_opinions,
+    _leave_one_out_codes,
+    get_consensus_codes,
+)
+
+
+class TestGetConsensusCodes(unittest.TestCase):
+    """
+    Test functionality of consensus.get_consensus_codes()
+    ------------
+    Example
+    ------------
+    >>> python3 -m unittest -v tests.test_get_consensus_codes
+    """
+
+    def test_on_empty(self):
+        """
+        get_consensus_codes returns an empty np.ndarray
+        """
+        _a = pd.DataFrame()
+        _res0 = get_consensus_codes(_a)
+        self.assertIsInstance(
+            _res0,
+            np.ndarray,
+            f"""get_consensus_codes should return a np.ndarray,
+            but returned {type(_res0)}""",
+        )
+        self.assertEqual(
+            len(_res0),
+            0,
+            f"""get_consensus_codes called on empty pd.DataFrame should return
+            an empty array, but returned {_res0}""",
+        )
+
+    def test_on_simple_sets(self):
+        """
+        get_consensus_codes returns dense ids in lexicographic order of the opinions
+        """
+        _a = pd.DataFrame(
+            {
+                "A": [0, 0, 0, 1, 1, 1],
+                "B": [1, 0, 0, 1, 0, 0],
+                "C": [1, 1, 0, 0, 1, 1],
+            }
+        )
+        _res0 = get_consensus_codes(_a)
+        self.assertListEqual(
+            _res0.tolist(),
+            [2, 1, 0, 4, 3, 3],
+            f"""get_consensus_codes called on non-empty pd.DataFrame should return
+            the correct ids, but returned {_res0}""",
+        )
+
+    def test_with_nans(self):
+        """
+        get_consensus_codes assigns -1 to individuals with missing opinions
+        """
+        _a = pd.DataFrame({"A": [0, 1, 2], "B": ["x", "y", np.nan]})
+        _res0 = get_consensus_codes(_a)
+        self.assertListEqual(
+            _res0.tolist(),
+            [0, 1, -1],
+            f"""get_consensus_codes should return -1 for missing opinions,
+            but returned {_res0}""",
+        )
+
+    def test_on_high_cardinality(self):
+        """
+        get_consensus_codes is exact when the product of cardinalities overflows int64
+        """
+        _rng = np.random.default_rng(seed=0)
+        _a = pd.DataFrame({f"L{j}": _rng.integers(0, 1000, size=500) for j in range(8)})
+        _a = pd.concat([_a, _a.iloc[:50]], ignore_index=True)
+        _res0 = get_consensus_codes(_a)
+        _expected = _a.groupby(list(_a.columns)).ngroup().values
+        self.assertListEqual(
+            _res0.tolist(),
+            _expected.tolist(),
+            """get_consensus_codes should return the same groups as pd.DataFrame.groupby""",
+        )
+
+    def test_leave_one_out(self):
+        """
+        _leave_one_out_codes returns the consensus of all the topics but one, for each topic
+        """
+        _rng = np.random.default_rng(seed=0)
+        _a = pd.DataFrame(
+            {f"L{j}": _rng.integers(0, 3, size=300).astype(float) for j in range(5)}
+        )
+        _a = _a.mask(_rng.random(_a.shape) < 0.05)
+        for _k in (2, 3, 5):
+            _codes, _ = _encode_opinions(_a.iloc[:, :_k])
+            for j, _res0 in enumerate(_leave_one_out_codes(_codes)):
+                _expected0 = _combine_codes(np.delete(_codes, j, axis=1))[0]
+                self.assertListEqual(
+                    _res0.tolist(),
+                    _expected0.tolist(),
+                    f"""_leave_one_out_codes should return the consensus without topic {j} of {_k}""",
+                )
+        with self.assertRaisesRegex(ValueError, "at least two topics"):
+            _leave_one_out_codes(_codes[:, :1])
+
+
+if __name__ == "__main__":
+    unittest.main()
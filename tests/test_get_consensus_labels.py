@@ -1,5 +1,6 @@
 import unittest
 
+import numpy as np
 import pandas as pd
 
 from multiway_alignment.consensus import get_consensus_labels
@@ -62,6 +63,27 @@ class TestGetConsensusLabels(unittest.TestCase):
             the correct non-empty list, but returned {_res0}""",
         )
 
+    def test_on_missing_opinions(self):
+        """
+        get_consensus_labels labels the missing opinions with "nan",
+        and returns None for the individuals with a missing opinion with missing="drop"
+        """
+        _a = pd.DataFrame({"A": [0, 0, 1, np.nan], "B": [1, np.nan, 1, 0]})
+        _res0 = get_consensus_labels(_a)
+        self.assertListEqual(
+            _res0,
+            ["A0.0_B1.0", "A0.0_Bnan", "A1.0_B1.0", "Anan_B0.0"],
+            f"""get_consensus_labels called on a pd.DataFrame with missing opinions should
+            label the missing opinions with "nan", but returned {_res0}""",
+        )
+        _res1 = get_consensus_labels(_a[["A"]], missing="drop")
+        self.assertListEqual(
+            _res1,
+            ["A0.0", "A0.0", "A1.0", None],
+            f"""get_consensus_labels called on one topic with missing="drop" should
+            return None for the individuals with a missing opinion, but returned {_res1}""",
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 
+import numpy as np
 import pandas as pd
 
 from multiway_alignment.consensus import get_consensus_partition
@@ -289,6 +290,36 @@ class TestGetConsensusPartition(unittest.TestCase):
             """get_consensus_partition called on non-empty dataframe should return all nodes""",
         )
 
+    def test_on_missing_opinions(self):
+        """
+        get_consensus_partition keeps the missing opinions as opinions labeled with "nan",
+        and leaves out the individuals with a missing opinion with missing="drop"
+        """
+        _a = pd.DataFrame({"A": [0, 0, 1, np.nan], "B": [1, np.nan, 1, 0]})
+        _res0 = get_consensus_partition(opinions=_a)
+        _expected0 = {
+            "A0.0_B1.0": {0},
+            "A0.0_Bnan": {1},
+            "A1.0_B1.0": {2},
+            "Anan_B0.0": {3},
+        }
+
+        self.assertDictEqual(
+            _res0,
+            _expected0,
+            f"""get_consensus_partition called on a dataframe with missing opinions should
+            keep the missing opinions as groups, but returned {_res0}""",
+        )
+        _res1 = get_consensus_partition(opinions=_a, missing="drop")
+        _expected1 = {"A0.0_B1.0": {0}, "A1.0_B1.0": {2}}
+
+        self.assertDictEqual(
+            _res1,
+            _expected1,
+            f"""get_consensus_partition called with missing="drop" should
+            leave out the individuals with a missing opinion, but returned {_res1}""",
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
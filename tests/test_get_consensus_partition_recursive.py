@@ -289,6 +289,52 @@ class TestGetConsensusPartitionRecursive(unittest.TestCase):
             """get_consensus_partition_recursive called on non-empty dataframe should return all nodes""",
         )
 
+    def test_with_sorted_layers(self):
+        """
+        get_consensus_partition_recursive returns the same partition when layers are sorted by cardinality
+        """
+        _a = pd.DataFrame(
+            {"A": [0, 0, 1, 1, 0], "B": [1, 2, 0, 1, 1], "C": [0, 0, 1, 0, 0]},
+            index=[10, 11, 12, 13, 14],
+        )
+        _res0 = get_consensus_partition_recursive(opinions=_a)
+        _res1 = get_consensus_partition_recursive(opinions=_a, sort_layers=True)
+        _expected0 = {
+            "A0_B1_C0": {10, 14},
+            "A0_B2_C0": {11},
+            "A1_B0_C1": {12},
+            "A1_B1_C0": {13},
+        }
+
+        self.assertDictEqual(
+            _res0,
+            _expected0,
+            f"""get_consensus_partition_recursive called on non-empty dataframe should return the expected non-empty
+                dictionary, but returned {_res0}""",
+        )
+
+        self.assertDictEqual(
+            _res1,
+            _expected0,
+            f"""get_consensus_partition_recursive called with sort_layers=True should return the same
+                dictionary, but returned {_res1}""",
+        )
+
+    def test_with_nans_after_singletons(self):
+        """
+        get_consensus_partition_recursive drops nodes with missing opinions, also after all groups are singletons
+        """
+        _a = pd.DataFrame({"A": [0, 1, 2], "B": [0, 1, None], "C": [None, 1, 0]})
+        _res0 = get_consensus_partition_recursive(opinions=_a)
+        _expected0 = {"A1_B1.0_C1.0": {1}}
+
+        self.assertDictEqual(
+            _res0,
+            _expected0,
+            f"""get_consensus_partition_recursive should drop nodes with missing opinions,
+                but returned {_res0}""",
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
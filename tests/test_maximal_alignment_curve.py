@@ -1,8 +1,14 @@
 import unittest
 
+import numpy as np
 import pandas as pd
 
-from multiway_alignment.score import maximal_alignment_curve
+from multiway_alignment.parallel import Executor
+from multiway_alignment.score import (
+    maximal_alignment_curve,
+    maximal_alignment_curve_fullpartition,
+    maximal_alignment_curves,
+)
 
 
 class TestComputeMaximalAlignmentCurve(unittest.TestCase):
@@ -60,6 +66,224 @@ class TestComputeMaximalAlignmentCurve(unittest.TestCase):
             f"""maximal_alignment_curve should return a tuple with two dictionaries, but one was {type(_res0)}""",
         )
 
+    def test_missing_as_category(self):
+        """
+        maximal_alignment_curve with missing="category" scores missing opinions as one more opinion
+        """
+        _a = pd.DataFrame(
+            {"A": [0, 0, 1, np.nan, 1], "B": [1, np.nan, 0, 0, 1], "C": [0, 0, 1, 1, 1]}
+        )
+        _resall, _res0 = maximal_alignment_curve(_a, missing="category")
+        _expected_all, _expected0 = maximal_alignment_curve(_a.fillna(-1))
+        self.assertDictEqual(
+            _resall,
+            _expected_all,
+            f"""maximal_alignment_curve with missing="category" should score missing values
+            as a category, but returned {_resall}""",
+        )
+
+    def test_several_scores(self):
+        """
+        maximal_alignment_curves returns the curve of each score in one traversal
+        """
+        _rng = np.random.default_rng(seed=0)
+        _a = pd.DataFrame({c: _rng.integers(0, 3, size=100) for c in "ABCD"})
+        for _fullpartition, _curve in (
+            (False, maximal_alignment_curve),
+            (True, maximal_alignment_curve_fullpartition),
+        ):
+            _res0 = maximal_alignment_curves(
+                _a, ["nmi", "ami", "vi"], fullpartition=_fullpartition
+            )
+            for _which in ("nmi", "ami"):
+                self.assertEqual(
+                    _res0[_which],
+                    _curve(_a, _which),
+                    f"""maximal_alignment_curves should return the {_which} curve of {_curve.__name__}""",
+                )
+            _all, _best = _res0["vi"]
+            self.assertEqual(
+                _best[2][0],
+                min(v for k, v in _all.items() if k.startswith("2+")),
+                """maximal_alignment_curves should keep the lowest variation of information""",
+            )
+
+    def test_parallel(self):
+        """
+        maximal_alignment_curves with n_jobs > 1 returns the same results as the serial run
+        """
+        _rng = np.random.default_rng(seed=0)
+        _a = pd.DataFrame({c: _rng.integers(0, 3, size=200) for c in "ABCDE"}).astype(
+            float
+        )
+        _a.iloc[_rng.integers(0, 200, size=20), 1] = np.nan
+        for _fullpartition in (False, True):
+            for _adjusted in (False, True):
+                _res0 = maximal_alignment_curves(
+                    _a,
+                    ["nmi", "ami", "vi"],
+                    fullpartition=_fullpartition,
+                    adjusted=_adjusted,
+                    n_jobs=2,
+                )
+                _expected0 = maximal_alignment_curves(
+                    _a,
+                    ["nmi", "ami", "vi"],
+                    fullpartition=_fullpartition,
+                    adjusted=_adjusted,
+                )
+                self.assertEqual(
+                    _res0,
+                    _expected0,
+                    f"""maximal_alignment_curves with n_jobs=2 should return the serial results,
+                    but returned {_res0}""",
+                )
+
+    def test_constraints_parallel(self):
+        """
+        maximal_alignment_curves with constraints and n_jobs > 1 returns the serial results
+        """
+        _rng = np.random.default_rng(seed=0)
+        _a = pd.DataFrame({c: _rng.integers(0, 3, size=200) for c in "ABCDEF"}).astype(
+            float
+        )
+        _a.iloc[_rng.integers(0, 200, size=20), 1] = np.nan
+        for _fullpartition in (False, True):
+            _res0 = maximal_alignment_curves(
+                _a,
+                ["nmi", "vi"],
+                fullpartition=_fullpartition,
+                include=["B"],
+                groups=[["C", "F"]],
+                max_size=4,
+                n_jobs=2,
+            )
+            _expected0 = maximal_alignment_curves(
+                _a,
+                ["nmi", "vi"],
+                fullpartition=_fullpartition,
+                include=["B"],
+                groups=[["C", "F"]],
+                max_size=4,
+            )
+            self.assertEqual(
+                _res0,
+                _expected0,
+                f"""maximal_alignment_curves with constraints and n_jobs=2 should return
+                the serial results, but returned {_res0}""",
+            )
+            self.assertListEqual(
+                list(_res0["nmi"][0]),
+                [
+                    "2+A+B",
+                    "2+B+D",
+                    "2+B+E",
+                    "3+A+B+D",
+                    "3+A+B+E",
+                    "3+B+C+F",
+                    "3+B+D+E",
+                    "4+A+B+C+F",
+                    "4+A+B+D+E",
+                    "4+B+C+D+F",
+                    "4+B+C+E+F",
+                ],
+            )
+
+    def test_top_k(self):
+        """
+        maximal_alignment_curves with top_k keeps the best combinations of each size
+        and the summary of the scores of each size
+        """
+        _rng = np.random.default_rng(seed=0)
+        _a = pd.DataFrame({c: _rng.integers(0, 3, size=200) for c in "ABCDEF"}).astype(
+            float
+        )
+        _a.iloc[_rng.integers(0, 200, size=20), 1] = np.nan
+        for _n_jobs in (1, 2):
+            _res0 = maximal_alignment_curves(_a, ["nmi", "vi"], top_k=2, n_jobs=_n_jobs)
+            _expected0 = maximal_alignment_curves(_a, ["nmi", "vi"])
+            for _which in ("nmi", "vi"):
+                _top, _best = _res0[_which]
+                _summary = _res0[_which].summary
+                self.assertEqual(_best, _expected0[_which][1])
+                for length in range(2, 7):
+                    _scores = {
+                        _key: _score
+                        for _key, _score in _expected0[_which][0].items()
+                        if _key.startswith(f"{length}+")
+                    }
+                    _expected_top = sorted(
+                        _scores, key=_scores.get, reverse=_which == "nmi"
+                    )[:2]
+                    self.assertListEqual(
+                        [_key for _key in _top if _key.startswith(f"{length}+")],
+                        _expected_top,
+                        f"""maximal_alignment_curves with top_k=2 should keep {_expected_top}""",
+                    )
+                    _values = np.array(list(_scores.values()))
+                    self.assertEqual(_summary[length]["count"], len(_values))
+                    self.assertAlmostEqual(_summary[length]["mean"], _values.mean())
+                    self.assertAlmostEqual(_summary[length]["variance"], _values.var())
+                    self.assertEqual(
+                        _summary[length]["quantiles"][0.5],
+                        np.quantile(_values, 0.5, method="inverted_cdf"),
+                    )
+
+    def test_revolving_door(self):
+        """
+        maximal_alignment_curves in revolving-door order returns the lexicographic results
+        """
+        _rng = np.random.default_rng(seed=0)
+        _a = pd.DataFrame({c: _rng.integers(0, 3, size=200) for c in "ABCDE"}).astype(
+            float
+        )
+        _a.iloc[_rng.integers(0, 200, size=20), 1] = np.nan
+        for _fullpartition in (False, True):
+            for _adjusted, _analytic in ((False, True), (True, True), (True, False)):
+                _expected0 = maximal_alignment_curves(
+                    _a,
+                    ["nmi", "ami", "vi"],
+                    fullpartition=_fullpartition,
+                    adjusted=_adjusted,
+                    analytic=_analytic,
+                )
+                for _n_jobs in (1, 2):
+                    _res0 = maximal_alignment_curves(
+                        _a,
+                        ["nmi", "ami", "vi"],
+                        fullpartition=_fullpartition,
+                        adjusted=_adjusted,
+                        analytic=_analytic,
+                        n_jobs=_n_jobs,
+                        enumeration="revolving_door",
+                    )
+                    self.assertEqual(
+                        _res0,
+                        _expected0,
+                        f"""maximal_alignment_curves in revolving-door order should return
+                        the lexicographic results, but returned {_res0}""",
+                    )
+
+    def test_parallel_cache_reuse(self):
+        """
+        the workers of maximal_alignment_curves reuse their cached partitions
+        """
+        _rng = np.random.default_rng(seed=0)
+        _a = pd.DataFrame({c: _rng.integers(0, 3, size=100) for c in "ABCDEFG"})
+        with Executor(n_jobs=2, share_emi=False) as executor:
+            _res0 = maximal_alignment_curves(_a, ["nmi"], executor=executor)
+            _hit_rates = executor.worker_hit_rates()
+        self.assertEqual(
+            _res0,
+            maximal_alignment_curves(_a, ["nmi"]),
+            """maximal_alignment_curves on an executor should return the serial results""",
+        )
+        self.assertGreater(
+            min(_hit_rates.values()),
+            0.5,
+            f"""The workers should find most parent partitions in their cache, but hit {_hit_rates}""",
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,275 @@
+import unittest
+
+import numpy as np
+from sklearn.metrics import (  # type: ignore
+    adjusted_mutual_info_score,
+    adjusted_rand_score,
+    mutual_info_score,
+)
+from sklearn.metrics.cluster import normalized_mutual_info_score  # type: ignore
+
+from multiway_alignment import metrics
+from multiway_alignment.metrics import (
+    Contingency,
+    adjusted_mutual_info,
+    available_scores,
+    contingency_cells,
+    expected_score,
+    has_bound,
+    label_scores,
+    permutation_tables,
+    normalized_mutual_info,
+    register_score,
+    score_bound,
+)
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    Test functionality of the contingency kernel in metrics
+    ------------
+    Example
+    ------------
+    >>> python3 -m unittest -v tests.test_metrics
+    """
+
+    def setUp(self):
+        _rng = np.random.default_rng(seed=0)
+        self._x = _rng.integers(0, 4, size=500)
+        self._y = (
+            self._x + _rng.integers(0, 6, size=500) * (_rng.random(500) < 0.4)
+        ) % 6
+
+    def test_same_as_sklearn(self):
+        """
+        normalized_mutual_info and adjusted_mutual_info return the same values as sklearn
+        """
+        _cases = [
+            (self._x, self._y),
+            (self._x, self._x),
+            (self._x, np.zeros(500, dtype=np.int64)),
+            (np.zeros(3, dtype=np.int64), np.zeros(3, dtype=np.int64)),
+            # codes with gaps, e.g. after selecting a subset of the rows
+            (self._x * 7, self._y + 3),
+        ]
+        for _f, _expected_f in (
+            (normalized_mutual_info, normalized_mutual_info_score),
+            (adjusted_mutual_info, adjusted_mutual_info_score),
+        ):
+            for _a, _b in _cases:
+                self.assertEqual(
+                    _f(_a, _b),
+                    _expected_f(_a, _b),
+                    f"""{_f.__name__} should return the same value as {_expected_f.__name__}""",
+                )
+
+    def test_on_labels(self):
+        """
+        normalized_mutual_info accepts non-integer labels
+        """
+        _labels = np.array(["a", "b", "c", "d"])[self._x]
+        self.assertEqual(
+            normalized_mutual_info(_labels, self._y),
+            normalized_mutual_info_score(_labels, self._y),
+            """normalized_mutual_info should return the same value as sklearn on string labels""",
+        )
+
+    def test_contingency_cells(self):
+        """
+        contingency_cells returns the dense non-zero cells of the contingency table
+        """
+        _rows, _cols, _counts = contingency_cells(
+            np.array([0, 0, 5, 5, 5]), np.array([2, 2, 2, 9, 9])
+        )
+        self.assertListEqual(
+            list(zip(_rows.tolist(), _cols.tolist(), _counts.tolist())),
+            [(0, 0, 2), (1, 0, 1), (1, 1, 2)],
+            """contingency_cells should return the counts of the non-zero cells""",
+        )
+        with self.assertRaises(ValueError):
+            contingency_cells(np.zeros(3, dtype=np.int64), np.zeros(2, dtype=np.int64))
+
+    def test_registry(self):
+        """
+        the registered scores return the same values as sklearn
+        """
+        _expected = {
+            "ari": adjusted_rand_score(self._x, self._y),
+            "mi": mutual_info_score(self._x, self._y),
+        }
+        for _method in ("min", "geometric", "arithmetic", "max"):
+            _suffix = "" if _method == "arithmetic" else f"_{_method}"
+            _expected[f"nmi{_suffix}"] = normalized_mutual_info_score(
+                self._x, self._y, average_method=_method
+            )
+            _expected[f"ami{_suffix}"] = adjusted_mutual_info_score(
+                self._x, self._y, average_method=_method
+            )
+        _res0 = label_scores(self._x, self._y, list(_expected))
+        for _which, _value in _expected.items():
+            self.assertAlmostEqual(
+                _res0[_which],
+                _value,
+                places=12,
+                msg=f"""label_scores should return the same {_which} as sklearn""",
+            )
+        self.assertEqual(
+            label_scores(self._x, self._x, ["ari"])["ari"],
+            1.0,
+            """the adjusted Rand index of identical clusterings should be 1""",
+        )
+
+    def test_variation_of_information(self):
+        """
+        the variation of information is zero for identical clusterings and H(X) + H(Y) - 2 MI otherwise
+        """
+        _table = Contingency.from_labels(self._x, self._y)
+        self.assertAlmostEqual(
+            _table.score("vi"),
+            sum(_table.entropies) - 2 * _table.mi,
+            places=12,
+        )
+        self.assertEqual(label_scores(self._x, self._x * 2, ["vi"])["vi"], 0.0)
+
+    def test_register_score(self):
+        """
+        register_score adds a score computed from the contingency table
+        """
+        register_score("n_cells")(lambda table: float(len(table.counts)))
+        self.addCleanup(metrics._SCORES.pop, "n_cells")
+        self.assertIn("n_cells", available_scores())
+        self.assertEqual(
+            label_scores(np.array([0, 0, 1]), np.array([0, 1, 1]), ["n_cells"]),
+            {"n_cells": 3.0},
+        )
+
+    def test_high_cardinality(self):
+        """
+        the sparse contingency path and the EMI over cluster sizes agree with sklearn
+        when one clustering has close to n clusters
+        """
+        _rng = np.random.default_rng(seed=0)
+        _x = _rng.integers(0, 5000, size=6000)
+        _y = np.arange(6000)
+        _y[:1000] = _rng.integers(0, 5, size=1000)
+        _rows, _cols, _counts = contingency_cells(_x, _y)
+        _cells, _expected_counts = np.unique(_x * 6000 + _y, return_counts=True)
+        self.assertListEqual(
+            _counts.tolist(),
+            _expected_counts.tolist(),
+            """contingency_cells should count the same cells on the sparse path""",
+        )
+        self.assertAlmostEqual(
+            adjusted_mutual_info(_x, _y),
+            adjusted_mutual_info_score(_x, _y),
+            places=8,
+            msg="""adjusted_mutual_info should return the same value as sklearn""",
+        )
+        self.assertEqual(
+            normalized_mutual_info(_x, _y),
+            normalized_mutual_info_score(_x, _y),
+            """normalized_mutual_info should return the same value as sklearn""",
+        )
+
+    def test_sparse_labels(self):
+        """
+        large and sparse integer labels are counted by cluster, not by label value
+        """
+        _x = np.array([10**12, 5, 7, 10**12, 5, 7, 5])
+        _y = np.array(
+            [3 * 10**10, 2 * 10**10, 10**10, 3 * 10**10, 2 * 10**10, 0, 1]
+        )
+        _rows, _cols, _counts = contingency_cells(_x, _y)
+        self.assertListEqual(
+            list(zip(_rows.tolist(), _cols.tolist(), _counts.tolist())),
+            [(0, 1, 1), (0, 3, 2), (1, 0, 1), (1, 2, 1), (2, 4, 2)],
+            """contingency_cells should count the cells of sparse labels""",
+        )
+        for _which in ("nmi", "ami", "ari"):
+            self.assertEqual(
+                label_scores(_x, _y, [_which]),
+                label_scores(
+                    np.unique(_x, return_inverse=True)[1],
+                    np.unique(_y, return_inverse=True)[1],
+                    [_which],
+                ),
+                f"""the {_which} of sparse labels should be the {_which} of their codes""",
+            )
+        _tables = permutation_tables(_x, _y, n_permutations=3)
+        self.assertEqual(len(_tables), 3)
+
+    def test_permutation_tables(self):
+        """
+        permutation_tables returns the tables of independent permutations, counted in one batch
+        """
+        _tables = permutation_tables(self._x, self._y, n_permutations=5, seed=1)
+        _perms = [
+            np.random.default_rng(_seed).permutation(self._y)
+            for _seed in np.random.SeedSequence(1).spawn(5)
+        ]
+        for _table, _perm in zip(_tables, _perms):
+            _expected = Contingency.from_labels(self._x, _perm)
+            for _which in ("nmi", "ami", "ari", "vi"):
+                self.assertAlmostEqual(
+                    _table.score(_which),
+                    _expected.score(_which),
+                    places=12,
+                    msg=f"""permutation_tables should return the {_which} of each permutation""",
+                )
+        self.assertEqual(
+            len({_table.score("mi") for _table in _tables}),
+            5,
+            """permutation_tables should draw different permutations""",
+        )
+
+    def test_expected_score(self):
+        """
+        expected_score estimates the analytic expectation with random permutations
+        """
+        for _which in ("nmi", "mi", "vi"):
+            _analytic = expected_score(self._x, self._y, _which, analytic=True)
+            _estimate = expected_score(self._x, self._y, _which, n_permutations=2000)
+            self.assertAlmostEqual(
+                _analytic,
+                _estimate,
+                delta=0.05 * _analytic,
+                msg=f"""expected_score should estimate the expected {_which}""",
+            )
+        self.assertEqual(expected_score(self._x, self._y, "ami", analytic=True), 0.0)
+        register_score("n_cells")(lambda table: float(len(table.counts)))
+        self.addCleanup(metrics._SCORES.pop, "n_cells")
+        with self.assertRaises(ValueError):
+            expected_score(self._x, self._y, "n_cells", analytic=True)
+
+    def test_score_bound(self):
+        """
+        score_bound is at least as favourable as the score of any table with those entropies
+        """
+        _rng = np.random.default_rng(seed=1)
+        for _which in ("nmi", "nmi_min", "nmi_max", "nmi_geometric", "mi", "vi"):
+            self.assertTrue(has_bound(_which))
+            for _ in range(20):
+                _x = _rng.integers(0, _rng.integers(1, 5), size=50)
+                _y = _rng.integers(0, _rng.integers(1, 8), size=50)
+                table = Contingency.from_labels(_x, _y)
+                _h_true, _h_pred = table.entropies
+                _h_joint = Contingency.from_labels(_x * 8 + _y, _y).entropies[0]
+                _score = table.score(_which)
+                for _bound in (
+                    score_bound(_which, _h_true, _h_pred, _h_joint),
+                    score_bound(_which, _h_true, _h_pred, _h_joint, mi=table.mi),
+                    score_bound(
+                        _which, _h_true, _h_pred / 2, _h_joint / 2, mi=table.mi
+                    ),
+                ):
+                    if metrics.greater_is_better(_which):
+                        self.assertGreaterEqual(_bound + 1e-12, _score)
+                    else:
+                        self.assertLessEqual(_bound - 1e-12, _score)
+        self.assertFalse(has_bound("ami"))
+        with self.assertRaises(ValueError):
+            score_bound("ari", 1.0, 1.0, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -47,8 +47,9 @@ class TestComputeMultiwayAlignmentScore(unittest.TestCase):
         """
         _a = pd.DataFrame({"A": [0, 1, 2]})
         # the function should raise ValueError if the there is only one dimension
-        with self.assertRaises(ValueError):
-            multiway_alignment_score(_a)
+        for _opinions in (_a, _a["A"]):
+            with self.assertRaisesRegex(ValueError, "at least two topics"):
+                multiway_alignment_score(_opinions)
 
     def test_on_two_dimensions(self):
         """
@@ -109,6 +110,20 @@ class TestComputeMultiwayAlignmentScore(unittest.TestCase):
             """multiway_alignment_score should return the correct value in case of perfect alignment when ami is used""",
         )
 
+    def test_parallel_layers(self):
+        """
+        multiway_alignment_score with the layers scored in parallel returns the serial score
+        """
+        _a = pd.DataFrame(
+            {"A": [0, 1, 2, 0, 1], "B": [0, 1, 1, 0, 2], "C": [1, 1, 2, 0, 2]}
+        )
+        for _which_score in ("nmi", "ami"):
+            self.assertEqual(
+                multiway_alignment_score(_a, _which_score, n_jobs=2, parallel="layers"),
+                multiway_alignment_score(_a, _which_score),
+                """multiway_alignment_score should not depend on the parallelism""",
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -42,6 +42,17 @@ class TestComputeMultiwayAlignmentScoreFull(unittest.TestCase):
             """multiway_alignment_score_fullpartition should return the correct value of avg NMI""",
         )
 
+    def test_on_sparse_labels(self):
+        """
+        multiway_alignment_score_fullpartition accepts large and sparse integer labels
+        """
+        _a = pd.DataFrame({"A": [0, 1, 2, 0, 1], "B": [0, 1, 1, 0, 1]})
+        self.assertEqual(
+            multiway_alignment_score_fullpartition(_a, [10**12, 5, 7, 10**12, 5]),
+            multiway_alignment_score_fullpartition(_a, [2, 0, 1, 2, 0]),
+            """multiway_alignment_score_fullpartition should only depend on the clusters of the labels""",
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,250 @@
+import os
+import tempfile
+import unittest
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from joblib import load  # type: ignore
+
+from multiway_alignment.null_models import random_full_alignment_curves
+from multiway_alignment.parallel import (
+    N_JOBS_ENV,
+    Executor,
+    SharedArray,
+    _cgroup_cpus,
+    default_n_jobs,
+    iter_prefix_group,
+    prefix_groups,
+    rank_combination,
+    revolving_door,
+    unrank_combination,
+)
+from multiway_alignment.results import load_scores
+
+
+class TestParallel(unittest.TestCase):
+    """
+    Test functionality of parallel
+    ------------
+    Example
+    ------------
+    >>> python3 -m unittest -v tests.test_parallel
+    """
+
+    def test_unrank_combination(self):
+        """
+        unrank_combination follows the order of itertools.combinations
+        """
+        for _n, _k in ((5, 1), (6, 3), (7, 7)):
+            self.assertListEqual(
+                [
+                    unrank_combination(_n, _k, r)
+                    for r in range(len(list(combinations(range(_n), _k))))
+                ],
+                list(combinations(range(_n), _k)),
+                f"""unrank_combination should follow itertools.combinations({_n}, {_k})""",
+            )
+        with self.assertRaises(ValueError):
+            unrank_combination(4, 2, 6)
+
+    def test_rank_combination(self):
+        """
+        rank_combination is the inverse of unrank_combination
+        """
+        for _rank, _comb in enumerate(combinations(range(7), 3)):
+            self.assertEqual(
+                rank_combination(7, _comb),
+                _rank,
+                f"""rank_combination should return the rank of {_comb}""",
+            )
+
+    def test_revolving_door(self):
+        """
+        revolving_door enumerates every combination once, swapping one element per step
+        """
+        for _n, _k in ((5, 1), (6, 3), (7, 4), (4, 4)):
+            _res0 = [tuple(c) for c in revolving_door(_n, _k)]
+            self.assertListEqual(
+                sorted(_res0),
+                list(combinations(range(_n), _k)),
+                f"""revolving_door should enumerate all the combinations of ({_n}, {_k})""",
+            )
+            for _a, _b in zip(_res0, _res0[1:]):
+                self.assertEqual(
+                    len(set(_a) - set(_b)),
+                    1,
+                    f"""consecutive combinations should differ by one element, but {_a}, {_b}""",
+                )
+
+    def test_prefix_groups(self):
+        """
+        the groups of prefix_groups cover each subset once, with its parent in the same group
+        """
+        _expected0 = sorted(c for k in range(2, 8) for c in combinations(range(7), k))
+        _groups = prefix_groups(7, 16)
+        self.assertTrue(
+            all(2 ** (7 - start) <= 16 for _, start in _groups),
+            """prefix_groups should split the groups to the maximal size""",
+        )
+        _res0 = []
+        for _prefix, _start in _groups:
+            _group = list(iter_prefix_group(7, _prefix, _start))
+            _seen = set(_group)
+            for c in _group:
+                if len(c) > max(len(_prefix), 2):
+                    self.assertIn(
+                        c[:-1],
+                        _seen,
+                        f"""The parent of {c} should be in its group {_prefix, _start}""",
+                    )
+            _res0 += _group
+        self.assertListEqual(
+            sorted(_res0),
+            _expected0,
+            """prefix_groups should cover all the subsets of size 2 or more once""",
+        )
+
+    def test_shared_array(self):
+        """
+        SharedArray attaches to the same buffer from its spec
+        """
+        _a = np.arange(12, dtype=np.int64).reshape(3, 4)
+        with SharedArray.create(_a) as shared:
+            _res0 = SharedArray.attach(shared.spec)
+            self.assertTrue(
+                np.array_equal(_res0.array, _a),
+                """SharedArray.attach should return the shared array""",
+            )
+            _res0.close()
+
+    def test_executor(self):
+        """
+        Executor keeps its pool across calls, and runs nested tasks in the worker
+        """
+        with Executor(n_jobs=2, share_emi=False) as executor:
+            _res0 = executor.map(_nested_map, [[1, 2], [3]])
+            _pool = executor.pool
+            _res1 = executor.starmap(pow, [(2, 3), (3, 2)])
+            self.assertIs(
+                executor.pool,
+                _pool,
+                """Executor should reuse the same pool across calls""",
+            )
+        self.assertListEqual(
+            _res0,
+            [[1, 4], [9]],
+            f"""Executor in a worker should run the tasks serially, but returned {_res0}""",
+        )
+        self.assertListEqual(_res1, [8, 9], f"""Executor.starmap returned {_res1}""")
+
+    def test_chunk_size(self):
+        """
+        Executor.chunk_size balances the load, and bounds the duration of a chunk once measured
+        """
+        executor = Executor(n_jobs=2, target_task_seconds=0.1)
+        self.assertEqual(
+            executor.chunk_size("task", 800),
+            100,
+            """Executor.chunk_size should give 4 chunks per worker before any measure""",
+        )
+        executor.record("task", 100, 1.0)
+        self.assertEqual(
+            executor.chunk_size("task", 800),
+            5,
+            """Executor.chunk_size should bound the duration of a chunk from the measured cost""",
+        )
+
+    def test_null_models(self):
+        """
+        the null models run on a shared executor, adjusted, sharing the EMI, without nested pools
+        """
+        _rng = np.random.default_rng(seed=0)
+        _a = pd.DataFrame({c: _rng.integers(0, 3, size=100) for c in "ABC"})
+        with tempfile.TemporaryDirectory() as tmp, Executor(
+            n_jobs=2, share_emi=True
+        ) as executor:
+            random_full_alignment_curves(
+                _a, tmp, adjusted=True, n_tries=3, executor=executor
+            )
+            _res0 = [
+                load_scores(os.path.join(tmp, f"null_{i}")).to_dict() for i in range(3)
+            ]
+        for _curve in _res0:
+            self.assertListEqual(
+                list(_curve),
+                ["2+A+B", "2+A+C", "2+B+C", "3+A+B+C"],
+                f"""random_full_alignment_curves should save all the scores, but saved {_curve}""",
+            )
+        # the joblib dictionaries of version 0.0.2
+        with tempfile.TemporaryDirectory() as tmp:
+            random_full_alignment_curves(_a, tmp, n_tries=2, compact=False)
+            for i in range(2):
+                _res1 = load(os.path.join(tmp, f"null_{i}"))
+                self.assertIsInstance(_res1, dict)
+                self.assertListEqual(
+                    list(_res1), ["2+A+B", "2+A+C", "2+B+C", "3+A+B+C"]
+                )
+
+    def test_cgroup_cpus(self):
+        """
+        _cgroup_cpus reads the CPU quota of cgroup v2 and v1
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertIsNone(_cgroup_cpus(tmp), """No cgroup files means no quota""")
+            os.makedirs(os.path.join(tmp, "cpu"))
+            with open(os.path.join(tmp, "cpu", "cpu.cfs_quota_us"), "w") as f:
+                f.write("150000\n")
+            with open(os.path.join(tmp, "cpu", "cpu.cfs_period_us"), "w") as f:
+                f.write("100000\n")
+            self.assertEqual(_cgroup_cpus(tmp), 1.5, """cgroup v1 quota of 1.5 CPUs""")
+            with open(os.path.join(tmp, "cpu.max"), "w") as f:
+                f.write("400000 100000\n")
+            self.assertEqual(_cgroup_cpus(tmp), 4.0, """cgroup v2 quota of 4 CPUs""")
+            with open(os.path.join(tmp, "cpu.max"), "w") as f:
+                f.write("max 100000\n")
+            self.assertIsNone(_cgroup_cpus(tmp), """cgroup v2 without quota""")
+
+    def test_default_n_jobs(self):
+        """
+        default_n_jobs is at least 1, and can be set from the environment
+        """
+        _previous = os.environ.pop(N_JOBS_ENV, None)
+        try:
+            self.assertGreaterEqual(default_n_jobs(), 1)
+            os.environ[N_JOBS_ENV] = "3"
+            self.assertEqual(default_n_jobs(), 3)
+        finally:
+            os.environ.pop(N_JOBS_ENV, None)
+            if _previous is not None:
+                os.environ[N_JOBS_ENV] = _previous
+
+    def test_threads_per_worker(self):
+        """
+        the native thread pools of the workers are capped
+        """
+        with Executor(n_jobs=2, threads_per_worker=1, share_emi=False) as executor:
+            _res0 = executor.map(_max_threads, [0, 1])
+        self.assertListEqual(
+            _res0,
+            [1, 1],
+            f"""The workers should run at most 1 native thread, but run {_res0}""",
+        )
+
+
+def _max_threads(_):
+    from threadpoolctl import threadpool_info  # type: ignore
+
+    return max([1] + [p["num_threads"] for p in threadpool_info()])
+
+
+def _nested_map(items):
+    return Executor(n_jobs=2).map(_square, items)
+
+
+def _square(x):
+    return x * x
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from multiway_alignment.score import (
+    multiway_alignment_score,
+    multiway_alignment_score_fullpartition,
+)
+from multiway_alignment.consensus import get_consensus_labels
+from multiway_alignment.streaming import parallel_alignment_scores
+
+
+class TestParallelAlignmentScores(unittest.TestCase):
+    """
+    Test functionality of streaming.parallel_alignment_scores()
+    ------------
+    Example
+    ------------
+    >>> python3 -m unittest -v tests.test_parallel_alignment_scores
+    """
+
+    def setUp(self):
+        _rng = np.random.default_rng(seed=0)
+        self._a = pd.DataFrame(
+            {c: _rng.integers(0, 3, size=1000).astype(float) for c in "ABC"}
+        )
+        self._a["C"] = self._a["A"].where(_rng.random(1000) < 0.6, self._a["C"])
+
+    def test_on_empty(self):
+        """
+        parallel_alignment_scores raises ZeroDivisionError if there are no rows
+        """
+        with self.assertRaises(ZeroDivisionError):
+            parallel_alignment_scores(pd.DataFrame(), n_jobs=2)
+
+    def test_same_as_serial(self):
+        """
+        parallel_alignment_scores returns the same scores as multiway_alignment_score
+        """
+        _combinations = [["A", "B"], ["C", "A"], ["A", "B", "C"]]
+        for _which_score in ("nmi", "ami"):
+            _res0 = parallel_alignment_scores(
+                self._a, _combinations, which_score=_which_score, n_jobs=3
+            )
+            for _comb in _combinations:
+                _key = f"{len(_comb)}+" + "+".join(sorted(_comb))
+                _expected = multiway_alignment_score(self._a[_comb], _which_score)
+                self.assertAlmostEqual(
+                    _res0[_key],
+                    _expected,
+                    places=12,
+                    msg=f"""parallel_alignment_scores should return the serial score for {_key},
+                    but returned {_res0[_key]} instead of {_expected}""",
+                )
+
+    def test_fullpartition(self):
+        """
+        parallel_alignment_scores with fullpartition=True returns the same score
+        as multiway_alignment_score_fullpartition
+        """
+        _res0 = parallel_alignment_scores(self._a, fullpartition=True, n_jobs=2)
+        _expected = multiway_alignment_score_fullpartition(
+            self._a, get_consensus_labels(self._a)
+        )
+        self.assertAlmostEqual(
+            _res0["3+A+B+C"],
+            _expected,
+            places=12,
+            msg=f"""parallel_alignment_scores should return the serial full partition score,
+            but returned {_res0}""",
+        )
+
+    def test_n_jobs(self):
+        """
+        multiway_alignment_score with n_jobs > 1 returns the same score as the serial one
+        """
+        self.assertAlmostEqual(
+            multiway_alignment_score(self._a, n_jobs=2),
+            multiway_alignment_score(self._a),
+            places=12,
+        )
+        with self.assertRaises(ValueError):
+            multiway_alignment_score(self._a.mask(self._a == 0), n_jobs=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from multiway_alignment.cache import PartitionCache
+from multiway_alignment.consensus import _encode_opinions, get_consensus_codes
+
+
+class TestPartitionCache(unittest.TestCase):
+    """
+    Test functionality of cache.PartitionCache
+    ------------
+    Example
+    ------------
+    >>> python3 -m unittest -v tests.test_partition_cache
+    """
+
+    def setUp(self):
+        _rng = np.random.default_rng(seed=0)
+        self._a = pd.DataFrame(
+            {f"L{j}": _rng.integers(0, 3, size=200).astype(float) for j in range(5)}
+        )
+        self._a = self._a.mask(_rng.random(self._a.shape) < 0.05)
+        self._codes, _ = _encode_opinions(self._a)
+
+    def _assert_same_partition(self, mask, labels):
+        _layers = [c for j, c in enumerate(self._a.columns) if mask >> j & 1]
+        _expected = get_consensus_codes(self._a[_layers])
+        # same groups, up to a renaming of the group ids
+        _pairs = set(zip(labels.tolist(), _expected.tolist()))
+        self.assertTrue(
+            len(_pairs) == len(set(labels.tolist())) == len(set(_expected.tolist()))
+            and all((a < 0) == (b < 0) for a, b in _pairs),
+            f"""PartitionCache should return the consensus of {_layers}, but returned {labels}""",
+        )
+
+    def test_on_all_subsets(self):
+        """
+        PartitionCache returns the consensus partition of every subset of layers
+        """
+        _cache = PartitionCache(self._codes)
+        for _mask in range(1, 2**5):
+            self._assert_same_partition(_mask, _cache.get(_mask))
+        self.assertGreater(
+            _cache.hit_rate,
+            0.0,
+            """PartitionCache should reuse the cached partitions""",
+        )
+        with self.assertRaises(ValueError):
+            _cache.get(0)
+
+    def test_rows(self):
+        """
+        PartitionCache returns the individuals having an opinion on every layer of a subset
+        """
+        _cache = PartitionCache(self._codes)
+        for _mask in (0b00001, 0b01010, 0b11111):
+            _layers = [c for j, c in enumerate(self._a.columns) if _mask >> j & 1]
+            _expected = np.flatnonzero(self._a[_layers].notna().all(axis=1))
+            self.assertListEqual(
+                _cache.rows(_mask).tolist(),
+                _expected.tolist(),
+                f"""PartitionCache should return the complete rows of {_layers}""",
+            )
+        self.assertIsNone(
+            PartitionCache(np.zeros((3, 2), dtype=np.int64)).rows(0b11),
+            """PartitionCache should return None if no value is missing""",
+        )
+
+    def test_eviction(self):
+        """
+        PartitionCache keeps the memory within budget and rebuilds evicted partitions
+        """
+        _cache = PartitionCache(self._codes, max_bytes=3 * 200 * 4)
+        for _mask in range(1, 2**5):
+            _cache.get(_mask)
+            self.assertLessEqual(
+                _cache.nbytes,
+                3 * 200 * 4,
+                f"""PartitionCache should stay within budget, but holds {_cache.nbytes} bytes""",
+            )
+        self._assert_same_partition(0b10111, _cache.get(0b10111))
+        self._assert_same_partition(0b00011, _cache.get(0b00011))
+
+    def test_eviction_with_missing_values(self):
+        """
+        PartitionCache evicts the rows and the partitions in one least-recently-used order,
+        within one budget
+        """
+        _budget = 2 * 200 * 4
+        _cache = PartitionCache(self._codes, max_bytes=_budget)
+        for _mask in range(1, 2**5):
+            _rows = _cache.rows(_mask)
+            _labels = _cache.get(_mask)
+            self.assertLessEqual(
+                _cache.nbytes,
+                _budget,
+                f"""PartitionCache should keep the rows and the partitions within budget,
+                but holds {_cache.nbytes} bytes""",
+            )
+            self.assertListEqual(
+                _rows.tolist(),
+                np.flatnonzero(_labels >= 0).tolist(),
+                """PartitionCache should return the rows of the individuals in a consensus group""",
+            )
+        self._assert_same_partition(0b00011, _cache.get(0b00011))
+        self.assertListEqual(
+            _cache.rows(0b00011).tolist(),
+            np.flatnonzero(self._a[["L0", "L1"]].notna().all(axis=1)).tolist(),
+            """PartitionCache should rebuild the evicted rows""",
+        )
+
+    def test_spill_to_disk(self):
+        """
+        PartitionCache saves evicted partitions to disk and reloads them
+        """
+        with tempfile.TemporaryDirectory() as _dir:
+            _cache = PartitionCache(self._codes, max_bytes=200 * 4, spill_to=_dir)
+            _cache.get(0b00011)
+            _cache.get(0b11000)
+            self.assertIn(
+                0b00011,
+                _cache,
+                """PartitionCache should keep the evicted partitions on disk""",
+            )
+            _misses = _cache.misses
+            self._assert_same_partition(0b00011, _cache.get(0b00011))
+            self.assertEqual(
+                _cache.misses,
+                _misses,
+                """PartitionCache should reload spilled partitions instead of rebuilding them""",
+            )
+            (_subdir,) = os.listdir(_dir)
+            self.assertNotIn(
+                f"{0b00011:x}.npy",
+                os.listdir(os.path.join(_dir, _subdir)),
+                """PartitionCache should delete the reloaded partitions from disk""",
+            )
+            # another cache spilling to the same directory does not share the files
+            with PartitionCache(
+                self._codes, max_bytes=200 * 4, spill_to=_dir
+            ) as _other:
+                _other.get(0b00101)
+                _other.get(0b11000)
+                self.assertEqual(len(os.listdir(_dir)), 2)
+            _cache.close()
+            self.assertListEqual(
+                os.listdir(_dir),
+                [],
+                """PartitionCache should delete its spill directory when closed""",
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
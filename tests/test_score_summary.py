@@ -0,0 +1,98 @@
+import unittest
+
+import numpy as np
+
+from multiway_alignment.streaming import QuantileSketch, ScoreSummary
+
+
+class TestScoreSummary(unittest.TestCase):
+    """
+    Test functionality of streaming.ScoreSummary and streaming.QuantileSketch
+    ------------
+    Example
+    ------------
+    >>> python3 -m unittest -v tests.test_score_summary
+    """
+
+    def setUp(self):
+        _rng = np.random.default_rng(seed=0)
+        self._scores = _rng.normal(size=20000)
+        self._scores[_rng.integers(0, 20000, size=50)] = 0.5
+        self._ranks = np.arange(20000, dtype=np.int64)
+
+    def test_update(self):
+        """
+        the summary of chunks of scores has the moments and the top scores of all the scores
+        """
+        for _greater in (True, False):
+            _summary = ScoreSummary(top_k=5, greater_is_better=_greater)
+            for _chunk in np.array_split(self._ranks, 37):
+                _summary.update(_chunk, self._scores[_chunk])
+            _order = np.lexsort(
+                (self._ranks, -self._scores if _greater else self._scores)
+            )
+            self.assertListEqual(
+                _summary.top(),
+                list(zip(_order[:5].tolist(), self._scores[_order[:5]].tolist())),
+                """ScoreSummary should keep the best scores, the first ranks first""",
+            )
+            self.assertEqual(_summary.count, 20000)
+            self.assertAlmostEqual(_summary.mean, self._scores.mean())
+            self.assertAlmostEqual(_summary.variance, self._scores.var())
+
+    def test_merge(self):
+        """
+        merging the summaries of parts of the scores, in any order, summarizes all the scores
+        """
+        _parts = [
+            ScoreSummary(top_k=3).update(_chunk, self._scores[_chunk])
+            for _chunk in np.array_split(self._ranks, 5)
+        ]
+        _summary = ScoreSummary(top_k=3)
+        for _part in _parts[::-1]:
+            _summary.merge(_part)
+        _expected = ScoreSummary(top_k=3).update(self._ranks, self._scores)
+        self.assertListEqual(_summary.top(), _expected.top())
+        self.assertEqual(_summary.count, _expected.count)
+        self.assertAlmostEqual(_summary.mean, _expected.mean)
+        self.assertAlmostEqual(_summary.variance, _expected.variance)
+
+    def test_nan(self):
+        """
+        NaN scores are not summarized
+        """
+        _summary = ScoreSummary(top_k=2).update(
+            np.arange(4), np.array([np.nan, 0.2, np.nan, 0.1])
+        )
+        self.assertListEqual(_summary.top(), [(1, 0.2), (3, 0.1)])
+        self.assertEqual(_summary.count, 2)
+        self.assertTrue(np.isnan(ScoreSummary().variance))
+
+    def test_quantile_sketch(self):
+        """
+        the sketch has exact quantiles of a few values, and approximate quantiles
+        of many values in bounded memory
+        """
+        _q = (0.0, 0.05, 0.5, 0.95, 1.0)
+        _sketch = QuantileSketch(size=256).update(self._scores[:200])
+        for _quantile, _value in _sketch.quantiles(_q).items():
+            self.assertEqual(
+                _value,
+                np.quantile(self._scores[:200], _quantile, method="inverted_cdf"),
+            )
+        _sketch = QuantileSketch(size=256)
+        for _chunk in np.array_split(self._scores, 100):
+            _sketch.update(_chunk)
+        self.assertEqual(_sketch.count, 20000)
+        self.assertLess(sum(len(_level) for _level in _sketch.levels), 256 * 8)
+        for _quantile, _value in _sketch.quantiles(_q).items():
+            self.assertAlmostEqual(
+                (self._scores <= _value).mean(),
+                _quantile,
+                delta=0.02,
+                msg=f"""QuantileSketch should approximate the {_quantile} quantile""",
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
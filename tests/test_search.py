@@ -0,0 +1,316 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from multiway_alignment.consensus import _encode_opinions
+from multiway_alignment.results import AlignmentCurve
+from multiway_alignment.score import maximal_alignment_curves
+from multiway_alignment.search import prunes, search_curves
+
+
+class TestSearch(unittest.TestCase):
+    """
+    Test functionality of search
+    ------------
+    Example
+    ------------
+    >>> python3 -m unittest -v tests.test_search
+    """
+
+    def setUp(self):
+        _rng = np.random.default_rng(seed=0)
+        _base = _rng.integers(0, 3, size=300)
+        _columns = dict()
+        for i in range(4):
+            _aligned = _base.copy()
+            _noise = _rng.random(300) < 0.1 * i
+            _aligned[_noise] = _rng.integers(0, 3, size=_noise.sum())
+            _columns[f"A{i}"] = _aligned
+        for i in range(4):
+            _columns[f"R{i}"] = _rng.integers(0, 2 + i % 3, size=300)
+        self._a = pd.DataFrame(_columns)
+
+    def test_branch_and_bound(self):
+        """
+        the branch and bound search returns the exhaustive maximal alignment curve
+        """
+        for _fullpartition in (False, True):
+            for _which_scores, _adjusted in (
+                (["nmi", "nmi_max", "mi", "vi"], False),
+                (["nmi"], True),
+            ):
+                _expected0 = maximal_alignment_curves(
+                    self._a,
+                    _which_scores,
+                    fullpartition=_fullpartition,
+                    adjusted=_adjusted,
+                    analytic=True,
+                )
+                _res0 = maximal_alignment_curves(
+                    self._a,
+                    _which_scores,
+                    fullpartition=_fullpartition,
+                    adjusted=_adjusted,
+                    analytic=True,
+                    search="branch_and_bound",
+                )
+                for _which in _which_scores:
+                    self.assertDictEqual(
+                        _res0[_which][1],
+                        _expected0[_which][1],
+                        f"""the branch and bound search should return the exhaustive curve of {_which},
+                        but returned {_res0[_which][1]}""",
+                    )
+                    self.assertLessEqual(
+                        set(_res0[_which][0].items()),
+                        set(_expected0[_which][0].items()),
+                        """the branch and bound search should return the scores of the scored combinations""",
+                    )
+        # the leave-one-out scores enumerated by maximal_alignment_curves, searched directly
+        _codes, _ = _encode_opinions(self._a)
+        _expected0 = maximal_alignment_curves(self._a, ["nmi", "mi"])
+        _res0 = search_curves(_codes, list(self._a.columns), ["nmi", "mi"])
+        for _which in ("nmi", "mi"):
+            self.assertDictEqual(_res0[_which].best, _expected0[_which].best)
+
+    def test_branch_and_bound_prunes(self):
+        """
+        the branch and bound search scores few combinations when some layers are aligned,
+        and the leave-one-out scores other than VI are enumerated
+        """
+        _n_combinations = 2 ** self._a.shape[1] - self._a.shape[1] - 1
+        for _fullpartition in (False, True):
+            _res0 = maximal_alignment_curves(
+                self._a,
+                ["nmi", "vi"],
+                fullpartition=_fullpartition,
+                search="branch_and_bound",
+            )
+            for _which in ("nmi", "vi"):
+                if not prunes(_which, _fullpartition):
+                    self.assertEqual(
+                        len(_res0[_which][0]),
+                        _n_combinations,
+                        f"""the leave-one-out {_which} should be enumerated""",
+                    )
+                    continue
+                self.assertLess(
+                    len(_res0[_which][0]),
+                    0.25 * _n_combinations,
+                    f"""the branch and bound search should score less than a quarter
+                    of the combinations for {_which}, but scored {len(_res0[_which][0])}""",
+                )
+        self.assertFalse(prunes("nmi", False))
+        self.assertTrue(prunes("vi", False))
+        self.assertTrue(prunes("nmi", True))
+
+    def test_branch_and_bound_unbounded(self):
+        """
+        the branch and bound search needs a bound of the score,
+        and is exhaustive with missing values
+        """
+        with self.assertRaises(ValueError):
+            maximal_alignment_curves(self._a, ["ami"], search="branch_and_bound")
+        with self.assertRaises(ValueError):
+            maximal_alignment_curves(
+                self._a, ["vi"], adjusted=True, search="branch_and_bound"
+            )
+        _a = self._a.astype(float)
+        _a.iloc[:10, 0] = np.nan
+        self.assertEqual(
+            maximal_alignment_curves(_a, ["nmi"], search="branch_and_bound"),
+            maximal_alignment_curves(_a, ["nmi"]),
+            """with missing values, the search should be exhaustive""",
+        )
+
+    def test_beam(self):
+        """
+        the forward and backward searches approximate the maximal alignment curve,
+        and report the approximated sizes
+        """
+        _n = self._a.shape[1]
+        _expected0 = maximal_alignment_curves(self._a, ["nmi", "vi"])
+        for _search, _exact in (("forward", [2, _n]), ("backward", [_n - 1, _n])):
+            _res0 = maximal_alignment_curves(self._a, ["nmi", "vi"], search=_search)
+            for _which, _sign in (("nmi", 1.0), ("vi", -1.0)):
+                _all, _best = _res0[_which]
+                _approximated = _res0[_which].approximated
+                self.assertListEqual(
+                    _approximated,
+                    [length for length in range(2, _n + 1) if length not in _exact],
+                    f"""the {_search} search should approximate the sizes whose combinations
+                    are not all scored, but returned {_approximated}""",
+                )
+                self.assertLess(len(_all), 2**_n - _n - 1)
+                for length, (_score, _layers) in _best.items():
+                    self.assertEqual(
+                        _all[f"{length}+" + "+".join(sorted(_layers))], _score
+                    )
+                    self.assertLessEqual(
+                        _sign * _score,
+                        _sign * _expected0[_which][1][length][0],
+                        f"""the {_search} search should not beat the exhaustive search""",
+                    )
+                for length in _exact:
+                    self.assertEqual(_best[length], _expected0[_which][1][length])
+
+    def test_beam_width(self):
+        """
+        a beam as wide as the number of combinations of every size is exhaustive
+        """
+        _a = self._a.iloc[:, :6]
+        _a.iloc[:30, 1] = np.nan
+        _expected0 = maximal_alignment_curves(_a, ["ami"])["ami"]
+        for _search in ("forward", "backward"):
+            _res0 = maximal_alignment_curves(
+                _a, ["ami"], search=_search, beam_width=20
+            )["ami"]
+            _all, _best = _res0
+            self.assertListEqual(_res0.approximated, [])
+            self.assertEqual(
+                (_all, _best),
+                _expected0,
+                f"""the {_search} search with a wide beam should score every combination""",
+            )
+
+    def test_constraints(self):
+        """
+        every search only scores the allowed combinations, and the exact searches
+        return the exhaustive curve of the allowed combinations
+        """
+        _constraints = dict(
+            include=["A1"],
+            exclude=["R3"],
+            groups=[["R0", "R1"]],
+            min_size=3,
+            max_size=6,
+        )
+        for _fullpartition in (False, True):
+            _expected0 = maximal_alignment_curves(
+                self._a, ["nmi"], fullpartition=_fullpartition
+            )["nmi"]
+            _allowed = {
+                _key: _score
+                for _key, _score in _expected0[0].items()
+                if 3 <= int(_key.split("+")[0]) <= 6
+                and "A1" in _key.split("+")
+                and "R3" not in _key.split("+")
+                and ("R0" in _key.split("+")) == ("R1" in _key.split("+"))
+            }
+            _res0 = maximal_alignment_curves(
+                self._a, ["nmi"], fullpartition=_fullpartition, **_constraints
+            )["nmi"]
+            self.assertDictEqual(
+                _res0[0],
+                _allowed,
+                """the exhaustive search should score the allowed combinations""",
+            )
+            self.assertListEqual(list(_res0[1]), [3, 4, 5, 6])
+            for _search in ("branch_and_bound", "forward", "backward", "sampled"):
+                _res1 = maximal_alignment_curves(
+                    self._a,
+                    ["nmi"],
+                    fullpartition=_fullpartition,
+                    search=_search,
+                    n_samples=5,
+                    **_constraints,
+                )["nmi"]
+                self.assertLessEqual(
+                    set(_res1[0].items()),
+                    set(_allowed.items()),
+                    f"""the {_search} search should only score the allowed combinations""",
+                )
+                self.assertListEqual(list(_res1[1]), [3, 4, 5, 6])
+                if _search == "branch_and_bound":
+                    self.assertDictEqual(_res1[1], _res0[1])
+
+    def test_sampled(self):
+        """
+        the sampled search estimates the maximal alignment curve from random combinations,
+        with a bound of the probability of having missed the best one
+        """
+        _n = self._a.shape[1]
+        _expected0 = maximal_alignment_curves(self._a, ["nmi"])["nmi"]
+        for _stratified in (False, True):
+            _res0 = maximal_alignment_curves(
+                self._a, ["nmi"], search="sampled", n_samples=20, stratified=_stratified
+            )["nmi"]
+            _all, _best = _res0
+            _approximated, _report = _res0.approximated, _res0.report
+            self.assertListEqual(_approximated, [2, 3, 4, 5, 6])
+            _res1 = maximal_alignment_curves(
+                self._a,
+                ["nmi"],
+                search="sampled",
+                n_samples=20,
+                stratified=_stratified,
+            )["nmi"]
+            self.assertEqual(
+                (_res0, _res0.report),
+                (_res1, _res1.report),
+                """the sampled search should be reproducible""",
+            )
+            for length, (_score, _layers) in _best.items():
+                self.assertEqual(_all[f"{length}+" + "+".join(sorted(_layers))], _score)
+                self.assertLessEqual(_score, _expected0[1][length][0])
+                self.assertLessEqual(_report[length]["quantiles"][0.95], _score)
+                if length in _approximated:
+                    self.assertEqual(_report[length]["n_draws"], 20)
+                    self.assertGreater(_report[length]["p_missed"], 0.0)
+                    self.assertLess(_report[length]["p_missed"], 1.0)
+                else:
+                    self.assertEqual(_best[length], _expected0[1][length])
+                    self.assertEqual(_report[length]["p_missed"], 0.0)
+            self.assertEqual(_report[_n]["n_combinations"], 1)
+
+    def test_result_shape(self):
+        """
+        every search returns a curve that unpacks as the pair of the scores and the curve,
+        with the results of the search as attributes
+        """
+        _n = self._a.shape[1]
+        for _search, _kwargs, _approximated, _summary, _report in (
+            ("exhaustive", dict(), [], False, False),
+            ("exhaustive", dict(top_k=2), [], True, False),
+            ("branch_and_bound", dict(), [], False, False),
+            ("forward", dict(), list(range(3, _n)), False, False),
+            ("sampled", dict(n_samples=20), list(range(2, _n - 1)), False, True),
+        ):
+            _res0 = maximal_alignment_curves(
+                self._a, ["nmi"], search=_search, **_kwargs
+            )["nmi"]
+            self.assertIsInstance(_res0, AlignmentCurve)
+            _all, _best = _res0
+            self.assertIs(_all, _res0.all_scores)
+            self.assertIs(_best, _res0.best)
+            self.assertListEqual(_res0.approximated, _approximated)
+            self.assertEqual(
+                _res0.summary is not None,
+                _summary,
+                f"""the {_search} search should only have a summary with top_k""",
+            )
+            self.assertEqual(
+                _res0.report is not None,
+                _report,
+                f"""the {_search} search should only have a report if sampled""",
+            )
+
+    def test_sampled_time_budget(self):
+        """
+        the sampled search stops drawing combinations when the time budget is used up
+        """
+        _res0 = maximal_alignment_curves(
+            self._a, ["nmi"], search="sampled", n_samples=20, max_seconds=0.0
+        )
+        _report = _res0["nmi"].report
+        self.assertListEqual(
+            [_report[length]["n_draws"] for length in range(2, 7)],
+            [1] * 5,
+            f"""the sampled search should draw one combination of each size
+            without time budget, but drew {_report}""",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
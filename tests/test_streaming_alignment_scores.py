@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from multiway_alignment.score import multiway_alignment_score
+from multiway_alignment.streaming import iter_chunks, streaming_alignment_scores
+
+
+class TestStreamingAlignmentScores(unittest.TestCase):
+    """
+    Test functionality of streaming.streaming_alignment_scores()
+    ------------
+    Example
+    ------------
+    >>> python3 -m unittest -v tests.test_streaming_alignment_scores
+    """
+
+    def setUp(self):
+        _rng = np.random.default_rng(seed=0)
+        self._a = pd.DataFrame(
+            {c: _rng.integers(0, 3, size=1000).astype(float) for c in "ABC"}
+        )
+        self._a["C"] = self._a["A"].where(_rng.random(1000) < 0.6, self._a["C"])
+        self._a = self._a.mask(_rng.random(self._a.shape) < 0.05)
+
+    def _chunks(self, size=128):
+        return (self._a.iloc[i : i + size] for i in range(0, len(self._a), size))
+
+    def test_on_empty(self):
+        """
+        streaming_alignment_scores raises ZeroDivisionError if there are no rows
+        """
+        with self.assertRaises(ZeroDivisionError):
+            streaming_alignment_scores(iter([]))
+
+    def test_same_as_in_memory(self):
+        """
+        streaming_alignment_scores returns the same scores as multiway_alignment_score
+        """
+        _combinations = [["A", "B"], ["C", "A"], ["A", "B", "C"]]
+        for _which_score in ("nmi", "ami"):
+            _res0 = streaming_alignment_scores(
+                self._chunks(), _combinations, which_score=_which_score
+            )
+            for _comb in _combinations:
+                _key = f"{len(_comb)}+" + "+".join(sorted(_comb))
+                _expected = multiway_alignment_score(
+                    self._a[_comb].dropna().reset_index(drop=True), _which_score
+                )
+                self.assertAlmostEqual(
+                    _res0[_key],
+                    _expected,
+                    places=12,
+                    msg=f"""streaming_alignment_scores should return the in-memory score for {_key},
+                    but returned {_res0[_key]} instead of {_expected}""",
+                )
+
+    def test_from_csv(self):
+        """
+        streaming_alignment_scores reads a CSV file in chunks
+        """
+        with tempfile.TemporaryDirectory() as _dir:
+            _path = os.path.join(_dir, "opinions.csv")
+            self._a.to_csv(_path, index=False)
+            _res0 = streaming_alignment_scores(iter_chunks(_path, chunksize=100))
+        _expected = multiway_alignment_score(self._a.dropna().reset_index(drop=True))
+        self.assertAlmostEqual(
+            _res0["3+A+B+C"],
+            _expected,
+            places=12,
+            msg=f"""streaming_alignment_scores should return the in-memory score,
+            but returned {_res0}""",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()